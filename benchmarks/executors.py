@@ -0,0 +1,147 @@
+"""Benchmark of the executor backends.
+
+Runs the same step with each executor backend and compares their wall time and peak
+memory. The step is made of download tasks that fetch small files from a local HTTP
+server that adds some latency to every request, which is a good approximation of the
+I/O bound work most PIS steps do.
+
+Memory is measured by sampling the resident set size of the whole process tree, so
+the worker processes of the `process` backend are accounted for. This only works on
+Linux, as it reads from `/proc`.
+
+Usage::
+
+    uv run python benchmarks/executors.py --tasks 64 --pool 64 --latency 0.5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import yaml
+from loguru import logger
+
+BACKENDS = ['process', 'thread']
+SAMPLE_INTERVAL = 0.05
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Request handler that waits before answering, to simulate a remote server."""
+
+    latency = 0.0
+
+    def send_head(self):
+        """Wait, then send the headers."""
+        time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        tasks = os.listdir(f'/proc/{pid}/task')
+    except OSError:
+        return []
+    children = []
+    for tid in tasks:
+        try:
+            children.extend(int(c) for c in Path(f'/proc/{pid}/task/{tid}/children').read_text().split())
+        except OSError:
+            pass
+    return children
+
+
+def _rss(pid: int) -> int:
+    try:
+        status = Path(f'/proc/{pid}/status').read_text()
+    except OSError:
+        return 0
+    for line in status.splitlines():
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def tree_rss(pid: int) -> int:
+    """Return the resident set size of a process and all its descendants in bytes."""
+    pids, total = [pid], 0
+    while pids:
+        p = pids.pop()
+        total += _rss(p)
+        pids.extend(_children(p))
+    return total
+
+
+def run_backend(backend: str, config_file: Path, work_dir: Path, pool: int) -> tuple[float, int]:
+    """Run the benchmark step with a backend.
+
+    :return: The wall time in seconds and the peak memory of the process tree in bytes.
+    """
+    cmd = [sys.executable, '-m', 'pis.core', '-c', str(config_file), '-s', 'benchmark']
+    cmd += ['-w', str(work_dir), '-p', str(pool), '-l', 'WARNING', '--executor', backend]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    peak = 0
+    while process.poll() is None:
+        peak = max(peak, tree_rss(process.pid))
+        time.sleep(SAMPLE_INTERVAL)
+    elapsed = time.perf_counter() - start
+
+    if process.returncode:
+        raise RuntimeError(f'{backend} run failed with exit code {process.returncode}')
+    return elapsed, peak
+
+
+def main():
+    """Run the benchmark for all the backends and log a summary."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=64, help='The number of download tasks in the step.')
+    parser.add_argument('--pool', type=int, default=16, help='The number of workers of each backend.')
+    parser.add_argument('--latency', type=float, default=0.5, help='The latency of each request in seconds.')
+    parser.add_argument('--size', type=int, default=1024 * 1024, help='The size of each file in bytes.')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=BACKENDS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        served = tmp_path / 'served'
+        served.mkdir()
+        for i in range(args.tasks):
+            (served / f'file_{i}.bin').write_bytes(os.urandom(args.size))
+
+        SlowHandler.latency = args.latency
+        server = ThreadingHTTPServer(('127.0.0.1', 0), partial(SlowHandler, directory=served))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+
+        config_file = tmp_path / 'benchmark.yaml'
+        tasks = [
+            {
+                'name': f'download file {i}',
+                'source': f'http://{host}:{port}/file_{i}.bin',
+                'destination': f'benchmark/file_{i}.bin',
+            }
+            for i in range(args.tasks)
+        ]
+        config_file.write_text(yaml.safe_dump({'steps': {'benchmark': tasks}}))
+
+        logger.info(f'{args.tasks} tasks, {args.pool} workers, {args.latency}s latency, {args.size} bytes per file')
+        for backend in args.backends:
+            elapsed, peak = run_backend(backend, config_file, tmp_path / backend, args.pool)
+            logger.info(f'{backend:<8} wall time: {elapsed:7.2f}s  peak memory: {peak / 1024**2:8.1f} MiB')
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark of the JSON lines writer used by the elasticsearch task.
+
+Compares the documents per second written by the previous approach, which reopened
+the file on every flush and serialized each document with `json.dump`, with the
+:class:`pis.util.jsonl.JsonlWriter`, which keeps the file open and writes the
+serialized documents in a single call. The writer is measured with the standard
+library encoder, and with orjson if it is installed.
+
+Usage::
+
+    uv run python benchmarks/jsonl.py --docs 200000
+"""
+
+import argparse
+import json
+import random
+import string
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+from loguru import logger
+
+from pis.util import jsonl
+from pis.util.jsonl import JsonlWriter
+
+OLD_BUFFER_SIZE = 20000
+
+
+def _word(n: int = 12) -> str:
+    return ''.join(random.choices(string.ascii_lowercase, k=n))
+
+
+def make_docs(count: int) -> list[dict]:
+    """Make documents shaped like the ChEMBL molecule records."""
+    return [
+        {
+            'molecule_chembl_id': f'CHEMBL{i}',
+            'pref_name': _word().upper(),
+            'max_phase': random.choice([None, 1, 2, 3, 4]),
+            'molecule_synonyms': [{'synonyms': _word(), 'syn_type': 'TRADE_NAME'} for _ in range(3)],
+            'cross_references': [{'xref_id': _word(8), 'xref_src': 'Wikipedia'} for _ in range(2)],
+            '_metadata': {'drug_indications': [_word(10) for _ in range(4)], 'approved': random.random() > 0.5},
+        }
+        for i in range(count)
+    ]
+
+
+def old_writer(docs: list[dict], path: Path) -> None:
+    """Write documents the way the elasticsearch task used to."""
+    buffer: list[dict] = []
+    for doc in docs:
+        buffer.append(doc)
+        if len(buffer) >= OLD_BUFFER_SIZE:
+            with open(path, 'a+') as f:
+                for d in buffer:
+                    json.dump(d, f)
+                    f.write('\n')
+            buffer.clear()
+    with open(path, 'a+') as f:
+        for d in buffer:
+            json.dump(d, f)
+            f.write('\n')
+
+
+def new_writer(docs: list[dict], path: Path) -> None:
+    """Write documents with the buffered writer."""
+    with JsonlWriter(path) as writer:
+        for doc in docs:
+            writer.write(doc)
+
+
+def measure(func: Callable[[list[dict], Path], None], docs: list[dict], path: Path) -> float:
+    """Return the documents per second written by a function."""
+    path.unlink(missing_ok=True)
+    start = time.perf_counter()
+    func(docs, path)
+    return len(docs) / (time.perf_counter() - start)
+
+
+def main():
+    """Run the benchmark and log a summary."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=200000, help='The number of documents to write.')
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'docs.jsonl'
+        results = {'json.dump, reopen per flush': measure(old_writer, docs, path)}
+        with patch.object(jsonl, 'orjson', None):
+            results['JsonlWriter, stdlib encoder'] = measure(new_writer, docs, path)
+        if jsonl.orjson:
+            results['JsonlWriter, orjson encoder'] = measure(new_writer, docs, path)
+        else:
+            logger.warning('orjson is not installed, skipping it')
+
+    baseline = next(iter(results.values()))
+    for name, rate in results.items():
+        logger.info(f'{name:<30} {rate:12,.0f} docs/s  ({rate / baseline:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Benchmark of the storage code paths, against a local stand-in for the buckets.
+
+The sources and the remote URI are `file://` directories, served by
+:class:`pis.storage.local.LocalStorage`, which has the semantics of Google Cloud
+Storage, generations and preconditions included. The benchmark runs, in process:
+
+- A step of download_latest tasks, each listing a prefix with several files and
+  downloading the newest one, which is then uploaded to the remote URI.
+- The same step again, where the uploads are skipped as the remote files match.
+- A run that saves the manifest several times, and several runs that save it at the
+  same time, conflicting with each other in the compare-and-swap of the manifest.
+
+For every phase, the wall time, the throughput and the calls to each operation of
+the storage are logged. Each operation would be a request to Google Cloud Storage,
+so the call counts show regressions that do not depend on the machine or the network.
+The step runs with the thread executor, so the calls of its tasks are counted.
+
+Usage::
+
+    uv run python benchmarks/storage.py --tasks 8 --files 50 --size 33554432 --writers 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import yaml
+from loguru import logger
+
+from pis.config import init_config
+from pis.manifest import manifest as manifest_module
+from pis.manifest.manifest import Manifest
+from pis.step import Step
+from pis.storage import local
+from pis.storage.local import LocalStorage
+from pis.task import init_task_registry
+
+STEP = 'benchmark'
+SMALL_FILE_SIZE = 1024
+
+
+def make_sources(root: Path, tmp_path: Path, tasks: int, files: int, size: int) -> None:
+    """Fill a prefix for each task with small files, and a large one that is the newest."""
+    storage = LocalStorage()
+    small, large = tmp_path / 'small.bin', tmp_path / 'large.bin'
+    small.write_bytes(os.urandom(SMALL_FILE_SIZE))
+    for t in range(tasks):
+        for f in range(files - 1):
+            storage.upload(small, f'file://{root}/prefix_{t}/file_{f}.bin')
+        large.write_bytes(os.urandom(size))
+        storage.upload(large, f'file://{root}/prefix_{t}/file_{files - 1}.bin')
+
+
+def summary(name: str, elapsed: float, transferred: int, rate: str = '') -> None:
+    """Log the wall time, throughput and storage calls of a phase, and reset the calls."""
+    calls = ' '.join(f'{op}={n}' for op, n in sorted(local.calls.items())) or 'none'
+    throughput = rate or f'{transferred / elapsed / 1024**2:9.1f} MiB/s'
+    logger.info(f'{name:<30} {elapsed:7.2f}s {throughput:>16}  calls: {calls}')
+    local.calls.clear()
+
+
+def run_step(manifest: Manifest, name: str) -> None:
+    """Run the benchmark step and log how many bytes it moved."""
+    step = Step(STEP, manifest.get_step(STEP))
+    start = time.perf_counter()
+    step.execute()
+    elapsed = time.perf_counter() - start
+
+    fetched = sum(getattr(t, 'bytes_fetched', 0) for t in step._manifest.tasks)
+    moved = fetched + step._manifest.bytes_uploaded + step._manifest.bytes_copied
+    summary(name, elapsed, moved)
+    manifest.update_step(step)
+
+
+def save_manifest(saves: int) -> None:
+    """Save the manifest of a run several times, as a run of several steps does."""
+    manifest = Manifest()
+    local.calls.clear()
+    start = time.perf_counter()
+    for _ in range(saves):
+        manifest.complete()
+    elapsed = time.perf_counter() - start
+    summary(f'manifest, {saves} saves', elapsed, 0, f'{saves / elapsed:9.1f} saves/s')
+
+
+def save_manifest_concurrently(writers: int, tmp_path: Path) -> None:
+    """Save the manifest from several runs at the same time, each in its own work directory."""
+    manifests = [Manifest() for _ in range(writers)]
+    for i, m in enumerate(manifests):
+        m._local_path = tmp_path / f'writer_{i}' / 'manifest.json'
+        m._local_path.parent.mkdir()
+    local.calls.clear()
+    barrier = threading.Barrier(writers)
+
+    def save(manifest: Manifest) -> None:
+        barrier.wait()
+        manifest.complete()
+
+    threads = [threading.Thread(target=save, args=(m,)) for m in manifests]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    conflicts = local.calls['upload'] - writers
+    summary(f'manifest, {writers} writers', elapsed, 0, f'{conflicts} conflicts')
+
+
+def main():
+    """Run the benchmark and log a summary of each phase."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=8, help='The number of download_latest tasks in the step.')
+    parser.add_argument('--files', type=int, default=50, help='The number of files in the prefix of each task.')
+    parser.add_argument('--size', type=int, default=32 * 1024**2, help='The size of the newest file in bytes.')
+    parser.add_argument('--pool', type=int, default=8, help='The number of workers of the step.')
+    parser.add_argument('--segments', type=int, default=4, help='The number of segments of each download.')
+    parser.add_argument('--saves', type=int, default=4, help='The number of times a run saves the manifest.')
+    parser.add_argument('--writers', type=int, default=8, help='The number of runs saving the manifest at once.')
+    parser.add_argument('--cooldown', type=float, default=0.05, help='The wait before retrying a manifest save.')
+    parser.add_argument('--remote-copy', action='store_true', help='Copy the sources instead of downloading them.')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='INFO', filter=lambda r: r['name'] == __name__ or r['level'].no >= 40)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        sources, remote = tmp_path / 'sources', tmp_path / 'remote'
+        make_sources(sources, tmp_path, args.tasks, args.files, args.size)
+        local.calls.clear()
+
+        config_file = tmp_path / 'benchmark.yaml'
+        tasks = [
+            {
+                'name': f'download_latest file {t}',
+                'source': f'file://{sources}/prefix_{t}',
+                'destination': f'benchmark/file_{t}.bin',
+            }
+            for t in range(args.tasks)
+        ]
+        config_file.write_text(yaml.safe_dump({'steps': {STEP: tasks}}))
+
+        argv = ['pis', '-c', str(config_file), '-s', STEP, '-w', str(tmp_path / 'work'), '-r', f'file://{remote}']
+        argv += ['-p', str(args.pool), '--download-segments', str(args.segments), '--executor', 'thread']
+        if args.remote_copy:
+            argv += ['--remote-copy']
+        with patch('sys.argv', argv), patch.object(manifest_module, 'UPLOAD_COOLDOWN', args.cooldown):
+            init_config()
+            init_task_registry()
+
+            logger.info(f'{args.tasks} tasks, {args.files} files per prefix, {args.size} bytes per download')
+            manifest = Manifest()
+            local.calls.clear()
+            run_step(manifest, 'download_latest, first run')
+            run_step(manifest, 'download_latest, second run')
+            manifest.complete()
+            local.calls.clear()
+
+            save_manifest(args.saves)
+            save_manifest_concurrently(args.writers, tmp_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 """Configuration package."""
 
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import TYPE_CHECKING
 
 from pis.config.scratchpad import Scratchpad
@@ -10,8 +13,9 @@ if TYPE_CHECKING:
 
 _config: 'Config | None' = None
 _steps: 'list[str] | None' = None
-_task_definitions: 'list[BaseTaskDefinition] | None' = None
+_task_definitions: 'dict[str, list[BaseTaskDefinition]]' = {}
 _scratchpad: 'Scratchpad | None' = None
+_current_step: ContextVar[str | None] = ContextVar('current_step', default=None)
 
 
 def init_config():
@@ -54,21 +58,56 @@ def steps() -> 'list[str]':
     return _steps or []
 
 
-def task_definitions() -> 'list[BaseTaskDefinition]':
-    """Return the task definitions.
+def steps_to_run() -> 'list[str]':
+    """Return the steps to run.
+
+    These are the steps in the `step` setting, which can be a single step, a comma
+    separated list of steps, or `all` to run all the steps in the configuration file.
+
+    :return: The names of the steps to run.
+    :rtype: list[str]
+    """
+    init_config()
+    assert _config is not None
+    return _config.get_steps_to_run()
+
+
+@contextmanager
+def step_context(step: str) -> Iterator[None]:
+    """Context manager that sets the step being run in the current context.
+
+    Inside of it, :func:`task_definitions` returns the task definitions of the step
+    by default, so pretasks can add new tasks to the step they belong to.
+
+    :param step: The name of the step.
+    :type step: str
+    """
+    token = _current_step.set(step)
+    try:
+        yield
+    finally:
+        _current_step.reset(token)
+
+
+def task_definitions(step: str | None = None) -> 'list[BaseTaskDefinition]':
+    """Return the task definitions of a step.
 
     If the task definitions have not been loaded, they will be loaded from the
     configuration file. The task definitions are stored for subsequent calls.
 
+    :param step: Optional. The name of the step. If omitted, the step set by
+        :func:`step_context` is used, or the `step` setting if there is none.
+    :type step: str | None
     :return: The task definitions.
     :rtype: list[BaseTaskDefinition]
     """
-    global _config, _task_definitions  # noqa: PLW0602, PLW0603
+    global _config, _task_definitions  # noqa: PLW0602
     init_config()
     assert _config is not None
-    if _task_definitions is None:
-        _task_definitions = _config.get_task_definitions()
-    return _task_definitions
+    step = step or _current_step.get() or _config.settings.step
+    if step not in _task_definitions:
+        _task_definitions[step] = _config.get_task_definitions(step)
+    return _task_definitions[step]
 
 
 def scratchpad() -> Scratchpad:
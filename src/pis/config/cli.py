@@ -46,7 +46,8 @@ def parse_cli() -> CliSettings:
         '-s',
         '--step',
         required=to_env('step') not in os.environ,
-        help='The step to run',
+        help='The step to run. It can be a comma separated list of steps, or all to '
+        'run all the steps in the configuration file.',
     )
 
     parser.add_argument(
@@ -86,6 +87,71 @@ def parse_cli() -> CliSettings:
         help='Log level for the application.',
     )
 
+    parser.add_argument(
+        '--download-segments',
+        type=int,
+        help='The number of byte ranges that downloads will be split into and fetched '
+        'concurrently, for Google Cloud Storage files and HTTP servers that support '
+        'range requests. Tasks can override this with their own segments field.',
+    )
+
+    parser.add_argument(
+        '--download-segments-min-size',
+        type=int,
+        help='The size in bytes from which downloads are split into segments. Smaller '
+        'files are downloaded in a single stream.',
+    )
+
+    parser.add_argument(
+        '--upload-workers',
+        type=int,
+        help='The number of parts that large files will be split into and uploaded '
+        'concurrently to the remote storage. A value of 1 disables parallel uploads.',
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help='If set, downloaded files will be cached in this directory and reused in '
+        'later runs if the remote files have not changed.',
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        help='The maximum size of the download cache in bytes.',
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        default=None,
+        help='Skip the tasks whose definition and source have not changed since the '
+        'previous run recorded in the manifest.',
+    )
+
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        default=None,
+        help='Validate and upload each task as soon as it finishes running, instead of '
+        'waiting for all the tasks in the step to finish each phase.',
+    )
+
+    parser.add_argument(
+        '--remote-copy',
+        action='store_true',
+        default=None,
+        help='Copy the files that tasks download from the same kind of remote storage as '
+        'the remote URI straight to it, instead of downloading and uploading them.',
+    )
+
+    parser.add_argument(
+        '--executor',
+        choices=['process', 'thread'],
+        help='The executor backend that runs the tasks of the step. Steps listed in the '
+        'executors field of the configuration file use their own backend instead.',
+    )
+
     settings_vars = vars(parser.parse_args())
     settings_dict = {k: v for k, v in settings_vars.items() if v is not None}
 
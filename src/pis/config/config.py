@@ -1,5 +1,6 @@
 """Main module in the config package."""
 
+from graphlib import CycleError, TopologicalSorter
 from typing import Any
 
 from loguru import logger
@@ -42,6 +43,7 @@ class Config:
 
         self.settings = settings
         self._validate_step()
+        self._validate_dependencies()
         logger.info(f'loaded settings: {list_str(self.settings.model_dump(), dict_values=True)}')
         if not self.settings.remote_uri:
             logger.info('no remote URI provided, run will be local')
@@ -49,27 +51,70 @@ class Config:
     def _validate_step(self):
         """Validate the step.
 
-        Makes sure the step specified in the CLI arguments is defined in the
+        Makes sure the steps specified in the CLI arguments are defined in the
         configuration file.
         """
         if not self.settings.step:
             logger.critical('empty step argument, please provide a step')
             raise SystemExit(1)
 
-        if self.settings.step not in self.yaml_dict['steps']:
-            logger.critical(f'invalid step: {self.settings.step}')
-            raise SystemExit(1)
+        for step in self.get_steps_to_run():
+            if step not in self.yaml_dict['steps']:
+                logger.critical(f'invalid step: {step}')
+                raise SystemExit(1)
+
+    def get_steps_to_run(self) -> list[str]:
+        """Return the steps to run.
 
-    def get_task_definitions(self) -> list[BaseTaskDefinition]:
+        The step setting can be a single step, a comma separated list of steps, or
+        `all`, which means all the steps in the configuration file, in order.
+
+        :return: The names of the steps to run.
+        :rtype: list[str]
+        """
+        if self.settings.step == 'all':
+            return list(self.yaml_dict['steps'])
+        return list(dict.fromkeys(s.strip() for s in self.settings.step.split(',') if s.strip()))
+
+    def _validate_dependencies(self):
+        """Validate the dependencies between tasks.
+
+        Makes sure the tasks in every step only depend on other tasks of the same
+        step, and that there are no cycles in their dependency graph.
+        """
+        for step, ts in self.yaml_dict['steps'].items():
+            ts = [t for t in ts or [] if isinstance(t, dict)]
+            names = {t.get('name') for t in ts}
+            graph = {}
+
+            for t in ts:
+                depends_on = t.get('depends_on', [])
+                if not isinstance(depends_on, list):
+                    logger.critical(f'depends_on must be a list in task {t.get("name")}')
+                    raise SystemExit(1)
+                if missing := set(depends_on) - names:
+                    logger.critical(f'task {t.get("name")} depends on unknown tasks: {list_str(sorted(missing))}')
+                    raise SystemExit(1)
+                graph[t.get('name')] = depends_on
+
+            try:
+                TopologicalSorter(graph).prepare()
+            except CycleError as e:
+                logger.critical(f'dependency cycle in step {step}: {" -> ".join(e.args[1])}')
+                raise SystemExit(1)
+
+    def get_task_definitions(self, step: str | None = None) -> list[BaseTaskDefinition]:
         """Validate the task definitions.
 
         Makes sure the task definitions specified in the configuration file for
-        the step the application is going to run are valid.
+        a step the application is going to run are valid.
 
+        :param step: Optional. The name of the step, defaults to the step setting.
+        :type step: str | None
         :return: The list of task definitions.
         :rtype: list[BaseTaskDefinition]
         """
-        step = self.settings.step
+        step = step or self.settings.step
         ts = self.yaml_dict['steps'].get(step)
 
         if not ts:
@@ -31,6 +31,16 @@ def test_config_initialization(c):
         'remote_uri': 'gs://bucket/path/to/file',
         'pool': 5,
         'log_level': 'INFO',
+        'download_segments': 1,
+        'download_segments_min_size': 32 * 1024**2,
+        'upload_workers': 8,
+        'cache_size': 50 * 1024**3,
+        'incremental': False,
+        'streaming': False,
+        'remote_copy': False,
+        'executor': 'process',
+        'executors': {},
+        'pools': {},
     }
 
 
@@ -58,6 +68,54 @@ def test_validate_step_invalid(c):
     assert e.value.code == 1
 
 
+def test_validate_step_list_invalid(c):
+    c.settings.step = 'step_1,invalid_step'
+
+    with pytest.raises(SystemExit) as e:
+        c._validate_step()
+
+    assert e.value.code == 1
+
+
+@pytest.mark.parametrize(
+    ('step', 'expected'),
+    [
+        ('step_1', ['step_1']),
+        ('step_2, step_1,step_2', ['step_2', 'step_1']),
+        ('all', ['step_1', 'step_2']),
+    ],
+)
+def test_get_steps_to_run(c, step, expected):
+    c.yaml_dict = {'steps': {'step_1': [{'name': 'task_1'}], 'step_2': [{'name': 'task_2'}]}}
+    c.settings.step = step
+
+    assert c.get_steps_to_run() == expected
+
+
+def test_validate_dependencies_valid(c):
+    c.yaml_dict = {'steps': {'step_1': [{'name': 'task_1'}, {'name': 'task_2', 'depends_on': ['task_1']}]}}
+
+    c._validate_dependencies()
+
+
+@pytest.mark.parametrize(
+    'tasks',
+    [
+        [{'name': 'task_1', 'depends_on': ['task_2']}, {'name': 'task_2', 'depends_on': ['task_1']}],
+        [{'name': 'task_1', 'depends_on': ['task_1']}],
+        [{'name': 'task_1', 'depends_on': ['task_3']}],
+        [{'name': 'task_1', 'depends_on': 'task_2'}, {'name': 'task_2'}],
+    ],
+)
+def test_validate_dependencies_invalid(c, tasks):
+    c.yaml_dict = {'steps': {'step_1': tasks}}
+
+    with pytest.raises(SystemExit) as e:
+        c._validate_dependencies()
+
+    assert e.value.code == 1
+
+
 def test_settings_is_single_instance():
     s1 = settings()
     s2 = settings()
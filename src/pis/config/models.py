@@ -8,6 +8,9 @@ from pydantic import AfterValidator, BaseModel
 LOG_LEVELS = Literal['TRACE', 'DEBUG', 'INFO', 'SUCCESS', 'WARNING', 'ERROR', 'CRITICAL']
 """The log levels."""
 
+EXECUTORS = Literal['process', 'thread']
+"""The executor backends that can run the tasks of a step."""
+
 
 def remote_uri_is_valid(uri: str) -> str:
     """Validate a remote URI.
@@ -39,12 +42,14 @@ class TaskDefinition(BaseTaskDefinition, BaseModel, extra='allow'):
     This model is used to define the tasks to be run by the application. It includes
     the destination as a required field, as the tasks are expected to create a resource.
 
-    .. note:: PIS is not intended to be used by chaining tasks, as there is no way to
-        generate a dependency graph, all tasks will be sent to the worker pool at the same
-        time.
+    Tasks can be chained with the optional `depends_on` field, a list with the names
+    of other tasks in the same step. A task will only be sent to the worker pool once
+    all the tasks it depends on are staged, so it can use the resources they generate.
+    Tasks without dependencies are sent to the worker pool at the same time.
     """
 
     destination: Path
+    depends_on: list[str] = []
 
 
 class PretaskDefinition(BaseTaskDefinition, BaseModel, extra='allow'):
@@ -60,6 +65,15 @@ class EnvSettings(BaseModel):
     remote_uri: Annotated[str, AfterValidator(remote_uri_is_valid)] | None = None
     pool: int | None = None
     log_level: LOG_LEVELS | None = None
+    download_segments: int | None = None
+    download_segments_min_size: int | None = None
+    upload_workers: int | None = None
+    cache_dir: Path | None = None
+    cache_size: int | None = None
+    incremental: bool | None = None
+    streaming: bool | None = None
+    remote_copy: bool | None = None
+    executor: EXECUTORS | None = None
 
 
 class CliSettings(BaseModel):
@@ -71,6 +85,15 @@ class CliSettings(BaseModel):
     remote_uri: Annotated[str, AfterValidator(remote_uri_is_valid)] | None = None
     pool: int | None = None
     log_level: LOG_LEVELS | None = None
+    download_segments: int | None = None
+    download_segments_min_size: int | None = None
+    upload_workers: int | None = None
+    cache_dir: Path | None = None
+    cache_size: int | None = None
+    incremental: bool | None = None
+    streaming: bool | None = None
+    remote_copy: bool | None = None
+    executor: EXECUTORS | None = None
 
 
 class YamlSettings(BaseModel):
@@ -80,6 +103,17 @@ class YamlSettings(BaseModel):
     remote_uri: Annotated[str, AfterValidator(remote_uri_is_valid)] | None = None
     pool: int | None = None
     log_level: LOG_LEVELS | None = None
+    download_segments: int | None = None
+    download_segments_min_size: int | None = None
+    upload_workers: int | None = None
+    cache_dir: Path | None = None
+    cache_size: int | None = None
+    incremental: bool | None = None
+    streaming: bool | None = None
+    remote_copy: bool | None = None
+    executor: EXECUTORS | None = None
+    executors: dict[str, EXECUTORS] | None = None
+    pools: dict[str, int] | None = None
 
 
 class Settings(BaseModel):
@@ -99,7 +133,9 @@ class Settings(BaseModel):
     """
 
     step: str = ''
-    """The step to run. This is a required field, and its validation is handled by
+    """The step to run. It can also be a comma separated list of steps, or `all` to
+    run all the steps in the configuration file in a single invocation. This is a
+    required field, and its validation is handled by
     :func:`pis.config.config.Config._validate_step`."""
 
     config_file: Path = Path('config.yaml')
@@ -110,7 +146,8 @@ class Settings(BaseModel):
 
     remote_uri: Annotated[str, AfterValidator(remote_uri_is_valid)] | None = None
     """The remote working URI. If present, this is where resources, logs and manifest
-    will be uploaded to."""
+    will be uploaded to. It can be a Google Cloud Storage URI (`gs://`), or a local
+    directory (`file://`), see :mod:`pis.storage.local`."""
 
     pool: int = 5
     """The number of workers in the pool where tasks will run."""
@@ -118,6 +155,66 @@ class Settings(BaseModel):
     log_level: LOG_LEVELS = 'INFO'
     """See :data:`LOG_LEVELS`."""
 
+    download_segments: int = 1
+    """The number of concurrent byte ranges downloads are split into, for Google Cloud
+    Storage files and for HTTP servers that support range requests. A value of 1
+    disables segmented downloads. Tasks can override it with their own `segments`
+    field."""
+
+    download_segments_min_size: int = 32 * 1024**2
+    """The size in bytes from which downloads are split into segments. Smaller files
+    are not worth splitting, and are downloaded in a single stream."""
+
+    upload_workers: int = 8
+    """The number of parts uploaded at the same time for files larger than
+    :data:`pis.storage.google.PARALLEL_UPLOAD_THRESHOLD`, which are then composed
+    into the remote file. A value of 1 disables parallel uploads."""
+
+    cache_dir: Path | None = None
+    """The local directory for the download cache. It should be outside of the work
+    directory, so it can be shared across runs. If omitted, downloads are not cached.
+    See :class:`pis.util.cache.DownloadCache`."""
+
+    cache_size: int = 50 * 1024**3
+    """The maximum size of the download cache in bytes. When it is exceeded, the least
+    recently used files are evicted."""
+
+    incremental: bool = False
+    """Whether to skip the tasks that have not changed since the previous run. A task
+    is skipped when its definition is the same as in the manifest and its source has
+    the same fingerprint. See :meth:`pis.task.Task.fingerprint`."""
+
+    streaming: bool = False
+    """Whether to run the tasks in streaming mode. Instead of running, validating and
+    uploading all the tasks in three separate phases, each task is validated and
+    uploaded as soon as it finishes running, in a single worker pool."""
+
+    remote_copy: bool = False
+    """Whether the tasks that download a file from the same kind of remote storage as
+    :attr:`remote_uri`, like a Google Cloud Storage bucket, copy it straight to the
+    remote URI on the server side instead of downloading and uploading it again. The
+    files other tasks in the step depend on are still downloaded. See
+    :meth:`pis.task.Task.copy_to_remote`."""
+
+    executor: EXECUTORS = 'process'
+    """The executor backend that runs the tasks of the step, see :data:`EXECUTORS`.
+
+    The `process` backend runs the tasks in a pool of worker processes. The `thread`
+    backend runs them in a pool of threads, which avoids forking and pickling the
+    tasks, and is better suited to I/O bound steps. In both cases, :attr:`pool` is
+    the number of tasks that can run at the same time."""
+
+    executors: dict[str, EXECUTORS] = {}
+    """The executor backend for specific steps. It can only be set in the configuration
+    file, as a mapping of step names to backends, and takes precedence over
+    :attr:`executor` for the steps in it."""
+
+    pools: dict[str, int] = {}
+    """The number of workers for specific steps. It can only be set in the configuration
+    file, as a mapping of step names to pool sizes, and takes precedence over
+    :attr:`pool` for the steps in it. When several steps run at once, a step never
+    has more tasks running than its own pool size."""
+
     def merge_model(self, incoming: BaseModel):
         """Merge the fields of another model into this model.
 
@@ -239,6 +239,25 @@ def test_get_yaml_settings_valid():
     assert settings.log_level == 'INFO'
 
 
+def test_get_yaml_settings_executors():
+    settings = get_yaml_settings({**CONFIG_DICT_VALID, 'executor': 'process', 'executors': {'step_1': 'thread'}})
+
+    assert settings.executor == 'process'
+    assert settings.executors == {'step_1': 'thread'}
+
+
+def test_get_yaml_settings_pools():
+    settings = get_yaml_settings({**CONFIG_DICT_VALID, 'pool': 4, 'pools': {'step_1': 16}})
+
+    assert settings.pool == 4
+    assert settings.pools == {'step_1': 16}
+
+
+def test_get_yaml_settings_invalid_executor():
+    with pytest.raises(SystemExit):
+        get_yaml_settings({**CONFIG_DICT_VALID, 'executors': {'step_1': 'fibers'}})
+
+
 def test_get_yaml_settings_missing_fields():
     with pytest.raises(SystemExit) as e:
         get_yaml_settings(CONFIG_DICT_INVALID)
@@ -6,9 +6,9 @@ from importlib.metadata import version
 
 from loguru import logger
 
-from pis.config import init_config, settings
+from pis.config import init_config, settings, steps_to_run
 from pis.manifest.manifest import Manifest
-from pis.step import Step
+from pis.step import Step, execute_steps
 from pis.task import init_task_registry
 from pis.util.fs import check_dir
 from pis.util.logger import init_logger
@@ -23,10 +23,14 @@ def main():
     2. Make some checks on the working directory.
     3. Initialize the logger.
     4. Initialize the task registry, loading all tasks in the tasks module.
-    5. Create a step object based on the configuration.
-    6. Execute the step.
-    7. Create a manifest object and update it with the step information.
-    8. Complete the manifest, saving it both locally and remotely (if configured).
+    5. Load the manifest.
+    6. Create the step objects based on the configuration. The previous run of each
+       step is passed along, to order the tasks by the time they took and, in
+       incremental runs, to skip the unchanged ones.
+    7. Execute the steps. If there are several, they run at the same time sharing
+       the worker pools.
+    8. As each step finishes, update the manifest with the step information and
+       save it both locally and remotely (if configured).
     """
     logger.info(f'starting PIS v{version('pis')}')
 
@@ -37,20 +41,29 @@ def main():
     init_task_registry()
 
     logger.debug(f'using {ssl.OPENSSL_VERSION}')
-    logger.debug(f'running with {settings().pool} worker processes')
-
-    step = Step(settings().step)
-    step.execute()
+    logger.debug(f'running with {settings().pool} workers')
 
     manifest = Manifest()
-    manifest.update_step(step)
-    manifest.complete()
+    steps = [Step(s, manifest.get_step(s)) for s in steps_to_run()]
 
-    if not manifest.run_ok():
-        logger.error(f'step {step.name} did not complete successfully')
-        sys.exit(1)
+    def on_completed(step: Step):
+        manifest.update_step(step)
+        manifest.complete()
+
+    if len(steps) == 1:
+        on_completed(steps[0].execute())
     else:
-        logger.success(f'step {step.name} completed successfully!')
+        execute_steps(steps, on_completed)
+
+    failed_steps = manifest.failed_steps()
+    for step in steps:
+        if step.name in failed_steps:
+            logger.error(f'step {step.name} did not complete successfully')
+        else:
+            logger.success(f'step {step.name} completed successfully!')
+
+    if failed_steps:
+        sys.exit(1)
 
     if not manifest.is_completed():
         logger.warning('there are incomplete steps in the manifest')
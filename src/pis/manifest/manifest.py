@@ -35,6 +35,7 @@ class Manifest:
         self._remote_uri = f'{settings().remote_uri}/{MANIFEST_FILENAME}' if settings().remote_uri else None
         self._local_path = absolute_path(MANIFEST_FILENAME)
         self._revision = 0
+        self._relevant_steps: dict[str, Step] = {}
         self._manifest = self._load_remote() or self._load_local() or self._create_empty()
 
     def _load_remote(self) -> RootManifest | None:
@@ -83,8 +84,11 @@ class Manifest:
             raise PISCriticalError(f'error serializing manifest: {e}')
 
     def _refresh_from_remote(self):
-        self._load_remote()
-        self.update_step(self._relevant_step)
+        self._manifest = self._load_remote() or self._manifest
+        for step in self._relevant_steps.values():
+            self._manifest.steps[step.name] = step._manifest
+        self._manifest.modified = datetime.now()
+        self._recount()
         self._save_local()
 
     def _save_remote(self):
@@ -94,7 +98,8 @@ class Manifest:
         remote_storage = get_remote_storage(self._remote_uri)
         while not uploaded:
             try:
-                remote_storage.upload(self._local_path, self._remote_uri, self._revision)
+                # the next save of this run must be based on the manifest just saved
+                self._revision = remote_storage.upload(self._local_path, self._remote_uri, self._revision)
                 uploaded = True
             except PreconditionFailedError as e:
                 logger.debug(f'{e}, retrying after {UPLOAD_COOLDOWN} seconds...')
@@ -145,13 +150,23 @@ class Manifest:
             result = Result.COMPLETED
         self._manifest.result = result
 
+    def get_step(self, name: str) -> StepManifest | None:
+        """Get the manifest of a step.
+
+        :param name: The name of the step.
+        :type name: str
+        :return: The step manifest, or `None` if the step is not in the manifest.
+        :rtype: StepManifest | None
+        """
+        return self._manifest.steps.get(name)
+
     def update_step(self, step: 'Step'):
         """Update the manifest with the step.
 
         :param step: The step to update the manifest with.
         :type step: Step
         """
-        self._relevant_step = step
+        self._relevant_steps[step.name] = step
         self._manifest.steps[step.name] = step._manifest
         self._manifest.modified = datetime.now()
         self._recount()
@@ -163,21 +178,28 @@ class Manifest:
 
         logger.info(f'manifest closed, result: {self._manifest.result}')
 
+    def failed_steps(self) -> list[str]:
+        """Return the steps of this run that were not successful.
+
+        Note a step is successful if it is in validated state if the run is local, or
+        in complete state if the run has a remote URI.
+
+        :return: The names of the steps that were not successful.
+        :rtype: list[str]
+        """
+        expected_result = Result.COMPLETED if settings().remote_uri else Result.VALIDATED
+        return [n for n in self._relevant_steps if self._manifest.steps[n].result != expected_result]
+
     def run_ok(self) -> bool:
         """Return whether the run was successful.
 
-        Note a successful run is defined as the step being in validated state if the
-        run is local, or in complete state if the run has a remote URI.
+        Note a successful run is defined as all the steps run being in validated state
+        if the run is local, or in complete state if the run has a remote URI.
 
         :return: Whether the run was successful.
         :rtype: bool
         """
-        relevant_step_result = self._manifest.steps[self._relevant_step.name].result
-
-        if settings().remote_uri:
-            return relevant_step_result == Result.COMPLETED
-        else:
-            return relevant_step_result == Result.VALIDATED
+        return not self.failed_steps()
 
     def is_completed(self) -> bool:
         """Return whether the manifest is completed.
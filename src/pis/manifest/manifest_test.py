@@ -43,6 +43,13 @@ with freeze_time('2024-06-27 10:00:00'):
     }
 
 
+@pytest.fixture(autouse=True)
+def frozen_time():
+    # the manifests created by the tests must match the ones above
+    with freeze_time('2024-06-27 10:00:00'):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def mocked_settings():
     with patch('pis.manifest.manifest.settings') as mock_settings:
@@ -142,11 +149,14 @@ def test_create_empty_ok(mock_load_remote, mock_load_local):
 @patch('pis.manifest.manifest.get_remote_storage')
 def test_save_remote_ok(mock_remote_storage):
     mock_remote_storage.return_value.download_to_string.return_value = (content_json, 81235723895)
+    mock_remote_storage.return_value.upload.side_effect = [81235723896, 81235723897]
     m = Manifest()
 
+    m._save_remote()
     m._save_remote()
 
-    assert mock_remote_storage.return_value.upload.call_count == 1
+    assert [c.args[2] for c in mock_remote_storage.return_value.upload.call_args_list] == [81235723895, 81235723896]
+    assert m._revision == 81235723897
 
 
 @patch('time.sleep')
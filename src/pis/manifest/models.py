@@ -3,9 +3,9 @@
 from datetime import UTC, datetime
 from enum import StrEnum, auto
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from pis.config import settings
 
@@ -44,36 +44,71 @@ class Resource(BaseModel):
         return Resource(source=self.source, destination=abs_destination)
 
 
+class Upload(BaseModel):
+    """Upload model.
+
+    A file a task sent to the remote storage, with its size and CRC32C checksum, and
+    whether it was `uploaded`, `copied` on the server side from the remote `source`
+    file with the same contents, or `skipped` because the remote file was the same.
+    See :meth:`pis.storage.remote_storage.RemoteStorage.sync`. Files that tasks copy
+    from their source without downloading them are recorded as `copied` too, see
+    :meth:`pis.task.Task.copy_to_remote`.
+    """
+
+    destination: str
+    size: int
+    crc32c: int | None = None
+    action: Literal['uploaded', 'copied', 'skipped']
+    source: str | None = None
+
+
 class TaskManifest(BaseModel, extra='allow'):
-    """Model for a task in a step of the manifest."""
+    """Model for a task in a step of the manifest.
+
+    The `fingerprint` of the task source is recorded in incremental runs, and
+    `skipped` is set when the task was not run because neither its definition nor
+    its fingerprint changed since the previous run. The files the task sent to the
+    remote storage are recorded in `uploads`.
+    """
 
     name: str
     result: Result = Result.PENDING
-    created: datetime = datetime.now(UTC)
-    staged: datetime = datetime.now(UTC)
+    created: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    staged: datetime = Field(default_factory=lambda: datetime.now(UTC))
     elapsed: float = 0.0
     log: list[str] = []
     definition: dict[str, Any] = {}
+    fingerprint: dict[str, Any] = {}
+    skipped: bool = False
+    uploads: list[Upload] = []
 
 
 class StepManifest(BaseModel):
-    """Model for a step in the manifest."""
+    """Model for a step in the manifest.
+
+    The bytes of all the files its tasks sent to the remote storage are added up in
+    `bytes_uploaded`, `bytes_copied` and `bytes_skipped`, by what was done with them.
+    See :class:`Upload`.
+    """
 
     name: str
     result: Result = Result.PENDING
-    created: datetime = datetime.now(UTC)
+    created: datetime = Field(default_factory=lambda: datetime.now(UTC))
     completed: datetime | None = None
     elapsed: float = 0.0
     log: list[str] = []
     tasks: list[TaskManifest] = []
     resources: list[Resource] = []
+    bytes_uploaded: int = 0
+    bytes_copied: int = 0
+    bytes_skipped: int = 0
 
 
 class RootManifest(BaseModel):
     """Model for the root of the manifest."""
 
     result: Result = Result.PENDING
-    created: datetime = datetime.now(UTC)
-    modified: datetime = datetime.now(UTC)
+    created: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    modified: datetime = Field(default_factory=lambda: datetime.now(UTC))
     log: list[str] = []
     steps: dict[str, StepManifest] = {}  # The steps of the manifest.
@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING
 
 from loguru import logger
 
+from pis.config import settings
 from pis.manifest.models import Result, StepManifest
 
 if TYPE_CHECKING:
@@ -50,6 +51,23 @@ class StepReporter:
         self._manifest.log.append(msg)
         logger.opt(exception=sys.exc_info()).error(msg)
 
+    def streamed(self, tasks: list['Task']):
+        """Set the step result to the last phase that all the tasks got through.
+
+        In streaming mode there are no phase barriers, so the phase results are set
+        after all the tasks have finished, up to the first phase where a task failed.
+        """
+        phases = ['run', 'validate', 'upload']
+        failed = [phases.index(t._failed_in) for t in tasks if t._failed_in in phases]
+        first_failed = min(failed, default=len(phases))
+
+        if first_failed > 0:
+            self.staged(f'ran {len(tasks)} tasks')
+        if first_failed > 1:
+            self.validated(f'checked {len(tasks)} tasks')
+        if first_failed > 2 and settings().remote_uri:
+            self.completed(f'uploaded {len(tasks)} tasks')
+
     def attach_manifest(self, task: 'Task'):
         """Attach a task manifest to the step manifest."""
         self._manifest.tasks.append(task._manifest)
@@ -69,6 +87,12 @@ class StepReporter:
                     break
             if not inserted:
                 self._manifest.tasks.append(task._manifest)
+                self._manifest.resources.extend(task._resources)
+
+        uploads = [u for t in self._manifest.tasks for u in t.uploads]
+        self._manifest.bytes_uploaded = sum(u.size for u in uploads if u.action == 'uploaded')
+        self._manifest.bytes_copied = sum(u.size for u in uploads if u.action == 'copied')
+        self._manifest.bytes_skipped = sum(u.size for u in uploads if u.action == 'skipped')
 
 
 def report(func):
@@ -83,6 +107,8 @@ def report(func):
                 logger.info('step validation started')
             elif func.__name__ == '_upload':
                 logger.info('step upload started')
+            elif func.__name__ == '_stream':
+                logger.info('step streaming started')
 
             result = func(self, *args, **kwargs)
 
@@ -95,6 +121,8 @@ def report(func):
                 self.validated(f'checked {len(result)} tasks')
             elif func.__name__ == '_upload':
                 self.completed(f'uploaded {len(result)} tasks')
+            elif func.__name__ == '_stream':
+                self.streamed(result)
             return result
         except Exception as e:
             kwargs['abort'].set()
@@ -0,0 +1,67 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pis.config.models import Settings
+from pis.manifest.models import Result, TaskManifest, Upload
+from pis.manifest.step_reporter import StepReporter
+
+
+@pytest.fixture(autouse=True)
+def mock_settings():
+    with patch('pis.manifest.step_reporter.settings', return_value=Settings(remote_uri='gs://bucket')):
+        yield
+
+
+def _task(failed_in: str | None = None) -> MagicMock:
+    task = MagicMock()
+    task._failed_in = failed_in
+    return task
+
+
+def test_streamed_all_completed():
+    reporter = StepReporter('step')
+
+    reporter.streamed([_task(), _task()])
+
+    assert reporter._manifest.result == Result.COMPLETED
+    assert len(reporter._manifest.log) == 3
+
+
+@pytest.mark.parametrize(
+    ('failed_in', 'result'),
+    [
+        ('run', Result.PENDING),
+        ('validate', Result.STAGED),
+        ('upload', Result.VALIDATED),
+    ],
+)
+def test_streamed_stops_at_first_failed_phase(failed_in, result):
+    reporter = StepReporter('step')
+
+    reporter.streamed([_task(), _task('upload'), _task(failed_in)])
+
+    assert reporter._manifest.result == result
+
+
+def test_upsert_task_manifests_adds_up_uploads():
+    reporter = StepReporter('step')
+    task = _task()
+    task.name = 'task'
+    task._resources = []
+    task._manifest = TaskManifest(
+        name='task',
+        uploads=[
+            Upload(destination='gs://bucket/a', size=10, crc32c=1, action='uploaded'),
+            Upload(destination='gs://bucket/b', size=20, crc32c=2, action='skipped'),
+            Upload(destination='gs://bucket/c', size=30, crc32c=3, action='copied', source='gs://bucket/d'),
+            Upload(destination='gs://bucket/e', size=40, crc32c=4, action='uploaded'),
+        ],
+    )
+
+    reporter.upsert_task_manifests([task])
+    reporter.upsert_task_manifests([task])
+
+    assert reporter._manifest.bytes_uploaded == 50
+    assert reporter._manifest.bytes_skipped == 20
+    assert reporter._manifest.bytes_copied == 30
@@ -1,52 +1,76 @@
 """TaskReporter class and report decorator for logging and updating tasks in the manifest."""
 
+import hashlib
+import json
 import sys
 from datetime import UTC, datetime
 from functools import wraps
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from loguru import logger
 
 from pis.config import settings
 from pis.manifest.models import Resource, Result, TaskManifest
 from pis.util.errors import TaskAbortedError
+from pis.util.fs import absolute_path
 
 if TYPE_CHECKING:
     from pis.task import Task
 
 
+def _definition_hash(definition: dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode()).hexdigest()
+
+
 class TaskReporter:
     """Class for logging and updating tasks in the manifest."""
 
     def __init__(self, name: str):
         self.name = name
         self._manifest: TaskManifest
+        self._previous: TaskManifest | None = None
         self._resources: list[Resource] = []
+        self._failed_in: str | None = None
 
     def staged(self, log: str):
         """Set the task result to STAGED."""
         self._manifest.result = Result.STAGED
         self._manifest.staged = datetime.now(UTC)
+        if self._manifest.skipped:
+            logger.success('task staged: skipped')
+            return
         self._manifest.elapsed = (self._manifest.staged - self._manifest.created).total_seconds()
         logger.success(f'task staged: ran for {self._manifest.elapsed:.2f}s')
 
-    def validated(self, log: str, resource: Resource | None = None):
+    def validated(self, log: str, resources: list[Resource] | None = None):
         """Set the task result to VALIDATED."""
         self._manifest.result = Result.VALIDATED
-        if resource:
-            self._resources.append(resource.make_absolute())
+        self._resources.extend(r.make_absolute() for r in resources or [])
         logger.success(f'task validated: {log}')
 
-    def completed(self, log: str, resource: Resource | None = None):
+    def completed(self, log: str, resources: list[Resource] | None = None):
         """Set the task result to COMPLETED."""
         self._manifest.result = Result.COMPLETED
-        if resource:
-            self._resources.append(resource.make_absolute())
+        self._resources.extend(r.make_absolute() for r in resources or [])
         logger.success(f'task completed: {log}')
 
+    def skipped(self, log: str):
+        """Mark the task as skipped, so validation and upload are bypassed.
+
+        The time the task took and the files it uploaded are carried over from the
+        previous run, so the step keeps ranking the task by its cost and accounting
+        for the bytes of its resource.
+        """
+        self._manifest.skipped = True
+        if self._previous:
+            self._manifest.elapsed = self._previous.elapsed
+            self._manifest.uploads = [u.model_copy() for u in self._previous.uploads]
+        logger.success(f'task skipped: {log}')
+
     def failed(self, error: Exception, where: str):
         """Set the task result to FAILED."""
         self._manifest.result = Result.FAILED
+        self._failed_in = where
         logger.opt(exception=sys.exc_info()).error(f'task failed {where}: {error}')
 
     def aborted(self):
@@ -54,6 +78,33 @@ class TaskReporter:
         self._manifest.result = Result.ABORTED
         logger.warning('task aborted')
 
+    def _check_unchanged(self: 'Task'):
+        """Fingerprint the task source and skip the task if it did not change.
+
+        The task is skipped if the previous run of the task succeeded, its definition
+        is the same, and the fingerprint of its source matches the previous one.
+        """
+        try:
+            self._manifest.fingerprint = self.fingerprint() or {}
+        except Exception as e:
+            logger.warning(f'could not fingerprint task source: {e}')
+            return
+
+        previous = self._previous
+        expected = Result.COMPLETED if settings().remote_uri else Result.VALIDATED
+        if not self._manifest.fingerprint:
+            logger.debug('task source cannot be fingerprinted, running task')
+        elif previous is None or previous.result != expected:
+            logger.debug('no successful previous run of the task, running task')
+        elif _definition_hash(previous.definition) != _definition_hash(self._manifest.definition):
+            logger.info('task definition changed since the previous run, running task')
+        elif previous.fingerprint != self._manifest.fingerprint:
+            logger.info(f'task source changed since the previous run: {previous.fingerprint}')
+        elif not settings().remote_uri and not absolute_path(self.definition.destination).exists():
+            logger.info('task resource is missing from the work dir, running task')
+        else:
+            self.skipped(f'unchanged since {previous.staged:%Y-%m-%d %H:%M:%S}, fingerprint {previous.fingerprint}')
+
 
 def report(func):
     """Decorator for logging and updating tasks in the manifest."""
@@ -63,21 +114,24 @@ def report(func):
         try:
             if func.__name__ == 'run':
                 logger.info('task run started')
-                # add task definition to the manifest
-                self._manifest = self._manifest.model_copy(update={'definition': self.definition.__dict__}, deep=True)
+                # add task definition to the manifest, the task elapsed time counts from here
+                update = {'definition': self.definition.__dict__, 'created': datetime.now(UTC)}
+                self._manifest = self._manifest.model_copy(update=update, deep=True)
+                if settings().incremental:
+                    self._check_unchanged()
             elif func.__name__ == 'validate':
                 logger.info('task validation started')
             elif func.__name__ == 'upload':
                 logger.info('task upload started')
 
-            result: Task = func(self, *args, **kwargs)
+            result: Task = self if self._manifest.skipped else func(self, *args, **kwargs)
 
             if func.__name__ == 'run':
                 self.staged(result.name)
             elif func.__name__ == 'validate':
-                self.validated(result.name, result.resource if not settings().remote_uri else None)
+                self.validated(result.name, result.resources if not settings().remote_uri else None)
             elif func.__name__ == 'upload':
-                self.completed(result.name, result.resource)
+                self.completed(result.name, result.resources)
             return result
         except Exception as e:
             kwargs['abort'].set()
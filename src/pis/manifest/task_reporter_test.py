@@ -0,0 +1,256 @@
+import string
+from datetime import timedelta
+from pathlib import Path
+from threading import Event
+from typing import Any, Self
+from unittest.mock import patch
+
+import pytest
+from freezegun import freeze_time
+
+from pis.config.models import Settings, TaskDefinition
+from pis.manifest.models import Resource, Result, TaskManifest, Upload
+from pis.manifest.task_reporter import report
+from pis.storage.remote_storage import RemoteEntry, UploadResult
+from pis.task import Task
+from pis.tasks.download_latest import DownloadLatest, DownloadLatestDefinition
+
+FINGERPRINT = {'ETag': '"abc"'}
+
+
+class Fingerprinted(Task):
+    def __init__(self, definition: TaskDefinition):
+        super().__init__(definition)
+        self.resource = Resource(source='source', destination=str(definition.destination))
+        self.runs = 0
+
+    def fingerprint(self) -> dict[str, Any] | None:
+        return FINGERPRINT
+
+    @report
+    def run(self, *, abort: Event) -> Self:
+        self.runs += 1
+        return self
+
+
+@pytest.fixture(autouse=True)
+def mock_scratchpad():
+    with patch('pis.task.task.scratchpad') as mock_scratchpad:
+        mock_scratchpad.return_value.replace.side_effect = lambda value: value
+        yield mock_scratchpad
+
+
+@pytest.fixture(autouse=True)
+def mock_settings():
+    s = Settings(remote_uri='gs://bucket', incremental=True)
+    with (
+        patch('pis.manifest.task_reporter.settings', return_value=s) as mock_settings,
+        patch('pis.manifest.models.settings', return_value=s),
+    ):
+        yield mock_settings
+
+
+@pytest.fixture
+def task():
+    task = Fingerprinted(TaskDefinition(name='fingerprinted task', destination=Path('file.txt')))
+    task._manifest = TaskManifest(name=task.name)
+    return task
+
+
+def _previous(task: Task, **kwargs) -> TaskManifest:
+    fields = {'result': Result.COMPLETED, 'definition': task.definition.__dict__, 'fingerprint': FINGERPRINT}
+    return TaskManifest(name=task.name, **{**fields, **kwargs})
+
+
+def test_tasks_run_in_sequence_report_their_own_elapsed_time(mock_settings):
+    mock_settings.return_value = Settings()
+    with freeze_time('2024-06-27 10:00:00') as frozen_time:
+
+        class Slow(Fingerprinted):
+            @report
+            def run(self, *, abort: Event) -> Self:
+                frozen_time.tick(timedelta(seconds=5))
+                return self
+
+        tasks = [Slow(TaskDefinition(name=f'slow task {i}', destination=Path('file.txt'))) for i in range(2)]
+        for t in tasks:
+            t._manifest = TaskManifest(name=t.name)
+        frozen_time.tick(timedelta(seconds=60))
+        for t in tasks:
+            t.run(abort=Event())
+
+    assert [t._manifest.elapsed for t in tasks] == [5.0, 5.0]
+
+
+def test_unchanged_task_is_skipped(task):
+    task._previous = _previous(task)
+
+    task.run(abort=Event())
+
+    assert task.runs == 0
+    assert task._manifest.skipped
+    assert task._manifest.result == Result.STAGED
+    assert task._manifest.fingerprint == FINGERPRINT
+
+
+def test_skipped_task_keeps_previous_elapsed_time_and_uploads(task):
+    uploads = [Upload(destination='gs://bucket/file.txt', size=10, crc32c=1, action='uploaded')]
+    task._previous = _previous(task, elapsed=12.5, uploads=uploads)
+
+    task.run(abort=Event())
+
+    assert task._manifest.skipped
+    assert task._manifest.elapsed == 12.5
+    assert task._manifest.uploads == uploads
+
+
+def test_unchanged_download_latest_is_skipped_without_downloading():
+    definition = DownloadLatestDefinition.model_validate({
+        'name': 'download_latest file',
+        'destination': Path('file.txt'),
+        'source': 'gs://bucket/prefix',
+    })
+    task = DownloadLatest(definition)
+    task._manifest = TaskManifest(name=task.name)
+    fingerprint = {'uri': 'gs://bucket/prefix/new.txt', 'mtime': 2.0, 'generation': 2, 'size': 20}
+    task._previous = _previous(task, fingerprint=fingerprint)
+    entries = [
+        RemoteEntry('gs://bucket/prefix/old.txt', mtime=1.0, size=10, generation=1),
+        RemoteEntry('gs://bucket/prefix/new.txt', mtime=2.0, size=20, generation=2),
+    ]
+    with (
+        patch('pis.tasks.download_latest.get_remote_storage') as mock_remote_storage,
+        patch('pis.tasks.download_latest.DownloadHelper') as mock_helper,
+    ):
+        mock_remote_storage.return_value.list_entries.return_value = entries
+        task.run(abort=Event())
+
+    assert task._manifest.skipped
+    assert task._manifest.fingerprint == fingerprint
+    assert task.resource == Resource(source='gs://bucket/prefix/new.txt', destination='file.txt')
+    mock_remote_storage.return_value.list_entries.assert_called_once_with('gs://bucket/prefix', None)
+    mock_helper.assert_not_called()
+
+
+def test_task_without_previous_run_is_not_skipped(task):
+    task.run(abort=Event())
+
+    assert task.runs == 1
+    assert not task._manifest.skipped
+    assert task._manifest.fingerprint == FINGERPRINT
+
+
+@pytest.mark.parametrize(
+    'changes',
+    [
+        {'result': Result.FAILED},
+        {'definition': {'name': 'fingerprinted task', 'destination': 'other.txt'}},
+        {'fingerprint': {'ETag': '"def"'}},
+    ],
+)
+def test_changed_task_is_not_skipped(task, changes):
+    task._previous = _previous(task, **changes)
+
+    task.run(abort=Event())
+
+    assert task.runs == 1
+    assert not task._manifest.skipped
+
+
+def test_skipped_task_bypasses_upload(task):
+    task._previous = _previous(task)
+
+    with patch('pis.task.task.get_remote_storage') as mock_remote_storage:
+        task.run(abort=Event())
+        task.validate(abort=Event())
+        task.upload(abort=Event())
+
+    mock_remote_storage.assert_not_called()
+    assert task._manifest.result == Result.COMPLETED
+    assert task._resources == [Resource(source='source', destination='gs://bucket/file.txt')]
+
+
+def test_task_with_several_resources_reports_all(task, mock_settings, tmp_path):
+    mock_settings.return_value = Settings(remote_uri='gs://bucket', incremental=True, work_dir=tmp_path)
+    (tmp_path / 'file.txt').write_text('contents')
+    other = Resource(source='other', destination='other.txt')
+    with (
+        patch.object(Fingerprinted, 'resources', [task.resource, other]),
+        patch('pis.task.task.settings', mock_settings),
+        patch('pis.util.fs.settings', mock_settings),
+        patch('pis.task.task.get_remote_storage') as mock_remote_storage,
+    ):
+        mock_remote_storage.return_value.sync.return_value = UploadResult('gs://bucket/file.txt', 8, 1, 'uploaded')
+        task.run(abort=Event())
+        task.validate(abort=Event())
+        task.upload(abort=Event())
+
+    assert [r.destination for r in task._resources] == ['gs://bucket/file.txt', 'gs://bucket/other.txt']
+
+
+def test_upload_records_what_was_done(task, mock_settings, tmp_path):
+    mock_settings.return_value = Settings(remote_uri='gs://bucket', incremental=True, work_dir=tmp_path)
+    (tmp_path / 'file.txt').write_text(string.digits)
+    task._previous = _previous(
+        task,
+        fingerprint={'ETag': '"old"'},
+        uploads=[
+            Upload(destination='gs://bucket/old.txt', size=10, crc32c=1, action='uploaded'),
+            Upload(destination='gs://bucket/other.txt', size=20, crc32c=2, action='uploaded'),
+        ],
+    )
+    with (
+        patch('pis.task.task.settings', mock_settings),
+        patch('pis.util.fs.settings', mock_settings),
+        patch('pis.task.task.get_remote_storage') as mock_remote_storage,
+    ):
+        sync = mock_remote_storage.return_value.sync
+        sync.return_value = UploadResult('gs://bucket/file.txt', 10, 1, 'copied', 'gs://bucket/old.txt')
+        task.run(abort=Event())
+        task.validate(abort=Event())
+        task.upload(abort=Event())
+
+    sync.assert_called_once_with(tmp_path / 'file.txt', 'gs://bucket/file.txt', ['gs://bucket/old.txt'])
+    assert task._manifest.uploads == [
+        Upload(destination='gs://bucket/file.txt', size=10, crc32c=1, action='copied', source='gs://bucket/old.txt')
+    ]
+
+
+def test_copy_to_remote_replaces_download_and_upload(task, mock_settings):
+    mock_settings.return_value = Settings(remote_uri='gs://bucket', remote_copy=True)
+    with (
+        patch('pis.task.task.settings', mock_settings),
+        patch('pis.task.task.get_remote_storage') as mock_remote_storage,
+    ):
+        mock_remote_storage.return_value.stat.return_value = {'size': 10, 'crc32c': 1}
+        copied = task.copy_to_remote('gs://source/file.txt')
+        task.upload(abort=Event())
+
+    assert copied
+    mock_remote_storage.return_value.copy.assert_called_once_with('gs://source/file.txt', 'gs://bucket/file.txt')
+    mock_remote_storage.return_value.sync.assert_not_called()
+    assert task._manifest.uploads == [
+        Upload(destination='gs://bucket/file.txt', size=10, crc32c=1, action='copied', source='gs://source/file.txt')
+    ]
+
+
+@pytest.mark.parametrize(
+    ('remote_copy', 'source', 'needed_locally'),
+    [
+        (False, 'gs://source/file.txt', False),
+        (True, 'https://example.com/file.txt', False),
+        (True, 'gs://source/file.txt', True),
+    ],
+)
+def test_copy_to_remote_falls_back_to_download(task, mock_settings, remote_copy, source, needed_locally):
+    mock_settings.return_value = Settings(remote_uri='gs://bucket', remote_copy=remote_copy)
+    task.needed_locally = needed_locally
+    with (
+        patch('pis.task.task.settings', mock_settings),
+        patch('pis.task.task.get_remote_storage') as mock_remote_storage,
+    ):
+        assert not task.copy_to_remote(source)
+
+    mock_remote_storage.assert_not_called()
+    assert not task.copied_to_remote
+    assert task._manifest.uploads == []
@@ -1,17 +1,25 @@
 """Step module."""
 
-from collections.abc import Callable
+from collections import Counter, deque
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager, nullcontext
+from graphlib import TopologicalSorter
 from multiprocessing import Manager
-from multiprocessing.pool import Pool
-from threading import Event
-from typing import TYPE_CHECKING
+from multiprocessing.managers import SyncManager
+from multiprocessing.pool import Pool, ThreadPool
+from queue import SimpleQueue
+from threading import Event, Lock
+from typing import TYPE_CHECKING, Any, Self
 
 from loguru import logger
 
-from pis.config import settings, task_definitions
+from pis.config import settings, step_context, task_definitions
+from pis.manifest.models import Result, StepManifest
 from pis.manifest.step_reporter import StepReporter, report
 from pis.task import task_registry
-from pis.util.errors import StepFailedError
+from pis.util.errors import StepFailedError, TaskExitError
+from pis.util.fs import absolute_path
 from pis.util.logger import task_logging
 
 if TYPE_CHECKING:
@@ -28,36 +36,341 @@ def _executor(task: 'Task', func_name: str, abort: Event) -> 'Task':
         return task
 
 
+@contextmanager
+def _exit_as_error() -> Iterator[None]:
+    # the pools only report exceptions, anything else kills the worker, and the step
+    # would wait for its result forever
+    try:
+        yield
+    except Exception:
+        raise
+    except BaseException as e:
+        raise TaskExitError(f'task exited with {e!r}') from e
+
+
 def _execute(args):
     task, func_name, abort = args
-    return _executor(task, func_name, abort)
+    with _exit_as_error():
+        return _executor(task, func_name, abort)
 
 
-class XPool(Pool):
-    """Extended Pool class.
+def _estimate_cost(task: 'Task') -> float | None:
+    try:
+        return task.estimate_cost()
+    except Exception as e:
+        logger.debug(f'could not estimate the cost of {task.name}: {e}')
+        return None
 
-    This class extends the Pool class to add an xmap method that allows for the execution of
-    a function on a list of tasks, while also providing an abort mechanism.
+
+def _pipeline(task: 'Task', func_names: list[str], abort: Event) -> 'Task':
+    with task_logging(task):
+        for func_name in func_names:
+            if abort.is_set():
+                task.aborted()
+                break
+            func: Callable = getattr(task, func_name)
+            func(abort=abort)
+            if task._manifest.result in [Result.FAILED, Result.ABORTED]:
+                break
+        return task
+
+
+def _execute_pipeline(args):
+    task, func_names, abort = args
+    with _exit_as_error():
+        return _pipeline(task, func_names, abort)
+
+
+class _XMap:
+    """Mixin that adds the xmap and xpipeline methods to a pool.
+
+    Both methods are built on top of the imap_unordered method of the pool or, if a
+    dependency graph is given, of the imap_graph method.
     """
 
-    def xmap(self, func_name: str, tasks: list['Task'], abort: Event) -> list['Task']:
+    def imap_graph(self, func: Callable, items: dict[Hashable, Any], graph: dict[Hashable, set]) -> Iterator:
+        """Apply a function to every item, following a dependency graph.
+
+        Each item is submitted to the pool as soon as the items it depends on are done,
+        so independent branches of the graph run in parallel. Items that become ready
+        at the same time are submitted in the order they have in `items`.
+
+        :param func: The function to apply.
+        :type func: Callable
+        :param items: The items to apply the function to, by name.
+        :type items: dict[Hashable, Any]
+        :param graph: The names of the items that each item depends on.
+        :type graph: dict[Hashable, set]
+        :return: An iterator over the results, in the order they finish.
+        :rtype: Iterator
+        """
+        sorter = TopologicalSorter(graph)
+        sorter.prepare()
+        done: SimpleQueue = SimpleQueue()
+        position = {name: i for i, name in enumerate(items)}
+
+        while sorter.is_active():
+            for name in sorted(sorter.get_ready(), key=position.__getitem__):
+                self.apply_async(  # type: ignore[attr-defined]
+                    func,
+                    (items[name],),
+                    callback=lambda r, name=name: done.put((name, r, None)),
+                    error_callback=lambda e, name=name: done.put((name, None, e)),
+                )
+            name, result, error = done.get()
+            if error:
+                raise error
+            sorter.done(name)
+            yield result
+
+    def _imap(self, func: Callable, items: list[tuple], graph: dict[Hashable, set] | None) -> list:
+        if graph:
+            return list(self.imap_graph(func, {i[0].name: i for i in items}, graph))
+        # no chunking, so each idle worker picks the next task in order
+        return list(self.imap_unordered(func, items))  # type: ignore[attr-defined]
+
+    def xmap(
+        self,
+        func_name: str,
+        tasks: list['Task'],
+        abort: Event,
+        graph: dict[Hashable, set] | None = None,
+    ) -> list['Task']:
         """Execute a function on a list of tasks.
 
         This is a wrapper for imap_unordered that allows for the execution of a function
         on a list of tasks with arbitrary parameters without having to clump them together
         in a single tuple. It also provides an abort mechanism.
 
+        Tasks are handed to the workers one at a time, in the order of the list.
+
         :param func_name: The name of the function to execute on the tasks.
         :type func_name: str
         :param tasks: The list of tasks to execute the function on.
         :type tasks: list[Task]
         :param abort: The abort event to signal the tasks to stop execution.
         :type abort: Event
+        :param graph: Optional. The names of the tasks that each task depends on. If
+            given, a task will only be executed after its dependencies.
+        :type graph: dict[Hashable, set] | None
 
         :return: The list of tasks after the function has been executed on them.
         :rtype: list[Task]
         """
-        return list(self.imap_unordered(_execute, [(t, func_name, abort) for t in tasks]))
+        return self._imap(_execute, [(t, func_name, abort) for t in tasks], graph)
+
+    def xpipeline(
+        self,
+        func_names: list[str],
+        tasks: list['Task'],
+        abort: Event,
+        graph: dict[Hashable, set] | None = None,
+    ) -> list['Task']:
+        """Execute a sequence of functions on a list of tasks.
+
+        Each task goes through all the functions in order inside the same worker, as
+        soon as it is picked from the queue, so a task does not have to wait for the
+        rest to finish a function before moving on to the next one. A task stops if
+        any of the functions fails, or if the abort event is set.
+
+        :param func_names: The names of the functions to execute on the tasks, in order.
+        :type func_names: list[str]
+        :param tasks: The list of tasks to execute the functions on.
+        :type tasks: list[Task]
+        :param abort: The abort event to signal the tasks to stop execution.
+        :type abort: Event
+        :param graph: Optional. The names of the tasks that each task depends on. If
+            given, a task will only be executed after its dependencies went through
+            all the functions.
+        :type graph: dict[Hashable, set] | None
+
+        :return: The list of tasks after the functions have been executed on them.
+        :rtype: list[Task]
+        """
+        return self._imap(_execute_pipeline, [(t, func_names, abort) for t in tasks], graph)
+
+
+class XPool(_XMap, Pool):
+    """Extended Pool class.
+
+    This class extends the Pool class to add an xmap method that allows for the execution of
+    a function on a list of tasks, while also providing an abort mechanism.
+
+    Tasks run in worker processes, so they are pickled to the workers and back.
+    """
+
+
+class XThreadPool(_XMap, ThreadPool):
+    """Extended ThreadPool class.
+
+    Like :class:`XPool`, but tasks run in worker threads of the main process, so there
+    is no need to fork or pickle them. Almost all the work done by tasks is network
+    I/O, which releases the GIL, so threads are usually enough.
+    """
+
+
+_pretask_lock = Lock()
+
+
+POOLS: dict[str, Callable[[int], XPool | XThreadPool]] = {
+    'process': XPool,
+    'thread': XThreadPool,
+}
+"""The pool classes for each executor backend."""
+
+
+class SharedPool:
+    """Pool shared by several steps.
+
+    Each step submits its calls to a queue of its own, and the calls are fed to the
+    underlying pool taking turns between the steps. No more calls than workers are
+    sent to the pool at the same time, so a step submitting lots of tasks at once
+    cannot take over the pool: the rest of the steps get a worker every turn. A step
+    can also be limited to fewer workers than the pool has, see :meth:`for_step`.
+
+    :param pool: The underlying pool, which must be open.
+    :type pool: XPool | XThreadPool
+    :param processes: The number of workers of the underlying pool.
+    :type processes: int
+    """
+
+    def __init__(self, pool: XPool | XThreadPool, processes: int):
+        self._pool = pool
+        self._processes = processes
+        self._queues: dict[str, deque[tuple]] = {}
+        self._turns: deque[str] = deque()
+        self._running = 0
+        self._running_by_step: Counter[str] = Counter()
+        self._limits: dict[str, int] = {}
+        self._lock = Lock()
+
+    def for_step(self, step: str, processes: int | None = None) -> 'StepPool':
+        """Return the view of the pool for a step.
+
+        :param step: The name of the step.
+        :type step: str
+        :param processes: Optional. The number of calls of the step that can run at
+            the same time. If omitted, the step can use all the workers.
+        :type processes: int | None
+        :return: A pool that submits the calls of the step to the shared pool.
+        :rtype: StepPool
+        """
+        if processes:
+            with self._lock:
+                self._limits[step] = processes
+        return StepPool(self, step)
+
+    def apply_async(
+        self,
+        step: str,
+        func: Callable,
+        args: tuple,
+        callback: Callable | None,
+        error_callback: Callable | None,
+    ) -> None:
+        """Queue a call from a step, it will be sent to the pool in its turn."""
+        with self._lock:
+            if step not in self._queues:
+                self._queues[step] = deque()
+                self._turns.append(step)
+            self._queues[step].append((func, args, callback, error_callback))
+            self._dispatch()
+
+    def _ready(self, step: str) -> bool:
+        limit = self._limits.get(step, self._processes)
+        return bool(self._queues[step]) and self._running_by_step[step] < limit
+
+    def _dispatch(self):
+        # must be called with the lock held
+        while self._running < self._processes:
+            step = next((s for s in self._turns if self._ready(s)), None)
+            if step is None:
+                return
+            # the step goes to the end of the turns
+            self._turns.remove(step)
+            self._turns.append(step)
+            func, args, callback, error_callback = self._queues[step].popleft()
+            self._running += 1
+            self._running_by_step[step] += 1
+            self._pool.apply_async(
+                func,
+                args,
+                callback=self._finished(step, callback),
+                error_callback=self._finished(step, error_callback),
+            )
+
+    def _finished(self, step: str, callback: Callable | None) -> Callable:
+        def wrapper(result):
+            with self._lock:
+                self._running -= 1
+                self._running_by_step[step] -= 1
+                self._dispatch()
+            if callback:
+                callback(result)
+
+        return wrapper
+
+
+class StepPool(_XMap):
+    """The view of a :class:`SharedPool` for a step.
+
+    It has the same interface as the rest of the pools, but the shared pool outlives
+    it, so it is not closed when the step is done with it.
+
+    :param shared: The shared pool.
+    :type shared: SharedPool
+    :param step: The name of the step.
+    :type step: str
+    """
+
+    def __init__(self, shared: SharedPool, step: str):
+        self._shared = shared
+        self._step = step
+
+    def __enter__(self) -> Self:
+        """Enter the context, the shared pool is already open."""
+        return self
+
+    def __exit__(self, *args):
+        """Exit the context, the shared pool is closed by its owner."""
+
+    def apply_async(
+        self,
+        func: Callable,
+        args: tuple = (),
+        callback: Callable | None = None,
+        error_callback: Callable | None = None,
+    ) -> None:
+        """Schedule a call to a function in the shared pool, without waiting for it to finish.
+
+        :param func: The function to call.
+        :type func: Callable
+        :param args: The arguments to call the function with.
+        :type args: tuple
+        :param callback: Optional. Called with the result of the function.
+        :type callback: Callable | None
+        :param error_callback: Optional. Called with the exception if the function fails.
+        :type error_callback: Callable | None
+        """
+        self._shared.apply_async(self._step, func, args, callback, error_callback)
+
+    def imap_unordered(self, func: Callable, iterable: Iterable) -> Iterator:
+        """Apply a function to every item of an iterable, in the order they finish.
+
+        :param func: The function to apply.
+        :type func: Callable
+        :param iterable: The items to apply the function to.
+        :type iterable: Iterable
+        :return: An iterator over the results.
+        :rtype: Iterator
+        """
+        return _imap_unordered(self, func, iterable)
+
+
+def _imap_unordered(pool: _XMap, func: Callable, iterable: Iterable) -> Iterator:
+    # a graph without edges submits all the items at once
+    items = dict(enumerate(iterable))
+    return pool.imap_graph(func, items, {i: set() for i in items})
 
 
 class Step(StepReporter):
@@ -73,53 +386,145 @@ class Step(StepReporter):
     5. Validate the tasks.
     6. Upload the tasks.
 
+    In streaming mode, steps 4 to 6 happen in a single pool, and each task is
+    validated and uploaded as soon as it has run.
+
+    The pool is created by the executor backend configured for the step, see
+    :attr:`pis.config.models.Settings.executor`. If some tasks depend on others, they
+    are only sent to the pool once their dependencies are staged (or, in streaming
+    mode, once their dependencies are done).
+
+    Tasks are sent to the pool in order of expected cost, largest first, so the
+    longest ones do not start last and delay the end of the step. Tasks that ran
+    before are ordered by the time they took in the previous run of the step, and the
+    rest by :meth:`pis.task.Task.estimate_cost`. Tasks without a previous run go first.
+
+    In incremental runs, the manifest of the previous run of the step is attached to
+    the tasks, so they can be skipped if they did not change.
+
+    When several steps run in the same invocation, see :func:`execute_steps`, the
+    step sends its tasks to a pool shared with the rest of the steps instead.
+
+    :param name: The name of the step.
+    :type name: str
+    :param previous: Optional. The manifest of the previous run of the step.
+    :type previous: StepManifest | None
     :ivar name: The name of the step.
     :vartype name: str
+    :ivar executor: The executor backend of the step.
+    :vartype executor: str
+    :ivar processes: The number of tasks of the step that can run at the same time.
+    :vartype processes: int
     """
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, previous: StepManifest | None = None):
         super().__init__(name)
+        self._previous = {t.name: t for t in previous.tasks} if previous else {}
+        self.executor = settings().executors.get(name, settings().executor)
+        self.processes = settings().pools.get(name, settings().pool)
+        self._shared: SharedPool | None = None
+        self._costs: dict[str, tuple[bool, float, float]] = {}
+
+    def _pool(self) -> XPool | XThreadPool | StepPool:
+        if self._shared:
+            return self._shared.for_step(self.name, self.processes)
+        logger.debug(f'starting {self.executor} pool with {self.processes} workers')
+        return POOLS[self.executor](self.processes)
 
     def _instantiate_pretasks(self) -> list['Pretask']:
         logger.debug('instantiating pretasks')
-        return [task_registry().instantiate_p(td) for td in task_definitions() if task_registry().is_pretask(td)]
+        tds = task_definitions(self.name)
+        return [task_registry().instantiate_p(td) for td in tds if task_registry().is_pretask(td)]
 
     def _instantiate_tasks(self) -> list['Task']:
         logger.debug('instantiating tasks')
-        return [task_registry().instantiate_t(td) for td in task_definitions() if not task_registry().is_pretask(td)]
+        tds = task_definitions(self.name)
+        tasks = [task_registry().instantiate_t(td) for td in tds if not task_registry().is_pretask(td)]
+        required = {d for t in tasks for d in t.definition.depends_on}  # type: ignore[attr-defined]
+        for t in tasks:
+            t.needed_locally = t.name in required
+            # tasks that others depend on can only be skipped if their resource is here
+            if t.name in required and not absolute_path(t.definition.destination).exists():  # type: ignore[attr-defined]
+                continue
+            t._previous = self._previous.get(t.name)
+        return tasks
+
+    def _estimate_costs(self, tasks: list['Task']) -> None:
+        elapsed = {t.name: p.elapsed for t in tasks if (p := self._previous.get(t.name)) and p.elapsed}
+        unknown = [t for t in tasks if t.name not in elapsed]
+        logger.debug(f'estimating the cost of {len(unknown)} tasks without a previous run')
+        with ThreadPoolExecutor(max_workers=self.processes) as estimators:
+            estimates = dict(zip([t.name for t in unknown], estimators.map(_estimate_cost, unknown), strict=True))
+        self._costs = {
+            t.name: (t.name not in elapsed, elapsed.get(t.name, 0.0), estimates.get(t.name) or 0.0) for t in tasks
+        }
+
+    def _by_cost(self, tasks: list['Task']) -> list['Task']:
+        return sorted(tasks, key=lambda t: self._costs.get(t.name, (True, 0.0, 0.0)), reverse=True)
+
+    def _graph(self, tasks: list['Task']) -> dict[str, set[str]] | None:
+        graph = {t.name: set(t.definition.depends_on) for t in tasks}  # type: ignore[attr-defined]
+        if not any(graph.values()):
+            return None
+        logger.info('scheduling tasks following their dependencies')
+        return graph
 
     @report
     def _init(self, pretasks: list['Pretask'], *, abort: Event) -> list['Task']:
         logger.info(f'running {len(pretasks)} pretasks' if len(pretasks) > 0 else 'no pretasks to run in this step')
-        return [_executor(p, 'run', abort) for p in pretasks]
+        # pretasks share the scratchpad, so they never run concurrently with other steps
+        with _pretask_lock:
+            return [_executor(p, 'run', abort) for p in pretasks]
 
     @report
     def _run(self, tasks: list['Task'], *, abort: Event) -> list['Task']:
-        logger.info(f'running {len(task_definitions())} main tasks')
-        with XPool(settings().pool) as run_pool:
-            return run_pool.xmap('run', tasks, abort)
+        logger.info(f'running {len(task_definitions(self.name))} main tasks')
+        with self._pool() as run_pool:
+            return run_pool.xmap('run', self._by_cost(tasks), abort, self._graph(tasks))
 
     @report
     def _validate(self, tasks: list['Task'], *, abort: Event) -> list['Task']:
-        logger.info(f'validating {len(task_definitions())} main tasks')
-        with XPool(settings().pool) as validation_pool:
-            return validation_pool.xmap('validate', tasks, abort)
+        logger.info(f'validating {len(task_definitions(self.name))} main tasks')
+        with self._pool() as validation_pool:
+            return validation_pool.xmap('validate', self._by_cost(tasks), abort)
 
     @report
     def _upload(self, tasks: list['Task'], *, abort: Event) -> list['Task']:
-        logger.info(f'uploading {len(task_definitions())} main tasks')
-        with XPool(settings().pool) as upload_pool:
-            return upload_pool.xmap('upload', tasks, abort)
+        logger.info(f'uploading {len(task_definitions(self.name))} main tasks')
+        with self._pool() as upload_pool:
+            return upload_pool.xmap('upload', self._by_cost(tasks), abort)
 
-    def execute(self):
+    @report
+    def _stream(self, tasks: list['Task'], *, abort: Event) -> list['Task']:
+        func_names = ['run', 'validate', 'upload']
+        if not settings().remote_uri:
+            logger.info('no remote URI provided, skipping upload phase')
+            func_names.remove('upload')
+        logger.info(f'streaming {len(task_definitions(self.name))} main tasks through {", ".join(func_names)}')
+        with self._pool() as pool:
+            return pool.xpipeline(func_names, self._by_cost(tasks), abort, self._graph(tasks))
+
+    def _failed_phase(self) -> str:
+        # the step result tells the last phase that all the tasks got through
+        phases = {Result.STAGED: 'validation', Result.VALIDATED: 'upload'}
+        return phases.get(self._manifest.result, 'run')
+
+    def execute(self, pool: SharedPool | None = None, manager: SyncManager | None = None) -> Self:
         """Execute the step.
 
+        :param pool: Optional. A pool shared with other steps to send the tasks to.
+            If omitted, the step creates its own pools.
+        :type pool: SharedPool | None
+        :param manager: Optional. A running manager to create the abort event with.
+            If omitted, the step starts its own.
+        :type manager: SyncManager | None
         :raises StepFailedError: If the step execution fails at any point.
         :return: The step instance itself.
         :rtype: Step
         """
-        with Manager() as manager:
-            a = manager.Event()
+        self._shared = pool
+        with nullcontext(manager) if manager else Manager() as m, step_context(self.name):
+            a = m.Event()
 
             try:
                 # pretask process, sequential execution of initialization tasks
@@ -131,6 +536,13 @@ class Step(StepReporter):
 
                 # main process, parallel execution of resource generating tasks
                 tasks = self._instantiate_tasks()
+                self._estimate_costs(tasks)
+
+                if settings().streaming:
+                    tasks = self._stream(tasks, abort=a)
+                    if a.is_set():
+                        raise StepFailedError(self.name, self._failed_phase())
+                    return self
 
                 tasks = self._run(tasks, abort=a)
                 if a.is_set():
@@ -150,3 +562,32 @@ class Step(StepReporter):
                 a.set()
                 self.failed(f'step execution failed: {e}')
             return self
+
+
+def execute_steps(steps: list[Step], on_completed: Callable[[Step], None]) -> None:
+    """Execute several steps at the same time, sharing the worker pools.
+
+    Each step runs in a thread of its own, and all the steps that use the same executor
+    backend send their tasks to the same :class:`SharedPool`, with as many workers as
+    the largest pool of those steps. Each step still runs at most as many tasks at the
+    same time as its own pool size. Each step has its own abort event, so a failure
+    in a step does not abort the rest.
+
+    :param steps: The steps to execute.
+    :type steps: list[Step]
+    :param on_completed: Called with each step as soon as it finishes, in the calling
+        thread, in the order the steps finish.
+    :type on_completed: Callable[[Step], None]
+    """
+    with Manager() as manager, ExitStack() as stack:
+        pools: dict[str, SharedPool] = {}
+        for executor in {s.executor for s in steps}:
+            processes = max(s.processes for s in steps if s.executor == executor)
+            logger.debug(f'starting shared {executor} pool with {processes} workers')
+            pool = stack.enter_context(POOLS[executor](processes))
+            pools[executor] = SharedPool(pool, processes)
+
+        with ThreadPoolExecutor(max_workers=len(steps)) as threads:
+            futures = [threads.submit(s.execute, pools[s.executor], manager) for s in steps]
+            for future in as_completed(futures):
+                on_completed(future.result())
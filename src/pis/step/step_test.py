@@ -0,0 +1,150 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Manager
+from threading import Event, Lock
+from unittest.mock import patch
+
+import pytest
+
+from pis.config.models import Settings
+from pis.manifest.models import StepManifest, TaskManifest
+from pis.step.step import POOLS, SharedPool, Step
+from pis.util.errors import TaskExitError
+
+GRAPH = {'a': set(), 'b': {'a'}, 'c': {'b'}, 'd': set()}
+
+
+def _work(item: tuple[str, float]) -> tuple[str, float]:
+    name, delay = item
+    time.sleep(delay)
+    return name, time.perf_counter()
+
+
+@pytest.mark.parametrize('executor', ['process', 'thread'])
+def test_imap_graph_follows_dependencies(executor):
+    items = {name: (name, 0.05) for name in GRAPH}
+
+    with POOLS[executor](4) as pool:
+        finished = dict(pool.imap_graph(_work, items, GRAPH))
+
+    assert finished['a'] < finished['b'] < finished['c']
+    assert finished['d'] < finished['b']
+
+
+@pytest.mark.parametrize('executor', ['process', 'thread'])
+def test_imap_unordered(executor):
+    with POOLS[executor](2) as pool:
+        names = [name for name, _ in pool.imap_unordered(_work, [('a', 0), ('b', 0)])]
+
+    assert sorted(names) == ['a', 'b']
+
+
+class Exiting:
+    def __init__(self, name: str):
+        self.name = name
+        self._manifest = TaskManifest(name=name)
+
+    def run(self, *, abort: Event):
+        raise SystemExit(1)
+
+
+@pytest.mark.parametrize('executor', ['process', 'thread'])
+def test_task_exit_fails_instead_of_hanging(executor):
+    with (
+        patch('pis.util.logger.settings', return_value=Settings()),
+        Manager() as manager,
+        POOLS[executor](2) as pool,
+        ThreadPoolExecutor(1) as waiter,
+    ):
+        abort = manager.Event()
+        result = waiter.submit(pool.xmap, 'run', [Exiting('a')], abort, {'a': set()})  # type: ignore[list-item]
+        with pytest.raises(TaskExitError, match='SystemExit'):
+            result.result(timeout=10)
+
+
+def test_shared_pool_takes_turns_between_steps():
+    order: list[str] = []
+    lock = Lock()
+
+    def work(name: str) -> str:
+        with lock:
+            order.append(name)
+        time.sleep(0.01)
+        return name
+
+    with POOLS['thread'](1) as pool, ThreadPoolExecutor(2) as steps:
+        shared = SharedPool(pool, 1)
+        # the first step submits all its tasks before the second one gets a chance
+        first = steps.submit(lambda: sorted(shared.for_step('first').imap_unordered(work, ['first'] * 4)))
+        time.sleep(0.005)
+        second = steps.submit(lambda: sorted(shared.for_step('second').imap_unordered(work, ['second'] * 4)))
+        assert first.result() == ['first'] * 4
+        assert second.result() == ['second'] * 4
+
+    # the second step does not wait for all the tasks of the first one to finish
+    assert order[:4] != ['first'] * 4
+
+
+def test_shared_pool_limits_the_workers_of_a_step():
+    running: list[int] = []
+    lock = Lock()
+    current = 0
+
+    def work(name: str) -> str:
+        nonlocal current
+        with lock:
+            current += 1
+            running.append(current)
+        time.sleep(0.01)
+        with lock:
+            current -= 1
+        return name
+
+    with POOLS['thread'](4) as pool:
+        shared = SharedPool(pool, 4)
+        names = list(shared.for_step('limited', 2).imap_unordered(work, ['limited'] * 8))
+
+    assert names == ['limited'] * 8
+    assert max(running) == 2
+
+
+def test_step_pool_size_overrides_pool():
+    with patch('pis.step.step.settings', return_value=Settings(pool=4, pools={'step': 16})):
+        assert Step('step').processes == 16
+        assert Step('other').processes == 4
+
+
+class Costed:
+    def __init__(self, name: str, cost: float | None):
+        self.name = name
+        self.cost = cost
+
+    def estimate_cost(self) -> float | None:
+        if self.cost is None:
+            raise ValueError('no cost')
+        return self.cost
+
+
+def test_tasks_are_ordered_by_cost():
+    previous = StepManifest(
+        name='step',
+        tasks=[TaskManifest(name='slow', elapsed=20.0), TaskManifest(name='fast', elapsed=1.0)],
+    )
+    tasks = [Costed('fast', 1e9), Costed('small', 10), Costed('slow', 1), Costed('unknown', None), Costed('big', 1e6)]
+
+    with patch('pis.step.step.settings', return_value=Settings()):
+        step = Step('step', previous)
+        step._estimate_costs(tasks)  # type: ignore[arg-type]
+
+    # tasks that never ran go first by estimated size, then by previous elapsed time
+    names = [t.name for t in step._by_cost(tasks)]  # type: ignore[arg-type]
+    assert names == ['big', 'small', 'unknown', 'slow', 'fast']
+
+
+def test_imap_graph_submits_ready_items_in_order():
+    items = {name: (name, 0) for name in ['d', 'c', 'b', 'a']}
+
+    with POOLS['thread'](1) as pool:
+        names = [name for name, _ in pool.imap_graph(_work, items, {name: set() for name in sorted(items)})]
+
+    assert names == ['d', 'c', 'b', 'a']
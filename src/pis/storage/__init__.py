@@ -1,4 +1,5 @@
 """Remote storage implementation classes."""
 
 from pis.storage.google import GoogleStorage
+from pis.storage.local import LocalStorage
 from pis.storage.noop import NoopStorage
@@ -1,19 +1,28 @@
 """Google Cloud Storage class."""
 
+import mimetypes
+import os
 import re
 import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from threading import Lock
+from typing import IO
 
 from google import auth
 from google.api_core.exceptions import GoogleAPICallError, PreconditionFailed
 from google.auth import exceptions as auth_exceptions
+from google.auth.credentials import Credentials
 from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
 from google.cloud.exceptions import NotFound
 from loguru import logger
 
-from pis.storage.remote_storage import RemoteStorage
+from pis.config import settings
+from pis.storage.remote_storage import RemoteEntry, RemoteStorage
+from pis.util.checksum import decode_crc32c
 from pis.util.errors import NotFoundError, PreconditionFailedError, StorageError
 
 GOOGLE_SCOPES = [
@@ -21,12 +30,52 @@ GOOGLE_SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
 ]
 
+PARALLEL_UPLOAD_THRESHOLD = 256 * 1024**2
+"""The size in bytes from which files are uploaded in parallel parts."""
+
+MAX_COMPOSE_SOURCES = 32
+"""The maximum number of objects that can be composed into one."""
+
+# the client and bucket handles are shared by all the instances in a process
+_client: tuple[Credentials, storage.Client] | None = None
+_client_pid: int | None = None
+_buckets: dict[str, storage.Bucket] = {}
+_lock = Lock()
+
+
+def get_client() -> tuple[Credentials, storage.Client]:
+    """Return the credentials and storage client of the current process.
+
+    They are created on first use and reused afterwards, so authentication happens
+    once per process. Clients are never shared between processes: a forked worker
+    will create its own instead of inheriting the connections of its parent.
+
+    :return: The credentials and the storage client.
+    :rtype: tuple[Credentials, storage.Client]
+    """
+    global _client, _client_pid  # noqa: PLW0603
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            try:
+                credentials, project_id = auth.default(scopes=GOOGLE_SCOPES)
+                logger.debug(f'gcp authenticated on project {project_id}')
+            except auth_exceptions.DefaultCredentialsError as e:
+                logger.critical(f'error authenticating on gcp: {e}')
+                sys.exit(1)
+            _client = (credentials, storage.Client(credentials=credentials))
+            _client_pid = os.getpid()
+            _buckets.clear()
+        return _client
+
 
 class GoogleStorage(RemoteStorage):
     """Google Cloud Storage helper class.
 
     This class implements the RemoteStorage interface for Google Cloud Storage.
 
+    Instances are cheap to create, as the credentials, the client and the bucket
+    handles are shared by all of them in a process, see :func:`get_client`.
+
     :ivar credentials: The Google Cloud Storage credentials.
     :vartype credentials: google.auth.credentials.Credentials
     :ivar client: The Google Cloud Storage client.
@@ -34,15 +83,7 @@ class GoogleStorage(RemoteStorage):
     """
 
     def __init__(self):
-        try:
-            credentials, project_id = auth.default(scopes=GOOGLE_SCOPES)
-            logger.debug(f'gcp authenticated on project {project_id}')
-        except auth_exceptions.DefaultCredentialsError as e:
-            logger.critical(f'error authenticating on gcp: {e}')
-            sys.exit(1)
-
-        self.credentials = credentials
-        self.client = storage.Client(credentials=credentials)
+        self.credentials, self.client = get_client()
 
     @classmethod
     def _parse_uri(cls, uri: str) -> tuple[str, str | None]:
@@ -57,14 +98,15 @@ class GoogleStorage(RemoteStorage):
         return bucket_name, file_path
 
     def _get_bucket(self, bucket_name: str) -> storage.Bucket:
+        # handles are made without a request, a missing bucket fails on first use
         try:
-            return self.client.get_bucket(bucket_name)
-        except NotFound:
-            raise NotFoundError(bucket_name)
-        except GoogleAPICallError as e:
-            raise StorageError(f'google api error checking bucket {bucket_name}: {e}')
+            with _lock:
+                bucket = _buckets.get(bucket_name)
+                if bucket is None or bucket.client is not self.client:
+                    bucket = _buckets[bucket_name] = self.client.bucket(bucket_name)
         except Exception as e:
-            raise StorageError(f'error checking bucket {bucket_name}: {e}')
+            raise StorageError(f'error preparing bucket {bucket_name}: {e}')
+        return bucket
 
     def _prepare_blob(self, bucket: storage.Bucket, prefix: str | None) -> storage.Blob:
         if prefix is None:
@@ -75,17 +117,33 @@ class GoogleStorage(RemoteStorage):
             raise StorageError(f'error preparing blob: {e}')
         return blob
 
-    @staticmethod
-    def _is_blob_shallow(blob_name: str, prefix: str | None) -> bool:
-        # make sure we select the given path, not all prefixes
-        if prefix is not None and not prefix.endswith('/'):
-            prefix = f'{prefix}/'
+    def _upload_parts(self, src: Path, blob: storage.Blob, size: int, parts: int) -> list[storage.Blob]:
+        # the parts are temporary objects next to the destination, uploaded in threads
+        # with a file handle each, the ones that made it are deleted if any fails
+        part_size = -(size // -parts)
+        token = uuid.uuid4().hex[:8]
+        part_blobs = [blob.bucket.blob(f'{blob.name}.part-{token}-{i}') for i in range(parts)]
 
-        if not blob_name or blob_name == prefix:
-            return False
+        def upload_part(i: int) -> None:
+            with open(src, 'rb') as f:
+                f.seek(i * part_size)
+                length = min(part_size, size - i * part_size)
+                part_blobs[i].upload_from_file(f, size=length, if_generation_match=0, checksum='crc32c')
 
-        blob_name = blob_name.replace(prefix or '', '', 1)
-        return '/' not in blob_name and not blob_name.endswith('/')
+        logger.debug(f'uploading {src} in {parts} parts of {part_size} bytes')
+        try:
+            with ThreadPoolExecutor(max_workers=parts) as executor:
+                list(executor.map(upload_part, range(parts)))
+        except BaseException:
+            self._delete_parts(part_blobs)
+            raise
+        return part_blobs
+
+    def _delete_parts(self, part_blobs: list[storage.Blob]):
+        try:
+            part_blobs[0].bucket.delete_blobs(part_blobs, on_error=lambda _: None)
+        except GoogleAPICallError as e:
+            logger.warning(f'error deleting the parts of {part_blobs[0].name}: {e}')
 
     def check(self, uri: str) -> bool:
         """Check if a bucket exists in Google Cloud Storage.
@@ -108,9 +166,12 @@ class GoogleStorage(RemoteStorage):
 
         try:
             bucket = self._get_bucket(bucket_name)
-        except NotFoundError:
+            bucket.reload()
+        except (NotFound, NotFoundError):
             logger.warning(f'bucket {bucket_name} not found')
             return False
+        except GoogleAPICallError as e:
+            raise StorageError(f'google api error checking bucket {bucket_name}: {e}')
 
         actual_permissions = bucket.test_iam_permissions(permissions)
 
@@ -141,56 +202,157 @@ class GoogleStorage(RemoteStorage):
             raise NotFoundError(uri)
         except GoogleAPICallError as e:
             raise StorageError(f'error getting metadata for {uri}: {e}')
-        return {'mtime': datetime.timestamp(blob.updated) if blob.updated else None}
+        return {
+            'mtime': datetime.timestamp(blob.updated) if blob.updated else None,
+            'size': blob.size,
+            'generation': blob.generation,
+            'crc32c': decode_crc32c(blob.crc32c),
+        }
 
-    def list(self, uri: str, pattern: str | None = None) -> list[str]:
-        """List blobs in a bucket.
+    def list_entries(self, uri: str, pattern: str | None = None) -> list[RemoteEntry]:
+        """List blobs in a bucket, along with their metadata.
+
+        Only the blobs right under the prefix are listed, the deeper ones are left out
+        by the server. The metadata comes with the listing, so it is a single request.
 
         :param uri: The URI prefix to list blobs for.
         :type uri: str
         :param pattern: The pattern to match blobs against.
         :type pattern: str | None
-        :return: A list of blob URIs.
-        :rtype: list[str]
+        :return: A list of remote entries.
+        :rtype: list[RemoteEntry]
         :raises NotFoundError: If the bucket or prefix does not exist.
         :raises StorageError: If the prefix is invalid.
         """
         bucket_name, prefix = self._parse_uri(uri)
+        # make sure we select the given path, not all prefixes
+        if prefix and not prefix.endswith('/'):
+            prefix = f'{prefix}/'
         bucket = self._get_bucket(bucket_name)
-        blob_names: list[str] = [n.name for n in list(bucket.list_blobs(prefix=prefix))]
 
-        # filter out blobs that have longer prefixes
-        blob_name_list = [n for n in blob_names if self._is_blob_shallow(n, prefix)]
+        try:
+            blobs = list(bucket.list_blobs(prefix=prefix, delimiter='/'))
+        except NotFound:
+            raise NotFoundError(uri)
+        except GoogleAPICallError as e:
+            raise StorageError(f'error listing {uri}: {e}')
+
+        # filter out the placeholders of directories
+        blobs = [b for b in blobs if b.name != prefix and not b.name.endswith('/')]
         # filter out blobs using include/exclude
         if pattern is not None:
             if pattern.startswith('!'):
-                blob_name_list = [blob_name for blob_name in blob_name_list if pattern[1:] not in blob_name]
+                blobs = [b for b in blobs if pattern[1:] not in b.name]
             else:
-                blob_name_list = [blob_name for blob_name in blob_name_list if pattern in blob_name]
+                blobs = [b for b in blobs if pattern in b.name]
 
-        if len(blob_name_list) == 0:
+        if len(blobs) == 0:
             logger.warning(f'no files found in {uri}')
 
-        return [f'gs://{bucket_name}/{blob_name}' for blob_name in blob_name_list]
+        return [
+            RemoteEntry(
+                uri=f'gs://{bucket_name}/{b.name}',
+                mtime=datetime.timestamp(b.updated) if b.updated else None,
+                size=b.size,
+                generation=b.generation,
+                crc32c=decode_crc32c(b.crc32c),
+            )
+            for b in blobs
+        ]
+
+    def list(self, uri: str, pattern: str | None = None) -> list[str]:
+        """List blobs in a bucket.
 
-    def download_to_file(self, uri: str, dst: Path) -> int:
+        :param uri: The URI prefix to list blobs for.
+        :type uri: str
+        :param pattern: The pattern to match blobs against.
+        :type pattern: str | None
+        :return: A list of blob URIs.
+        :rtype: list[str]
+        :raises NotFoundError: If the bucket or prefix does not exist.
+        :raises StorageError: If the prefix is invalid.
+        """
+        return [entry.uri for entry in self.list_entries(uri, pattern)]
+
+    def download_to_file(self, uri: str, dst: Path, *, start: int = 0, revision: int | None = None) -> int:
         """Download a file from Google Cloud Storage to the local filesystem.
 
         :param uri: The URI of the file to download.
         :type uri: str
         :param dst: The destination path to download the file to.
         :type dst: Path
+        :param start: The byte to start downloading from. If greater than zero, the
+            bytes will be appended to the destination file, which is useful to resume
+            a partial download.
+        :type start: int
+        :param revision: Optional. The expected generation number of the file.
+        :type revision: int | None
+        :return: The generation number of the file.
+        :rtype: int
+        :raises NotFoundError: If the file is not found.
+        :raises PreconditionFailedError: If the generation number does not match.
+        :raises StorageError: If an error occurs while downloading the file.
+        """
+        bucket_name, prefix = self._parse_uri(uri)
+        bucket = self._get_bucket(bucket_name)
+        blob = self._prepare_blob(bucket, prefix)
+        kwargs = {'if_generation_match': revision} if revision is not None else {}
+
+        try:
+            if start:
+                with open(dst, 'ab') as f:
+                    blob.download_to_file(f, start=start, **kwargs)
+            else:
+                blob.download_to_filename(dst, **kwargs)
+        except PreconditionFailed:
+            raise PreconditionFailedError(f'download of {uri} failed due to generation mismatch')
+        except NotFound:
+            raise NotFoundError(uri)
+        except (GoogleAPICallError, OSError) as e:
+            raise StorageError(f'error downloading {uri}: {e}')
+        return blob.generation or 0
+
+    def download_to_stream(
+        self,
+        uri: str,
+        stream: IO[bytes],
+        *,
+        start: int = 0,
+        end: int | None = None,
+        revision: int | None = None,
+    ) -> int:
+        """Download a byte range of a file from Google Cloud Storage into a stream.
+
+        The bytes are written to the stream as they arrive, so the stream can write
+        them wherever it wants, and checksum them on the way. The client does not
+        verify the checksum of the file, as it cannot for a byte range.
+
+        :param uri: The URI of the file to download.
+        :type uri: str
+        :param stream: The stream to write the bytes to.
+        :type stream: IO[bytes]
+        :param start: The first byte to download.
+        :type start: int
+        :param end: Optional. The last byte to download, included. Defaults to the
+            end of the file.
+        :type end: int | None
+        :param revision: Optional. The expected generation number of the file.
+        :type revision: int | None
         :return: The generation number of the file.
         :rtype: int
         :raises NotFoundError: If the file is not found.
+        :raises PreconditionFailedError: If the generation number does not match.
         :raises StorageError: If an error occurs while downloading the file.
         """
         bucket_name, prefix = self._parse_uri(uri)
         bucket = self._get_bucket(bucket_name)
         blob = self._prepare_blob(bucket, prefix)
+        kwargs = {'if_generation_match': revision} if revision is not None else {}
 
         try:
-            blob.download_to_filename(dst)
+            blob.download_to_file(stream, start=start, end=end, checksum=None, **kwargs)
+        except PreconditionFailed:
+            raise PreconditionFailedError(f'download of {uri} failed due to generation mismatch')
         except NotFound:
             raise NotFoundError(uri)
         except (GoogleAPICallError, OSError) as e:
@@ -227,6 +389,10 @@ class GoogleStorage(RemoteStorage):
     def upload(self, src: Path, uri: str, revision: int | None = None) -> int:
         """Upload a file to Google Cloud Storage.
 
+        Files larger than :data:`PARALLEL_UPLOAD_THRESHOLD` are split in as many parts
+        as the `upload_workers` setting, up to :data:`MAX_COMPOSE_SOURCES`. The parts
+        are uploaded at the same time, composed into the destination blob, and deleted.
+
         :param src: The source path of the file to upload.
         :type src: Path
         :param uri: The URI to upload the file to.
@@ -241,17 +407,58 @@ class GoogleStorage(RemoteStorage):
         bucket_name, prefix = self._parse_uri(uri)
         bucket = self._get_bucket(bucket_name)
         blob = self._prepare_blob(bucket, prefix)
+        kwargs = {'if_generation_match': revision} if revision is not None else {}
 
         try:
-            if revision is not None:
-                blob.upload_from_filename(src, if_generation_match=revision)
+            size = src.stat().st_size
+            parts = min(settings().upload_workers, MAX_COMPOSE_SOURCES)
+            if parts > 1 and size > PARALLEL_UPLOAD_THRESHOLD:
+                part_blobs = self._upload_parts(src, blob, size, parts)
+                blob.content_type = mimetypes.guess_type(src.name)[0] or 'application/octet-stream'
+                try:
+                    blob.compose(part_blobs, **kwargs)
+                finally:
+                    self._delete_parts(part_blobs)
             else:
-                blob.upload_from_filename(src)
+                blob.upload_from_filename(src, **kwargs)
         except PreconditionFailed:
             raise PreconditionFailedError(f'upload of {src} failed due to generation mismatch')
         except (GoogleAPICallError, OSError) as e:
             raise StorageError(f'error uploading {src}: {e}')
-        blob.reload()
+        # the upload and compose responses carry the metadata of the new blob
+        return blob.generation or 0
+
+    def copy(self, source_uri: str, uri: str) -> int:
+        """Copy a file in Google Cloud Storage, without downloading it.
+
+        The copy is a rewrite, which works across buckets, locations and storage
+        classes. Large files can take several calls to rewrite, as each one copies
+        a part of the file.
+
+        :param source_uri: The URI of the file to copy.
+        :type source_uri: str
+        :param uri: The URI to copy the file to.
+        :type uri: str
+        :return: The generation number of the copy.
+        :rtype: int
+        :raises NotFoundError: If the file to copy does not exist.
+        :raises StorageError: If an error occurs during the copy.
+        """
+        source_bucket_name, source_prefix = self._parse_uri(source_uri)
+        source_blob = self._prepare_blob(self._get_bucket(source_bucket_name), source_prefix)
+        bucket_name, prefix = self._parse_uri(uri)
+        blob = self._prepare_blob(self._get_bucket(bucket_name), prefix)
+
+        try:
+            token, rewritten, total = blob.rewrite(source_blob)
+            while token is not None:
+                logger.debug(f'copied {rewritten} of {total} bytes from {source_uri} to {uri}')
+                token, rewritten, total = blob.rewrite(source_blob, token=token)
+        except NotFound:
+            raise NotFoundError(source_uri)
+        except GoogleAPICallError as e:
+            raise StorageError(f'error copying {source_uri} to {uri}: {e}')
+        # the last rewrite response carries the metadata of the new blob
         return blob.generation or 0
 
     def get_session(self) -> AuthorizedSession:
@@ -1,5 +1,5 @@
-from datetime import datetime
-from pathlib import Path
+from datetime import UTC, datetime
+from io import BytesIO
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -8,7 +8,11 @@ from google.cloud import storage
 from google.cloud.exceptions import NotFound
 from loguru import logger
 
-from pis.storage.google import GoogleStorage
+from pis.config.models import Settings
+from pis.storage import google
+from pis.storage.google import GoogleStorage, get_client
+from pis.storage.remote_storage import RemoteEntry, UploadResult
+from pis.util.checksum import crc32c
 from pis.util.errors import NotFoundError, PreconditionFailedError, StorageError
 
 urls: list[tuple[str, tuple[str, str | None]]] = [
@@ -22,15 +26,14 @@ urls: list[tuple[str, tuple[str, str | None]]] = [
     ('https://bucket.storage.googleapis.com/folder/file.txt', ('bucket', 'folder/file.txt')),
 ]
 
+# the server leaves out the blobs deeper than the prefix, but not directory placeholders
 test_list_input: list[str] = [
-    'file_1.txt',
-    'file_2.xls',
-    'file_3.csv',
-    'file_4.csv',
-    'dir/file3.txt',
-    'dir/file4.txt',
-    'dir/deep/file5.txt',
-    'dir/deep',
+    'testpath/',
+    'testpath/file_1.txt',
+    'testpath/file_2.xls',
+    'testpath/file_3.csv',
+    'testpath/file_4.csv',
+    'testpath/dir/',
 ]
 
 test_list_output: list[str] = [
@@ -47,6 +50,22 @@ def mock_init():
         yield mock_init
 
 
+@pytest.fixture(autouse=True)
+def reset_client(monkeypatch):
+    monkeypatch.setattr(google, '_client', None)
+    monkeypatch.setattr(google, '_client_pid', None)
+    monkeypatch.setattr(google, '_buckets', {})
+
+
+@pytest.fixture
+def mock_auth():
+    with (
+        patch('pis.storage.google.auth.default', return_value=(MagicMock(), 'project')) as mock_auth,
+        patch('pis.storage.google.storage.Client'),
+    ):
+        yield mock_auth
+
+
 @pytest.fixture
 def mock_parse_url():
     with patch.object(GoogleStorage, '_parse_uri', return_value=('bucket', 'file.txt')) as mock_parse_url:
@@ -83,35 +102,37 @@ def test_parse_uri_ko(input):
         GoogleStorage._parse_uri(input)
 
 
-def test_get_bucket_ok(mock_parse_url):
-    g = GoogleStorage()
-    g.client = MagicMock(storage.Client)
+def test_client_is_reused(mock_auth):
+    assert get_client() is get_client()
+    assert mock_auth.call_count == 1
 
-    g._get_bucket('bucket')
 
-    g.client.get_bucket.assert_called_once_with('bucket')
+def test_client_is_not_shared_after_fork(mock_auth, monkeypatch):
+    c1 = get_client()
+    monkeypatch.setattr(google.os, 'getpid', lambda: -1)
 
+    assert get_client() is not c1
+    assert mock_auth.call_count == 2
 
-def test_get_bucket_ko(mock_parse_url):
+
+def test_get_bucket_ok(mock_parse_url):
     g = GoogleStorage()
     g.client = MagicMock(storage.Client)
-    g.client.get_bucket.side_effect = GoogleAPICallError('test')
+    g.client.bucket.side_effect = lambda name: storage.Bucket(g.client, name)
 
-    with pytest.raises(StorageError):
-        g._get_bucket('gs://bucket')
+    bucket = g._get_bucket('bucket')
 
-    g.client.get_bucket.side_effect = Exception('test')
+    assert g._get_bucket('bucket') is bucket
+    g.client.bucket.assert_called_once_with('bucket')
+    g.client.get_bucket.assert_not_called()
 
-    with pytest.raises(StorageError):
-        g._get_bucket('gs://bucket')
 
-
-def test_get_bucket_non_existing(mock_parse_url):
+def test_get_bucket_ko(mock_parse_url):
     g = GoogleStorage()
     g.client = MagicMock(storage.Client)
-    g.client.get_bucket.side_effect = NotFound('test')
+    g.client.bucket.side_effect = ValueError('test')
 
-    with pytest.raises(NotFoundError):
+    with pytest.raises(StorageError):
         g._get_bucket('gs://bucket')
 
 
@@ -156,33 +177,6 @@ def test_prepare_blob_no_prefix(mock_parse_url):
         g._prepare_blob(bucket, None)
 
 
-@pytest.mark.parametrize(
-    ('blob_name', 'prefix', 'result'),
-    [
-        ('file.txt', None, True),
-        ('file.txt', '', True),
-        ('file.txt', '/', True),
-        ('file', None, True),
-        ('file', '', True),
-        ('prefix/file.txt', 'prefix/', True),
-        ('prefix/file.txt', 'prefix', True),
-        ('/prefix/file.txt', '/prefix/', True),
-        ('/prefix/file.txt', '/prefix', True),
-        ('/prefix/file.txt', 'prefix/', False),
-        ('/dir/', None, False),
-        ('/dir/', '', False),
-        ('/dir/', '/dir', False),
-        ('prefix/dir/', '/prefix', False),
-        ('/dir/file.txt', '', False),
-        ('/prefix/dir/file.txt', '/prefix/', False),
-        ('', '', False),
-        ('/', '', False),
-    ],
-)
-def test_is_blob_shallow(blob_name, prefix, result):
-    assert GoogleStorage._is_blob_shallow(blob_name, prefix) == result
-
-
 def test_check_ok(mock_parse_url):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
@@ -214,18 +208,35 @@ def test_check_non_existing(mock_parse_url):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._prepare_blob = MagicMock()
-    g._get_bucket.side_effect = NotFoundError('test')
+    g._get_bucket.return_value.reload.side_effect = NotFound('test')
 
     assert not g.check('gs://bucket')
 
 
+def test_check_api_error(mock_parse_url):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._get_bucket.return_value.reload.side_effect = GoogleAPICallError('test')
+
+    with pytest.raises(StorageError):
+        g.check('gs://bucket')
+
+
 def test_stat_ok(mock_parse_url):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._prepare_blob = MagicMock()
     g._prepare_blob.return_value.updated = datetime(2021, 1, 1)
-
-    assert g.stat('gs://bucket/file.txt') == ({'mtime': datetime(2021, 1, 1).timestamp()})
+    g._prepare_blob.return_value.size = 100
+    g._prepare_blob.return_value.generation = 123
+    g._prepare_blob.return_value.crc32c = '4waSgw=='
+
+    assert g.stat('gs://bucket/file.txt') == ({
+        'mtime': datetime(2021, 1, 1).timestamp(),
+        'size': 100,
+        'generation': 123,
+        'crc32c': 0xE3069283,
+    })
     assert g._prepare_blob.return_value.reload.called
 
 
@@ -249,14 +260,44 @@ def test_stat_non_existing(mock_parse_url):
         g.stat('gs://bucket/file.txt')
 
 
-def test_list_blobs_ok(mock_parse_url):
+def test_list_blobs_ok():
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._get_bucket.return_value.list_blobs.return_value = [storage.Blob(n, 't') for n in test_list_input]
 
-    blob_names = g.list('testpath')
+    blob_names = g.list('gs://bucket/testpath')
 
     assert len(blob_names) == len(test_list_output)
+    assert blob_names[0] == 'gs://bucket/testpath/file_1.txt'
+    g._get_bucket.return_value.list_blobs.assert_called_once_with(prefix='testpath/', delimiter='/')
+
+
+def test_list_entries_ok():
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    blob = storage.Blob('testpath/file_1.txt', 't')
+    blob._properties.update({'updated': '2021-01-01T00:00:00Z', 'size': '100', 'generation': '123'})
+    g._get_bucket.return_value.list_blobs.return_value = [blob]
+
+    entries = g.list_entries('gs://bucket/testpath')
+
+    assert entries == [
+        RemoteEntry(
+            uri='gs://bucket/testpath/file_1.txt',
+            mtime=datetime(2021, 1, 1, tzinfo=UTC).timestamp(),
+            size=100,
+            generation=123,
+        )
+    ]
+
+
+def test_list_not_found():
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._get_bucket.return_value.list_blobs.side_effect = NotFound('test')
+
+    with pytest.raises(NotFoundError):
+        g.list('gs://bucket/testpath')
 
 
 def test_list_ok_empty(mock_parse_url, caplog):
@@ -302,6 +343,31 @@ def test_download_to_file_ok(mock_parse_url, tmp_path):
     g._prepare_blob.return_value.download_to_filename.assert_called_once_with(destination)
 
 
+def test_download_to_file_resume(mock_parse_url, tmp_path):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+    destination = tmp_path / 'file.txt'
+    destination.write_text('partial')
+
+    g.download_to_file('gs://bucket/file.txt', destination, start=7, revision=123)
+
+    g._prepare_blob.return_value.download_to_filename.assert_not_called()
+    _, kwargs = g._prepare_blob.return_value.download_to_file.call_args
+    assert kwargs == {'start': 7, 'if_generation_match': 123}
+
+
+def test_download_to_file_bad_revision(mock_parse_url, tmp_path):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+    g._prepare_blob.return_value.download_to_filename.side_effect = PreconditionFailed('test')
+    destination = tmp_path / 'file.txt'
+
+    with pytest.raises(PreconditionFailedError):
+        g.download_to_file('gs://bucket/file.txt', destination, revision=123)
+
+
 def test_download_to_file_not_found(mock_parse_url, tmp_path):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
@@ -313,6 +379,29 @@ def test_download_to_file_not_found(mock_parse_url, tmp_path):
         g.download_to_file('gs://bucket/file.txt', destination)
 
 
+def test_download_to_stream(mock_parse_url):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+    g._prepare_blob.return_value.generation = 123
+    stream = BytesIO()
+
+    assert g.download_to_stream('gs://bucket/file.txt', stream, start=10, end=19, revision=123) == 123
+    g._prepare_blob.return_value.download_to_file.assert_called_once_with(
+        stream, start=10, end=19, checksum=None, if_generation_match=123
+    )
+
+
+def test_download_to_stream_bad_revision(mock_parse_url):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+    g._prepare_blob.return_value.download_to_file.side_effect = PreconditionFailed('test')
+
+    with pytest.raises(PreconditionFailedError):
+        g.download_to_stream('gs://bucket/file.txt', BytesIO(), revision=123)
+
+
 def test_download_to_file_ko(mock_parse_url, tmp_path):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
@@ -356,22 +445,33 @@ def test_download_to_string_decode_error(mock_parse_url):
         g.download_to_string('gs://bucket/file.txt')
 
 
-def test_upload_ok(mock_parse_url):
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / 'file.txt'
+    src.write_bytes(b'0123456789')
+    return src
+
+
+@pytest.fixture
+def mock_settings():
+    with patch('pis.storage.google.settings', return_value=Settings(upload_workers=4)) as mock_settings:
+        yield mock_settings
+
+
+def test_upload_ok(mock_parse_url, mock_settings, src):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._prepare_blob = MagicMock()
-    src = Path('file.txt')
 
     g.upload(src, 'gs://bucket/file.txt')
 
     g._prepare_blob.return_value.upload_from_filename.assert_called_once_with(src)
 
 
-def test_upload_ok_revision(mock_parse_url):
+def test_upload_ok_revision(mock_parse_url, mock_settings, src):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._prepare_blob = MagicMock()
-    src = Path('file.txt')
     r = 123123
 
     g.upload(src, 'gs://bucket/file.txt', r)
@@ -379,23 +479,167 @@ def test_upload_ok_revision(mock_parse_url):
     g._prepare_blob.return_value.upload_from_filename.assert_called_once_with(src, if_generation_match=r)
 
 
-def test_upload_ko(mock_parse_url):
+def test_upload_ko(mock_parse_url, mock_settings, src):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._prepare_blob = MagicMock()
     g._prepare_blob.return_value.upload_from_filename.side_effect = [GoogleAPICallError('test'), OSError('test')]
-    src = Path('file.txt')
 
     with pytest.raises(StorageError):
         g.upload(src, 'gs://bucket/file.txt', 123)
 
 
-def test_upload_ko_bad_revision(mock_parse_url):
+def test_upload_ko_missing_file(mock_parse_url, mock_settings, tmp_path):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+
+    with pytest.raises(StorageError):
+        g.upload(tmp_path / 'missing.txt', 'gs://bucket/file.txt')
+
+
+def test_upload_ko_bad_revision(mock_parse_url, mock_settings, src):
     g = GoogleStorage()
     g._get_bucket = MagicMock()
     g._prepare_blob = MagicMock()
     g._prepare_blob.return_value.upload_from_filename.side_effect = PreconditionFailed('test')
-    src = Path('file.txt')
 
     with pytest.raises(PreconditionFailedError):
         g.upload(src, 'gs://bucket/file.txt', 123)
+
+
+def upload_parts_blob(uploaded: dict[str, bytes], fail: bool = False) -> MagicMock:
+    """Mock a blob whose parts record what is uploaded to them."""
+    blob = MagicMock(spec=storage.Blob)
+    blob.name = 'file.txt'
+    blob.generation = 42
+
+    def part(name):
+        def upload_from_file(f, size, **kwargs):
+            if fail and name.endswith('-1'):
+                raise GoogleAPICallError('test')
+            uploaded[name] = f.read(size)
+
+        part_blob = MagicMock(spec=storage.Blob)
+        part_blob.name = name
+        part_blob.bucket = blob.bucket
+        part_blob.upload_from_file.side_effect = upload_from_file
+        return part_blob
+
+    blob.bucket.blob.side_effect = part
+    return blob
+
+
+def test_upload_parallel(mock_parse_url, mock_settings, src, monkeypatch):
+    monkeypatch.setattr(google, 'PARALLEL_UPLOAD_THRESHOLD', 1)
+    uploaded: dict[str, bytes] = {}
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock(return_value=upload_parts_blob(uploaded))
+    blob = g._prepare_blob.return_value
+
+    generation = g.upload(src, 'gs://bucket/file.txt', 7)
+
+    parts = blob.compose.call_args.args[0]
+    assert generation == 42
+    assert [uploaded[p.name] for p in parts] == [b'012', b'345', b'678', b'9']
+    assert blob.compose.call_args.kwargs == {'if_generation_match': 7}
+    assert blob.content_type == 'text/plain'
+    blob.upload_from_filename.assert_not_called()
+    blob.bucket.delete_blobs.assert_called_once()
+    assert blob.bucket.delete_blobs.call_args.args[0] == parts
+
+
+def test_upload_parallel_ko(mock_parse_url, mock_settings, src, monkeypatch):
+    monkeypatch.setattr(google, 'PARALLEL_UPLOAD_THRESHOLD', 1)
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock(return_value=upload_parts_blob({}, fail=True))
+    blob = g._prepare_blob.return_value
+
+    with pytest.raises(StorageError):
+        g.upload(src, 'gs://bucket/file.txt')
+
+    blob.compose.assert_not_called()
+    blob.bucket.delete_blobs.assert_called_once()
+
+
+def test_upload_parallel_disabled(mock_parse_url, mock_settings, src, monkeypatch):
+    monkeypatch.setattr(google, 'PARALLEL_UPLOAD_THRESHOLD', 1)
+    mock_settings.return_value = Settings(upload_workers=1)
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+
+    g.upload(src, 'gs://bucket/file.txt')
+
+    g._prepare_blob.return_value.upload_from_filename.assert_called_once_with(src)
+
+
+def test_copy(mock_parse_url):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+    blob = g._prepare_blob.return_value
+    blob.rewrite.side_effect = [('token', 5, 10), (None, 10, 10)]
+    blob.generation = 123
+
+    assert g.copy('gs://bucket/old.txt', 'gs://bucket/file.txt') == 123
+    assert blob.rewrite.call_count == 2
+    assert blob.rewrite.call_args.kwargs == {'token': 'token'}
+
+
+def test_copy_not_found(mock_parse_url):
+    g = GoogleStorage()
+    g._get_bucket = MagicMock()
+    g._prepare_blob = MagicMock()
+    g._prepare_blob.return_value.rewrite.side_effect = NotFound('test')
+
+    with pytest.raises(NotFoundError):
+        g.copy('gs://bucket/old.txt', 'gs://bucket/file.txt')
+
+
+@pytest.fixture
+def sync_storage(src):
+    """A storage holding the contents of `src` in `gs://bucket/same.txt`."""
+    crc = crc32c(src.read_bytes())
+    remote = {
+        'gs://bucket/same.txt': {'size': 10, 'crc32c': crc},
+        'gs://bucket/other.txt': {'size': 10, 'crc32c': crc + 1},
+    }
+
+    def stat(uri):
+        if uri not in remote:
+            raise NotFoundError(uri)
+        return remote[uri]
+
+    g = GoogleStorage()
+    g.stat = MagicMock(side_effect=stat)
+    g.copy = MagicMock()
+    g.upload = MagicMock()
+    return g
+
+
+def test_sync_skips_same_contents(sync_storage, src):
+    result = sync_storage.sync(src, 'gs://bucket/same.txt')
+
+    assert result == UploadResult('gs://bucket/same.txt', 10, crc32c(b'0123456789'), 'skipped')
+    sync_storage.upload.assert_not_called()
+    sync_storage.copy.assert_not_called()
+
+
+def test_sync_copies_from_candidate(sync_storage, src):
+    result = sync_storage.sync(src, 'gs://bucket/file.txt', ['gs://bucket/other.txt', 'gs://bucket/same.txt'])
+
+    assert result.action == 'copied'
+    assert result.source == 'gs://bucket/same.txt'
+    sync_storage.copy.assert_called_once_with('gs://bucket/same.txt', 'gs://bucket/file.txt')
+    sync_storage.upload.assert_not_called()
+
+
+def test_sync_uploads_changed_contents(sync_storage, src):
+    result = sync_storage.sync(src, 'gs://bucket/other.txt', ['gs://bucket/missing.txt'])
+
+    assert result.action == 'uploaded'
+    sync_storage.upload.assert_called_once_with(src, 'gs://bucket/other.txt')
+    sync_storage.copy.assert_not_called()
@@ -0,0 +1,390 @@
+"""Local filesystem storage class."""
+
+import fcntl
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import IO
+
+from loguru import logger
+
+from pis.storage.remote_storage import RemoteEntry, RemoteStorage
+from pis.util.checksum import file_crc32c, record_crc32c
+from pis.util.errors import NotFoundError, PreconditionFailedError, StorageError
+from pis.util.jsonl import READ_CHUNK_SIZE
+
+calls: Counter[str] = Counter()
+"""The number of calls to each operation of the local storage in this process.
+
+Each operation is the equivalent of a request to the API of a remote storage, so
+benchmarks can count how many requests a code path makes without a network."""
+
+_calls_lock = Lock()
+
+
+def _count(operation: str) -> None:
+    with _calls_lock:
+        calls[operation] += 1
+
+
+@contextmanager
+def _locked(directory: Path) -> Iterator[None]:
+    """Hold an exclusive lock on a directory, shared by all threads and processes."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class LocalStorage(RemoteStorage):
+    """Local filesystem storage helper class.
+
+    This class implements the RemoteStorage interface for `file://` URIs, with the
+    same semantics as :class:`pis.storage.google.GoogleStorage`, so a directory can
+    stand in for a bucket in tests and benchmarks, or in runs without a cloud.
+
+    - The generation of a file is its modification time in nanoseconds. Writes make
+      sure it is higher than the one of the file they replace, so it works like the
+      generation of a blob as long as the filesystem has nanosecond timestamps.
+    - Writes go to a temporary file that replaces the destination once complete, with
+      the directory locked while the precondition is checked, so files are never seen
+      half written and concurrent writers with a revision cannot overwrite each other.
+      A revision of `0` means the file must not exist.
+    - Reads check the revision on the file they opened, so it cannot be replaced
+      between the check and the read.
+    - The CRC32C checksum of a file is saved along with it when it is written, in a
+      hidden file next to it, so getting it does not read the file.
+    - Listings are not recursive, and leave out hidden files, which include the
+      checksums and the temporary files of writes in progress.
+
+    Every operation is counted in :data:`calls`.
+    """
+
+    @classmethod
+    def _parse_uri(cls, uri: str) -> Path:
+        path = Path(uri.removeprefix('file://'))
+        if not path.is_absolute():
+            raise StorageError(f'invalid local uri: {uri}, the path must be absolute')
+        return path
+
+    @staticmethod
+    def _generation(st: os.stat_result) -> int:
+        return st.st_mtime_ns
+
+    @staticmethod
+    def _checksum_path(path: Path) -> Path:
+        return path.with_name(f'.{path.name}.crc32c')
+
+    def _save_checksum(self, path: Path, crc32c: int) -> None:
+        # must be called with the directory locked, right after the file is replaced
+        st = path.stat()
+        checksum_path = self._checksum_path(path)
+        tmp = checksum_path.with_name(f'{checksum_path.name}.tmp')
+        tmp.write_text(f'{self._generation(st)} {st.st_size} {crc32c}')
+        tmp.replace(checksum_path)
+
+    def _saved_checksum(self, path: Path, st: os.stat_result) -> int | None:
+        # the checksum is only valid for the version of the file it was saved with
+        try:
+            generation, size, crc32c = (int(v) for v in self._checksum_path(path).read_text().split())
+        except (OSError, ValueError):
+            return None
+        return crc32c if (generation, size) == (self._generation(st), st.st_size) else None
+
+    def _checksum(self, path: Path) -> tuple[os.stat_result, int]:
+        st = path.stat()
+        crc32c = self._saved_checksum(path, st)
+        # files written by something else are read, once per process and version
+        return st, file_crc32c(path) if crc32c is None else crc32c
+
+    def _write(self, uri: str, fill: Callable[[Path], object], crc32c: int, revision: int | None = None) -> int:
+        # the file is filled next to the destination, so replacing it is atomic, and its
+        # checksum is recorded, like google cloud storage keeps it along with the blob
+        path = self._parse_uri(uri)
+        tmp = path.with_name(f'.{path.name}.tmp-{uuid.uuid4().hex[:8]}')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fill(tmp)
+            with _locked(path.parent):
+                try:
+                    current = self._generation(path.stat())
+                except FileNotFoundError:
+                    current = 0
+                if revision is not None and revision != current:
+                    raise PreconditionFailedError(f'write to {uri} failed due to generation mismatch')
+                generation = max(time.time_ns(), current + 1)
+                os.utime(tmp, ns=(generation, generation))
+                tmp.replace(path)
+                self._save_checksum(path, crc32c)
+                record_crc32c(path, crc32c)
+        except OSError as e:
+            raise StorageError(f'error writing {uri}: {e}')
+        finally:
+            tmp.unlink(missing_ok=True)
+        return generation
+
+    @contextmanager
+    def _open(self, uri: str, revision: int | None = None) -> Iterator[tuple[IO[bytes], int]]:
+        path = self._parse_uri(uri)
+        try:
+            f = open(path, 'rb')  # noqa: SIM115
+        except FileNotFoundError:
+            raise NotFoundError(uri)
+        except OSError as e:
+            raise StorageError(f'error reading {uri}: {e}')
+        with f:
+            generation = self._generation(os.fstat(f.fileno()))
+            if revision is not None and revision != generation:
+                raise PreconditionFailedError(f'download of {uri} failed due to generation mismatch')
+            yield f, generation
+
+    def check(self, uri: str) -> bool:
+        """Check if a local directory can be used as a remote storage.
+
+        The directory does not need to exist, but the closest of its parents that does
+        must be readable and writable, so it can be created.
+
+        :param uri: The URI to check.
+        :type uri: str
+        :return: True if the directory can be used, False otherwise.
+        :rtype: bool
+        """
+        _count('check')
+        path = self._parse_uri(uri)
+        while not path.exists():
+            path = path.parent
+        if not path.is_dir() or not os.access(path, os.R_OK | os.W_OK | os.X_OK):
+            logger.warning(f'{path} is not a readable and writable directory')
+            return False
+        logger.debug(f'directory {path} exists and is writable')
+        return True
+
+    def stat(self, uri: str) -> dict:
+        """Get metadata for a local file.
+
+        The CRC32C checksum is the one saved when the file was written. Only files
+        written by something else are read to compute it, once per process and
+        version of the file, see :func:`pis.util.checksum.file_crc32c`.
+
+        :param uri: The URI of the file to get metadata for.
+        :type uri: str
+        :return: A dictionary containing metadata.
+        :rtype: dict
+        :raises NotFoundError: If the file does not exist.
+        """
+        _count('stat')
+        path = self._parse_uri(uri)
+        try:
+            st, crc32c = self._checksum(path)
+        except FileNotFoundError:
+            raise NotFoundError(uri)
+        except OSError as e:
+            raise StorageError(f'error getting metadata for {uri}: {e}')
+        return {
+            'mtime': st.st_mtime,
+            'size': st.st_size,
+            'generation': self._generation(st),
+            'crc32c': crc32c,
+        }
+
+    def list_entries(self, uri: str, pattern: str | None = None) -> list[RemoteEntry]:
+        """List the files in a local directory, along with their metadata.
+
+        Like in Google Cloud Storage, the files are sorted by name, and a directory
+        that does not exist is an empty listing. The checksums of the files are only
+        listed if they were saved when the files were written, they are not computed.
+
+        :param uri: The URI of the directory to list files for.
+        :type uri: str
+        :param pattern: The pattern to match files against.
+        :type pattern: str | None
+        :return: A list of remote entries.
+        :rtype: list[RemoteEntry]
+        :raises StorageError: If the directory cannot be read.
+        """
+        _count('list')
+        path = self._parse_uri(uri)
+        try:
+            files = [(e.name, e.stat()) for e in os.scandir(path) if e.is_file() and not e.name.startswith('.')]
+        except FileNotFoundError:
+            files = []
+        except OSError as e:
+            raise StorageError(f'error listing {uri}: {e}')
+
+        # filter out files using include/exclude
+        if pattern is not None:
+            if pattern.startswith('!'):
+                files = [f for f in files if pattern[1:] not in f[0]]
+            else:
+                files = [f for f in files if pattern in f[0]]
+
+        if len(files) == 0:
+            logger.warning(f'no files found in {uri}')
+
+        return [
+            RemoteEntry(
+                uri=f'file://{path / name}',
+                mtime=st.st_mtime,
+                size=st.st_size,
+                generation=self._generation(st),
+                crc32c=self._saved_checksum(path / name, st),
+            )
+            for name, st in sorted(files)
+        ]
+
+    def list(self, uri: str, pattern: str | None = None) -> list[str]:
+        """List the files in a local directory.
+
+        :param uri: The URI of the directory to list files for.
+        :type uri: str
+        :param pattern: The pattern to match files against.
+        :type pattern: str | None
+        :return: A list of file URIs.
+        :rtype: list[str]
+        :raises StorageError: If the directory cannot be read.
+        """
+        return [entry.uri for entry in self.list_entries(uri, pattern)]
+
+    def download_to_file(self, uri: str, dst: Path, *, start: int = 0, revision: int | None = None) -> int:
+        """Copy a local file to another path.
+
+        :param uri: The URI of the file to download.
+        :type uri: str
+        :param dst: The destination path to download the file to.
+        :type dst: Path
+        :param start: The byte to start downloading from. If greater than zero, the
+            bytes will be appended to the destination file.
+        :type start: int
+        :param revision: Optional. The expected generation number of the file.
+        :type revision: int | None
+        :return: The generation number of the file.
+        :rtype: int
+        :raises NotFoundError: If the file is not found.
+        :raises PreconditionFailedError: If the generation number does not match.
+        :raises StorageError: If an error occurs while downloading the file.
+        """
+        _count('download')
+        with self._open(uri, revision) as (f, generation):
+            try:
+                with open(dst, 'ab' if start else 'wb') as out:
+                    f.seek(start)
+                    shutil.copyfileobj(f, out, READ_CHUNK_SIZE)
+            except OSError as e:
+                raise StorageError(f'error downloading {uri}: {e}')
+        return generation
+
+    def download_to_stream(
+        self,
+        uri: str,
+        stream: IO[bytes],
+        *,
+        start: int = 0,
+        end: int | None = None,
+        revision: int | None = None,
+    ) -> int:
+        """Copy a byte range of a local file into a stream.
+
+        :param uri: The URI of the file to download.
+        :type uri: str
+        :param stream: The stream to write the bytes to.
+        :type stream: IO[bytes]
+        :param start: The first byte to download.
+        :type start: int
+        :param end: Optional. The last byte to download, included. Defaults to the
+            end of the file.
+        :type end: int | None
+        :param revision: Optional. The expected generation number of the file.
+        :type revision: int | None
+        :return: The generation number of the file.
+        :rtype: int
+        :raises NotFoundError: If the file is not found.
+        :raises PreconditionFailedError: If the generation number does not match.
+        :raises StorageError: If an error occurs while downloading the file.
+        """
+        _count('download')
+        with self._open(uri, revision) as (f, generation):
+            remaining = end - start + 1 if end is not None else None
+            try:
+                f.seek(start)
+                while chunk := f.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)):
+                    stream.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            except OSError as e:
+                raise StorageError(f'error downloading {uri}: {e}')
+        return generation
+
+    def download_to_string(self, uri: str) -> tuple[str, int]:
+        """Read a local file and return its contents as a string.
+
+        :param uri: The URI of the file to download.
+        :type uri: str
+        :raises NotFoundError: If the file is not found.
+        :raises StorageError: If an error occurs while reading the file.
+        :return: A tuple containing the file contents and the generation number.
+        :rtype: tuple[str, int]
+        """
+        _count('download')
+        with self._open(uri) as (f, generation):
+            try:
+                return f.read().decode('utf-8'), generation
+            except UnicodeDecodeError as e:
+                raise StorageError(f'error decoding file {uri}: {e}')
+
+    def upload(self, src: Path, uri: str, revision: int | None = None) -> int:
+        """Copy a file to a local path.
+
+        :param src: The source path of the file to upload.
+        :type src: Path
+        :param uri: The URI to upload the file to.
+        :type uri: str
+        :param revision: The expected revision number of the file.
+        :type revision: int | None
+        :return: The new revision number of the file.
+        :rtype: int
+        :raises StorageError: If an error occurs during upload.
+        :raises PreconditionFailedError: If the revision number does not match.
+        """
+        _count('upload')
+        try:
+            crc32c = file_crc32c(src)
+        except OSError as e:
+            raise StorageError(f'error uploading {src}: {e}')
+        return self._write(uri, lambda tmp: shutil.copyfile(src, tmp), crc32c, revision)
+
+    def copy(self, source_uri: str, uri: str) -> int:
+        """Copy a local file to another local path.
+
+        :param source_uri: The URI of the file to copy.
+        :type source_uri: str
+        :param uri: The URI to copy the file to.
+        :type uri: str
+        :return: The generation number of the copy.
+        :rtype: int
+        :raises NotFoundError: If the file to copy does not exist.
+        :raises StorageError: If an error occurs during the copy.
+        """
+        _count('copy')
+        source = self._parse_uri(source_uri)
+        try:
+            _, crc32c = self._checksum(source)
+        except FileNotFoundError:
+            raise NotFoundError(source_uri)
+        except OSError as e:
+            raise StorageError(f'error copying {source_uri} to {uri}: {e}')
+        return self._write(uri, lambda tmp: shutil.copyfile(source, tmp), crc32c)
+
+    def get_session(self) -> None:
+        """Return a session for making requests.
+
+        There are no requests to make to a local storage.
+        """
+        return None
@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+
+from pis.storage import local
+from pis.storage.local import LocalStorage
+from pis.storage.remote_storage import UploadResult, get_remote_storage
+from pis.util.checksum import crc32c
+from pis.util.errors import NotFoundError, PreconditionFailedError, StorageError
+
+CONTENT = b'The quick brown fox jumps over the lazy dog'
+
+
+@pytest.fixture(autouse=True)
+def reset_calls(monkeypatch):
+    monkeypatch.setattr(local, 'calls', local.Counter())
+
+
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / 'src.txt'
+    src.write_bytes(CONTENT)
+    return src
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return f'file://{tmp_path}/bucket'
+
+
+def test_get_remote_storage():
+    assert isinstance(get_remote_storage('file:///tmp/bucket'), LocalStorage)
+
+
+def test_relative_uri():
+    with pytest.raises(StorageError):
+        LocalStorage().stat('file://bucket/file.txt')
+
+
+def test_check(tmp_path, bucket):
+    (tmp_path / 'file.txt').write_bytes(CONTENT)
+
+    assert LocalStorage().check(f'{bucket}/prefix')
+    assert not LocalStorage().check(f'file://{tmp_path}/file.txt/prefix')
+
+
+def test_upload_and_download(src, bucket, tmp_path):
+    storage = LocalStorage()
+
+    generation = storage.upload(src, f'{bucket}/dir/file.txt')
+    dst = tmp_path / 'dst.txt'
+
+    assert storage.download_to_file(f'{bucket}/dir/file.txt', dst) == generation
+    assert dst.read_bytes() == CONTENT
+    assert storage.download_to_string(f'{bucket}/dir/file.txt') == (CONTENT.decode(), generation)
+    assert storage.stat(f'{bucket}/dir/file.txt') == {
+        'mtime': pytest.approx(generation / 1e9),
+        'size': len(CONTENT),
+        'generation': generation,
+        'crc32c': crc32c(CONTENT),
+    }
+    assert local.calls == {'upload': 1, 'download': 2, 'stat': 1}
+
+
+def test_download_resumes(src, bucket, tmp_path):
+    storage = LocalStorage()
+    generation = storage.upload(src, f'{bucket}/file.txt')
+    dst = tmp_path / 'dst.txt'
+    dst.write_bytes(CONTENT[:10])
+
+    storage.download_to_file(f'{bucket}/file.txt', dst, start=10, revision=generation)
+
+    assert dst.read_bytes() == CONTENT
+
+
+def test_download_to_stream(src, bucket):
+    storage = LocalStorage()
+    storage.upload(src, f'{bucket}/file.txt')
+    stream = BytesIO()
+
+    storage.download_to_stream(f'{bucket}/file.txt', stream, start=4, end=8)
+
+    assert stream.getvalue() == CONTENT[4:9]
+
+
+def test_download_not_found(bucket, tmp_path):
+    with pytest.raises(NotFoundError):
+        LocalStorage().download_to_file(f'{bucket}/file.txt', tmp_path / 'dst.txt')
+    with pytest.raises(NotFoundError):
+        LocalStorage().stat(f'{bucket}/file.txt')
+
+
+def test_download_with_outdated_generation(src, bucket, tmp_path):
+    storage = LocalStorage()
+    generation = storage.upload(src, f'{bucket}/file.txt')
+    storage.upload(src, f'{bucket}/file.txt')
+
+    with pytest.raises(PreconditionFailedError):
+        storage.download_to_file(f'{bucket}/file.txt', tmp_path / 'dst.txt', revision=generation)
+
+
+def test_upload_preconditions(src, bucket):
+    storage = LocalStorage()
+
+    first = storage.upload(src, f'{bucket}/file.txt', 0)
+    with pytest.raises(PreconditionFailedError):
+        storage.upload(src, f'{bucket}/file.txt', 0)
+    second = storage.upload(src, f'{bucket}/file.txt', first)
+    with pytest.raises(PreconditionFailedError):
+        storage.upload(src, f'{bucket}/file.txt', first)
+
+    assert second > first
+    assert storage.stat(f'{bucket}/file.txt')['generation'] == second
+
+
+def test_concurrent_compare_and_swap(bucket, tmp_path):
+    storage = LocalStorage()
+    uri = f'{bucket}/counter.txt'
+    (tmp_path / 'zero.txt').write_text('0')
+    storage.upload(tmp_path / 'zero.txt', uri, 0)
+
+    def increment(i: int) -> None:
+        path = tmp_path / f'{i}.txt'
+        while True:
+            value, generation = storage.download_to_string(uri)
+            path.write_text(str(int(value) + 1))
+            try:
+                storage.upload(path, uri, generation)
+                return
+            except PreconditionFailedError:
+                continue
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(increment, range(32)))
+
+    # no increment is lost, the conflicting ones are retried
+    assert storage.download_to_string(uri)[0] == '32'
+    assert local.calls['upload'] >= 33
+
+
+def test_list_entries(tmp_path, bucket):
+    storage = LocalStorage()
+    directory = tmp_path / 'bucket' / 'prefix'
+    directory.mkdir(parents=True)
+    for name in ['file_2.csv', 'file_1.txt', '.file_3.txt.tmp-1234', 'file_4.csv']:
+        (directory / name).write_bytes(CONTENT)
+    (directory / 'dir').mkdir()
+
+    entries = storage.list_entries(f'{bucket}/prefix')
+
+    assert [e.uri for e in entries] == [
+        f'{bucket}/prefix/file_1.txt',
+        f'{bucket}/prefix/file_2.csv',
+        f'{bucket}/prefix/file_4.csv',
+    ]
+    assert all(e.size == len(CONTENT) and e.generation for e in entries)
+    assert storage.list(f'{bucket}/prefix', 'csv') == [f'{bucket}/prefix/file_2.csv', f'{bucket}/prefix/file_4.csv']
+    assert storage.list(f'{bucket}/prefix', '!csv') == [f'{bucket}/prefix/file_1.txt']
+    assert storage.list(f'{bucket}/missing') == []
+
+
+def test_saved_checksum_is_used_without_reading_the_file(src, bucket, tmp_path, monkeypatch):
+    storage = LocalStorage()
+    storage.upload(src, f'{bucket}/file.txt')
+    (tmp_path / 'bucket' / 'other.txt').write_bytes(CONTENT)
+    read: list = []
+    monkeypatch.setattr(local, 'file_crc32c', lambda path: read.append(path) or crc32c(path.read_bytes()))
+
+    assert storage.stat(f'{bucket}/file.txt')['crc32c'] == crc32c(CONTENT)
+    assert [e.crc32c for e in storage.list_entries(bucket)] == [crc32c(CONTENT), None]
+    assert read == []
+
+    # files written by something else, or changed since, are read
+    (tmp_path / 'bucket' / 'file.txt').write_bytes(CONTENT * 2)
+    assert storage.stat(f'{bucket}/file.txt')['crc32c'] == crc32c(CONTENT * 2)
+    assert storage.stat(f'{bucket}/other.txt')['crc32c'] == crc32c(CONTENT)
+    assert read == [tmp_path / 'bucket' / 'file.txt', tmp_path / 'bucket' / 'other.txt']
+
+
+def test_copy(src, bucket):
+    storage = LocalStorage()
+    source_generation = storage.upload(src, f'{bucket}/file.txt')
+
+    generation = storage.copy(f'{bucket}/file.txt', f'{bucket}/copy/file.txt')
+
+    assert generation > source_generation
+    assert storage.stat(f'{bucket}/copy/file.txt')['crc32c'] == crc32c(CONTENT)
+    with pytest.raises(NotFoundError):
+        storage.copy(f'{bucket}/missing.txt', f'{bucket}/copy/file.txt')
+
+
+def test_sync(src, bucket):
+    storage = LocalStorage()
+    storage.upload(src, f'{bucket}/old.txt')
+
+    assert storage.sync(src, f'{bucket}/new.txt', [f'{bucket}/old.txt']) == UploadResult(
+        f'{bucket}/new.txt', len(CONTENT), crc32c(CONTENT), 'copied', f'{bucket}/old.txt'
+    )
+    assert storage.sync(src, f'{bucket}/new.txt').action == 'skipped'
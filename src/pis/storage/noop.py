@@ -25,7 +25,7 @@ class NoopStorage(RemoteStorage):
         """List files."""
         raise NotFoundError(uri)
 
-    def download_to_file(self, uri: str, dst: Path) -> int:
+    def download_to_file(self, uri: str, dst: Path, *, start: int = 0, revision: int | None = None) -> int:
         """Download a file to the local filesystem."""
         raise NotFoundError(uri)
 
@@ -2,11 +2,63 @@
 
 import sys
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 from loguru import logger
 
+from pis.util.checksum import file_crc32c
+from pis.util.errors import NotFoundError
+
+
+@dataclass
+class RemoteEntry:
+    """A file in a remote storage, with the metadata returned by a listing.
+
+    :ivar uri: The URI of the file.
+    :vartype uri: str
+    :ivar mtime: The modification time of the file, as a timestamp.
+    :vartype mtime: float | None
+    :ivar size: The size of the file in bytes.
+    :vartype size: int | None
+    :ivar generation: The revision number of the file.
+    :vartype generation: int | None
+    :ivar crc32c: The CRC32C checksum of the file, if the listing reports it.
+    :vartype crc32c: int | None
+    """
+
+    uri: str
+    mtime: float | None = None
+    size: int | None = None
+    generation: int | None = None
+    crc32c: int | None = None
+
+
+@dataclass
+class UploadResult:
+    """The outcome of syncing a file to a remote storage, see :meth:`RemoteStorage.sync`.
+
+    :ivar uri: The URI of the remote file.
+    :vartype uri: str
+    :ivar size: The size of the file in bytes.
+    :vartype size: int
+    :ivar crc32c: The CRC32C checksum of the file.
+    :vartype crc32c: int
+    :ivar action: Whether the file was `uploaded`, `copied` from another remote file
+        with the same contents, or `skipped` because the remote file was the same.
+    :vartype action: str
+    :ivar source: The URI of the remote file it was copied from, if it was copied.
+    :vartype source: str | None
+    """
+
+    uri: str
+    size: int
+    crc32c: int
+    action: Literal['uploaded', 'copied', 'skipped']
+    source: str | None = None
+
 
 class RemoteStorage(ABC):
     """Abstract base class for remote storage services."""
@@ -29,8 +81,11 @@ class RemoteStorage(ABC):
     def stat(self, uri: str) -> dict:
         """Get metadata for a file.
 
-        Currently, only the modification time is required, as it is used for the
-        download_latest task. This method should be expanded as needed.
+        The metadata must include the modification time (`mtime`), as it is used for
+        the download_latest task, the size in bytes (`size`) and the revision number
+        (`generation`), which are used to resume partial downloads. It can include the
+        CRC32C checksum (`crc32c`) as an integer, to check downloads and skip uploads
+        of files that did not change. This method should be expanded as needed.
 
         :param uri: The URI to get metadata for.
         :type uri: str
@@ -39,6 +94,28 @@ class RemoteStorage(ABC):
         :raises NotFoundError: If the file does not exist.
         """
 
+    def list_entries(self, uri: str, pattern: str | None = None) -> list[RemoteEntry]:
+        """List files in prefix URI, along with their metadata.
+
+        This works like :meth:`list`, but returns the same metadata as :meth:`stat`
+        for each file. By default, every file is stat'ed after listing them. Storages
+        that get the metadata in the listing itself should override this.
+
+        :param uri: The prefix URI by which to list files.
+        :type uri: str
+        :param pattern: Optional. The pattern to match files against.
+        :type pattern: str | None
+        :return: A list of remote entries.
+        :rtype: list[RemoteEntry]
+        """
+        entries = []
+        for file in self.list(uri, pattern):
+            stat = self.stat(file)
+            entries.append(
+                RemoteEntry(file, stat.get('mtime'), stat.get('size'), stat.get('generation'), stat.get('crc32c'))
+            )
+        return entries
+
     @abstractmethod
     def list(self, uri: str, pattern: str | None = None) -> list[str]:
         """List files in prefix URI.
@@ -58,17 +135,26 @@ class RemoteStorage(ABC):
         return []
 
     @abstractmethod
-    def download_to_file(self, uri: str, dst: Path) -> int:
+    def download_to_file(self, uri: str, dst: Path, *, start: int = 0, revision: int | None = None) -> int:
         """Download a file to the local filesystem.
 
+        Optionally, the download can start at a given byte, appending to the
+        destination file, to resume a partial download. A revision number can be
+        provided to ensure that the file has not been modified in the meantime.
+
         :param uri: The URI of the file to download.
         :type uri: str
         :param dst: The destination path to download the file to.
         :type dst: Path
+        :param start: Optional. The byte to start downloading from.
+        :type start: int
+        :param revision: Optional. The expected revision number of the file.
+        :type revision: int | None
         :return: The revision number of the file.
         :rtype: int
         :raises NotFoundError: If the file does not exist.
         :raises HelperError: If an error occurs during download.
+        :raises PreconditionFailedError: If the revision number does not match.
         """
 
     @abstractmethod
@@ -102,6 +188,71 @@ class RemoteStorage(ABC):
         :raises PreconditionFailedError: If the revision number does not match.
         """
 
+    def copy(self, source_uri: str, uri: str) -> int:
+        """Copy a file to another URI in the same remote storage, without downloading it.
+
+        Storages that cannot copy files on the server side do not override this.
+
+        :param source_uri: The URI of the file to copy.
+        :type source_uri: str
+        :param uri: The URI to copy the file to.
+        :type uri: str
+        :return: The new revision number of the file.
+        :rtype: int
+        :raises NotImplementedError: If the storage cannot copy files.
+        :raises NotFoundError: If the file to copy does not exist.
+        :raises HelperError: If an error occurs during the copy.
+        """
+        raise NotImplementedError
+
+    def _has_contents(self, uri: str, size: int, crc32c: int) -> bool:
+        try:
+            metadata = self.stat(uri)
+        except NotFoundError:
+            return False
+        return metadata.get('size') == size and metadata.get('crc32c') == crc32c
+
+    def sync(self, src: Path, uri: str, candidates: Sequence[str] = ()) -> UploadResult:
+        """Upload a file to the remote storage, unless its contents are already there.
+
+        The CRC32C checksum and size of the file are compared with the ones of the
+        remote file, and the upload is skipped if they match. Otherwise, if one of the
+        candidates, which are other remote files that might have the same contents,
+        does match, it is copied on the server side. Only if neither is the case is
+        the file uploaded.
+
+        The checksum of the file is computed once per process, see
+        :func:`pis.util.checksum.file_crc32c`. Storages that do not report CRC32C
+        checksums in :meth:`stat` always upload.
+
+        :param src: The source path of the file to upload.
+        :type src: Path
+        :param uri: The URI to upload the file to.
+        :type uri: str
+        :param candidates: Optional. The URIs of other remote files to copy from.
+        :type candidates: Sequence[str]
+        :return: What was done to get the file to the remote storage.
+        :rtype: UploadResult
+        :raises HelperError: If an error occurs during the upload or copy.
+        """
+        size, crc32c = src.stat().st_size, file_crc32c(src)
+        if self._has_contents(uri, size, crc32c):
+            logger.info(f'{uri} is up to date, skipping upload of {size} bytes')
+            return UploadResult(uri, size, crc32c, 'skipped')
+
+        for candidate in candidates:
+            if candidate == uri or not self._has_contents(candidate, size, crc32c):
+                continue
+            try:
+                self.copy(candidate, uri)
+            except NotImplementedError:
+                break
+            logger.info(f'copied {candidate} to {uri} instead of uploading {size} bytes')
+            return UploadResult(uri, size, crc32c, 'copied', candidate)
+
+        self.upload(src, uri)
+        return UploadResult(uri, size, crc32c, 'uploaded')
+
     @abstractmethod
     def get_session(self) -> Any:
         """Return a session for making requests.
@@ -119,13 +270,14 @@ def get_remote_storage(uri: str | None) -> RemoteStorage:
     :rtype: RemoteStorage
     :raises ValueError: If the URI is not supported.
     """
-    from pis.storage import GoogleStorage, NoopStorage
+    from pis.storage import GoogleStorage, LocalStorage, NoopStorage
 
     if not uri:
         return NoopStorage()
 
     remotes = {
         'gs': GoogleStorage,
+        'file': LocalStorage,
     }
 
     proto = uri.split(':')[0]
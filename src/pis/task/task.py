@@ -2,12 +2,13 @@
 
 from pathlib import Path
 from threading import Event
-from typing import TYPE_CHECKING, Self
+from typing import TYPE_CHECKING, Any, Self
 
 from loguru import logger
 
 from pis.config import scratchpad, settings
 from pis.config.models import BaseTaskDefinition, TaskDefinition
+from pis.manifest.models import Upload
 from pis.manifest.task_reporter import TaskReporter, report
 from pis.storage.remote_storage import get_remote_storage
 from pis.util.fs import absolute_path
@@ -50,12 +51,20 @@ class Task(TaskReporter):
     :vartype definition: BaseTaskDefinition
     :ivar resource: The resource object associated with the task.
     :vartype resource: Resource
+    :ivar needed_locally: Whether other tasks in the step depend on the resource, so
+        it must be in the work directory. Set by the step.
+    :vartype needed_locally: bool
+    :ivar copied_to_remote: Whether the resource was copied to the remote storage
+        on the server side instead of generated locally, see :meth:`copy_to_remote`.
+    :vartype copied_to_remote: bool
     """
 
     def __init__(self, definition: BaseTaskDefinition):
         super().__init__(definition.name)
         self.definition = definition
         self.resource: Resource
+        self.needed_locally = False
+        self.copied_to_remote = False
 
         # replace templates in the definition strings
         for key, value in self.definition.model_dump().items():
@@ -83,6 +92,50 @@ class Task(TaskReporter):
         """
         return self
 
+    @property
+    def resources(self) -> list['Resource']:
+        """The resources generated by the task.
+
+        Most tasks generate a single resource, stored in `resource`. Tasks that write
+        several files must override this to return one resource for each of them.
+
+        :return: The resources of the task.
+        :rtype: list[Resource]
+        """
+        return [self.resource]
+
+    def fingerprint(self) -> dict[str, Any] | None:
+        """Return a fingerprint of the source of the task.
+
+        In incremental runs, the fingerprint is recorded in the manifest, and the task
+        is skipped if neither the fingerprint nor the definition changed since the
+        previous run. Tasks that can be skipped must override this method to return
+        some cheap to get metadata that changes whenever the source changes, like an
+        ETag or a generation number, and must set their `resource` on initialization.
+
+        If not implemented, the task has no fingerprint and will never be skipped.
+
+        :return: The fingerprint of the task source, or `None`.
+        :rtype: dict[str, Any] | None
+        """
+        return None
+
+    def estimate_cost(self) -> float | None:
+        """Estimate how much work the task will take.
+
+        Steps send the most expensive tasks to the pool first, so the largest ones do
+        not start last and delay the end of the step. The cost is the expected size of
+        the resource in bytes, so it can be compared between tasks of different kinds.
+        It should be cheap to get, like the size reported by a HEAD request.
+
+        It is only used for tasks that did not run before, the rest are ordered by the
+        time they took in the previous run. If not implemented, the cost is unknown.
+
+        :return: The estimated cost of the task, or `None` if it is unknown.
+        :rtype: float | None
+        """
+        return None
+
     @report
     def validate(self, *, abort: Event) -> Self:
         """Validate the task.
@@ -107,6 +160,10 @@ class Task(TaskReporter):
         This method will upload the file generated by the task to the remote uri. The
         destination field of the task definition will be used as the path in the bucket.
 
+        The upload is skipped if the remote file already has the same contents, or
+        replaced by a copy on the server side if a file uploaded by the previous run
+        of the task does, see :meth:`sync`.
+
         There is no need to implement this method in the subclass unless the task needs
         some special handling for the upload, which is unlikely.
 
@@ -117,14 +174,90 @@ class Task(TaskReporter):
         """
         assert isinstance(self.definition, TaskDefinition)
 
+        if self.copied_to_remote:
+            logger.info('resource was copied to the remote storage, nothing to upload')
+            return self
+
         source = absolute_path(self.definition.destination)
         remote_uri = settings().remote_uri
         assert remote_uri is not None
         destination = f'{remote_uri}/{self.definition.destination!s}'
-        remote_storage = get_remote_storage(remote_uri)
-        remote_storage.upload(source, destination)
+        self.sync(source, destination)
         return self
 
+    def copy_to_remote(self, source: str) -> bool:
+        """Copy the source of the task straight to its remote destination.
+
+        Tasks that download a single file can call this in `run` to skip the download,
+        and the upload that follows it, when the `remote_copy` setting is on and the
+        source is in the same kind of remote storage as the remote URI. The file is
+        copied on the server side, and recorded in the `uploads` of the manifest. The
+        task must then validate the remote file, as there is no local one.
+
+        Nothing is copied, and the task must download the file as usual, when the
+        resource is needed locally by other tasks, or the storage cannot copy files.
+
+        :param source: The URI of the file to copy.
+        :type source: str
+        :return: Whether the file was copied.
+        :rtype: bool
+        """
+        assert isinstance(self.definition, TaskDefinition)
+
+        remote_uri = settings().remote_uri
+        if not settings().remote_copy or not remote_uri or self.needed_locally:
+            return False
+        if source.split('://')[0] != remote_uri.split('://')[0]:
+            return False
+
+        destination = f'{remote_uri}/{self.definition.destination!s}'
+        remote_storage = get_remote_storage(remote_uri)
+        try:
+            remote_storage.copy(source, destination)
+        except NotImplementedError:
+            logger.debug(f'{remote_storage.__class__.__name__} cannot copy files, downloading {source}')
+            return False
+
+        metadata = remote_storage.stat(destination)
+        self._manifest.uploads.append(
+            Upload(
+                destination=destination,
+                size=metadata['size'],
+                crc32c=metadata.get('crc32c'),
+                action='copied',
+                source=source,
+            )
+        )
+        self.copied_to_remote = True
+        logger.info(f'copied {source} to {destination} on the remote storage')
+        return True
+
+    def sync(self, source: Path, destination: str) -> None:
+        """Send a file to the remote storage, unless its contents are already there.
+
+        The files the previous run of the task uploaded are the candidates to copy
+        from, see :meth:`pis.storage.remote_storage.RemoteStorage.sync`. What was done
+        is recorded in the `uploads` of the task manifest.
+
+        :param source: The path of the file to send.
+        :type source: Path
+        :param destination: The URI to send the file to.
+        :type destination: str
+        """
+        size = source.stat().st_size
+        previous = self._previous.uploads if self._previous else []
+        candidates = [u.destination for u in previous if u.size == size]
+        result = get_remote_storage(destination).sync(source, destination, candidates)
+        self._manifest.uploads.append(
+            Upload(
+                destination=result.uri,
+                size=result.size,
+                crc32c=result.crc32c,
+                action=result.action,
+                source=result.source,
+            )
+        )
+
 
 class Pretask(Task):
     """Base class for all pretasks.
@@ -2,13 +2,13 @@
 
 from dataclasses import dataclass
 from threading import Event
-from typing import Self
+from typing import Any, Self
 
 from loguru import logger
 
-from pis.tasks import Resource, Task, TaskDefinition, report, v
-from pis.util.download import download
-from pis.validators.file import file_exists, file_size
+from pis.tasks import Resource, Task, TaskDefinition, TaskManifest, report, v
+from pis.util.download import DownloadHelper
+from pis.validators.file import file_exists, file_size, remote_copy_matches
 
 
 @dataclass
@@ -17,9 +17,28 @@ class DownloadDefinition(TaskDefinition):
 
     This task has the following custom configuration fields:
         - source (str): The URL of the file to download.
+        - segments (int): Optional. The number of byte ranges to split the download
+            into, overriding the `download_segments` setting.
     """
 
     source: str
+    segments: int | None = None
+
+
+class DownloadManifest(TaskManifest):
+    """Manifest fields for the download task.
+
+    This task reports the following custom fields:
+        - bytes_fetched (int): The number of bytes transferred from the source.
+        - bytes_resumed (int): The number of bytes reused from a previous partial download.
+        - cache_hits (int): The number of files taken from the download cache.
+        - cache_misses (int): The number of files that had to be downloaded into the cache.
+    """
+
+    bytes_fetched: int = 0
+    bytes_resumed: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
 
 
 class Download(Task):
@@ -31,21 +50,47 @@ class Download(Task):
     def __init__(self, definition: TaskDefinition):
         super().__init__(definition)
         self.definition: DownloadDefinition
+        self._manifest: DownloadManifest
+        self.resource = Resource(source=self.definition.source, destination=str(self.definition.destination))
 
     def _is_google_spreadsheet(self) -> bool:
         return self.definition.source.startswith('https://docs.google.com/spreadsheets/')
 
+    def fingerprint(self) -> dict[str, Any] | None:
+        """Get the metadata of the source file, without downloading it."""
+        return DownloadHelper().fingerprint(self.definition.source)
+
+    def estimate_cost(self) -> float | None:
+        """Get the size of the source file, without downloading it."""
+        return DownloadHelper().size(self.definition.source)
+
     @report
     def run(self, *, abort: Event) -> Self:
         """Download a file from the source URL to the destination path."""
-        download(self.definition.source, self.definition.destination, abort=abort)
-        self.resource = Resource(source=self.definition.source, destination=str(self.definition.destination))
+        if self.copy_to_remote(self.definition.source):
+            return self
+
+        helper = DownloadHelper()
+        helper.download(
+            self.definition.source,
+            self.definition.destination,
+            abort=abort,
+            segments=self.definition.segments,
+        )
+        self._manifest.bytes_fetched = helper.stats.bytes_fetched
+        self._manifest.bytes_resumed = helper.stats.bytes_resumed
+        self._manifest.cache_hits = helper.stats.cache_hits
+        self._manifest.cache_misses = helper.stats.cache_misses
         logger.debug('download successful')
         return self
 
     @report
     def validate(self, *, abort: Event) -> Self:
         """Check that the downloaded file exists and has a valid size."""
+        if self.copied_to_remote:
+            v(remote_copy_matches, self.definition.source, self._manifest.uploads[-1].destination)
+            return self
+
         v(file_exists, self.definition.destination)
 
         # skip size validation for google spreadsheet
@@ -2,13 +2,14 @@
 
 from dataclasses import dataclass
 from threading import Event
-from typing import Self
+from typing import Any, Self
 
 from loguru import logger
 
-from pis.storage.remote_storage import get_remote_storage
-from pis.tasks import Resource, Task, TaskDefinition, report
-from pis.util.download import download
+from pis.storage.remote_storage import RemoteEntry, get_remote_storage
+from pis.tasks import Resource, Task, TaskDefinition, TaskManifest, report, v
+from pis.util.download import DownloadHelper
+from pis.validators.file import remote_copy_matches
 
 
 @dataclass
@@ -28,35 +29,62 @@ class DownloadLatestDefinition(TaskDefinition):
     pattern: str | None = None
 
 
+class DownloadLatestManifest(TaskManifest):
+    """Manifest fields for the download_latest task.
+
+    This task reports the following custom fields:
+        - bytes_fetched (int): The number of bytes transferred from the source.
+        - bytes_resumed (int): The number of bytes reused from a previous partial download.
+    """
+
+    bytes_fetched: int = 0
+    bytes_resumed: int = 0
+
+
 class DownloadLatest(Task):
     """Download the file with the latest modification date among those in a prefix URI."""
 
     def __init__(self, definition: TaskDefinition):
         super().__init__(definition)
         self.definition: DownloadLatestDefinition
+        self._manifest: DownloadLatestManifest
+        self._newest_entry: RemoteEntry | None = None
+
+    def _newest(self) -> RemoteEntry:
+        """List the source prefix once and return its newest file."""
+        if self._newest_entry is None:
+            remote_storage = get_remote_storage(self.definition.source)
+            entries = remote_storage.list_entries(self.definition.source, self.definition.pattern)
+            if not entries:
+                raise ValueError(f'no files found in {self.definition.source} with pattern {self.definition.pattern}')
+
+            # the first of the newest files wins, files without a date are the oldest
+            self._newest_entry = max(entries, key=lambda e: e.mtime or 0)
+            logger.info(f'latest file is {self._newest_entry.uri}')
+            self.resource = Resource(source=self._newest_entry.uri, destination=str(self.definition.destination))
+        return self._newest_entry
+
+    def fingerprint(self) -> dict[str, Any] | None:
+        """Get the URI, modification time, generation and size of the newest file."""
+        entry = self._newest()
+        return {'uri': entry.uri, 'mtime': entry.mtime, 'generation': entry.generation, 'size': entry.size}
 
     @report
     def run(self, *, abort: Event) -> Self:
-        destination, source = self.definition.destination, self.definition.source
-
-        remote_storage = get_remote_storage(self.definition.source)
-        files = remote_storage.list(source, self.definition.pattern)
-        if not files:
-            raise ValueError(f'no files found in {self.definition.source} with pattern {self.definition.pattern}')
-
-        newest_file = files.pop(0)
-
-        if len(files):
-            mtime = remote_storage.stat(newest_file)['mtime']
-
-            for file in files:
-                new_mtime = remote_storage.stat(file).get('mtime', 0)
-                if remote_storage.stat(file).get('mtime', 0) > mtime:
-                    newest_file = file
-                    mtime = new_mtime
-
-        logger.info(f'latest file is {newest_file}')
-        download(newest_file, destination)
-        self.resource = Resource(source=newest_file, destination=str(destination))
+        newest = self._newest()
+        if self.copy_to_remote(newest.uri):
+            return self
+
+        helper = DownloadHelper()
+        helper.download(newest.uri, self.definition.destination, abort=abort, entry=newest)
+        self._manifest.bytes_fetched = helper.stats.bytes_fetched
+        self._manifest.bytes_resumed = helper.stats.bytes_resumed
         logger.info('download successful')
         return self
+
+    @report
+    def validate(self, *, abort: Event) -> Self:
+        """Check that a file copied to the remote storage is the same as the latest one."""
+        if self.copied_to_remote:
+            v(remote_copy_matches, self.resource.source, self._manifest.uploads[-1].destination)
+        return self
@@ -1,32 +1,150 @@
 """Download select fields from all documents in a series of ElasticSearch indexes."""
 
 import json
-import sys
+import os
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from contextvars import copy_context
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from threading import Event
-from typing import Any, Self
+from threading import Event, Lock
+from time import perf_counter
+from typing import Any, Literal, Self
 
 import elasticsearch
 import elasticsearch.helpers
 from elasticsearch import Elasticsearch as Es
-from elasticsearch.exceptions import ElasticsearchException
+from elasticsearch.exceptions import ElasticsearchException, NotFoundError
 from elasticsearch.helpers import ScanError
 from loguru import logger
 
-from pis.tasks import Resource, Task, TaskDefinition, report, v
+from pis.tasks import Resource, Task, TaskDefinition, TaskManifest, report, v
+from pis.util import jsonl, parquet
 from pis.util.errors import TaskAbortedError
-from pis.util.fs import absolute_path, check_fs
+from pis.util.fs import absolute_path, check_dir, check_fs
+from pis.util.jsonl import COMPRESSION, DEFAULT_BUFFER_SIZE, JsonlWriter
 from pis.util.misc import list_str
+from pis.util.parquet import DEFAULT_ROW_GROUP_SIZE, ParquetWriter
 from pis.validators.elasticsearch import counts
 
-BUFFER_SIZE = 20000
+# rough size of a document in the output, used to compare the cost of the task with others
+ESTIMATED_DOC_SIZE = 512
+SCROLL_SIZE = 1000
+PIT_PAGE_SIZE = 5000
+PIT_RETRIES = 3
+# the first version of elasticsearch with the point in time api
+PIT_MIN_VERSION = (7, 10)
+# the first version that can sort a point in time by _shard_doc, in index order
+SHARD_DOC_MIN_VERSION = (7, 12)
+# the field types that can be sorted by without loading fielddata
+SORTABLE_TYPES = {'keyword', 'long', 'integer', 'short', 'byte', 'unsigned_long', 'double', 'float', 'date', 'ip'}
+# adaptive batches aim to take this long to fetch, so the latency of each request is
+# a small part of it, and to stay under this many bytes, so they fit in memory
+BATCH_TARGET_TIME = 1.0
+BATCH_MAX_BYTES = 32 * 1024**2
 
 
 class ElasticsearchError(Exception):
     """Base class for Elasticsearch errors."""
 
 
+class AnyEvent:
+    """Read-only view of several events, set if any of them is set."""
+
+    def __init__(self, *events: Event):
+        self._events = events
+
+    def is_set(self) -> bool:
+        """Return whether any of the events is set."""
+        return any(e.is_set() for e in self._events)
+
+
+def connect(url: str, maxsize: int = 10) -> Es:
+    """Open a client to an Elasticsearch instance.
+
+    Requests and responses are compressed with gzip, as documents compress well and
+    exports are usually bound by the network.
+
+    :param url: The URL of the Elasticsearch instance.
+    :type url: str
+    :param maxsize: Optional. The number of connections the client can hold open at
+        the same time, one for each concurrent scan. Defaults to 10.
+    :type maxsize: int
+    :raises ElasticsearchError: If the client cannot be created.
+    :return: The client.
+    :rtype: Es
+    """
+    logger.debug(f'connecting to elasticsearch at {url}')
+    try:
+        return Es(url, maxsize=maxsize, http_compress=True)
+    except ElasticsearchException as e:
+        raise ElasticsearchError(f'connection error: {e}')
+
+
+def _batch_bytes(hits: list[dict[str, Any]]) -> int:
+    """Estimate the size of a batch of hits from the size of its first document."""
+    return len(jsonl.dumps(hits[0]['_source'])) * len(hits) if hits else 0
+
+
+def _log_batch(count: int, nbytes: int, elapsed: float):
+    rate = count / elapsed if elapsed else 0
+    logger.trace(f'fetched {count} documents (~{nbytes} bytes) in {elapsed:.3f}s, {rate:.0f} documents/s')
+
+
+class BatchSizer:
+    """Tune the number of documents to fetch in each request.
+
+    The size of the next batch is scaled by how far the time the last one took is from
+    :data:`BATCH_TARGET_TIME`, at most doubling or halving it each time, and capped so
+    the batch stays under :data:`BATCH_MAX_BYTES` given the observed document size.
+
+    :param size: The size of the first batch.
+    :type size: int
+    :param min_size: The smallest size a batch can have.
+    :type min_size: int
+    :param max_size: The largest size a batch can have.
+    :type max_size: int
+    :ivar size: The size of the next batch.
+    :vartype size: int
+    """
+
+    def __init__(self, size: int, min_size: int, max_size: int):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = self._bounded(size)
+
+    def _bounded(self, size: int) -> int:
+        return min(max(size, self.min_size), self.max_size)
+
+    def update(self, count: int, nbytes: int, elapsed: float) -> int:
+        """Account for a fetched batch, and return the size of the next one.
+
+        :param count: The number of documents in the batch.
+        :type count: int
+        :param nbytes: The size of the documents in the batch in bytes.
+        :type nbytes: int
+        :param elapsed: The time it took to fetch the batch in seconds.
+        :type elapsed: float
+        :return: The size of the next batch.
+        :rtype: int
+        """
+        # a short batch is the last one, and says nothing about the next
+        if count < self.size:
+            return self.size
+        factor = min(max(BATCH_TARGET_TIME / max(elapsed, 1e-3), 0.5), 2.0)
+        size = int(self.size * factor)
+        if nbytes:
+            size = min(size, BATCH_MAX_BYTES * count // nbytes)
+        self.size = self._bounded(size)
+        return self.size
+
+
+def _checkpoint_path(destination: Path) -> Path:
+    return destination.with_name(f'{destination.name}.checkpoint')
+
+
 @dataclass
 class ElasticsearchDefinition(TaskDefinition):
     """Configuration fields for the elasticsearch task.
@@ -36,12 +154,88 @@ class ElasticsearchDefinition(TaskDefinition):
         - destination (str): The path to write the documents to.
         - index (str): The index to scan.
         - fields (list[str]): The fields to include in the documents
+        - slices (int): Optional. The number of sliced scrolls to run concurrently.
+            Each slice is written to its own part file, and the parts are joined
+            into the destination at the end. Defaults to 1, a single scroll.
+        - engine (str): Optional. How to page through the index, either `scroll` or
+            `pit`. With `pit`, a point in time is paged with `search_after`, and the
+            export is checkpointed so it can be resumed if it fails. Servers that do
+            not support it fall back to `scroll`. Defaults to `scroll`.
+        - sort_key (str): Optional. The field to sort the documents by in `pit` mode.
+            It must be a keyword, numeric or date field, unique for each document.
+            Without it, the documents are sorted by `_shard_doc`, which needs
+            elasticsearch 7.12, but is only valid within a point in time, so the
+            export cannot be resumed, nor carry on if the point in time expires.
+        - batch_size (int): Optional. The number of documents to fetch in each
+            request. Defaults to 1000 with `scroll` and 5000 with `pit`.
+        - adaptive_batch_size (bool): Optional. Tune the batch size from the time and
+            bytes of the batches, within `min_batch_size` and `max_batch_size`. In
+            `pit` mode it is tuned after every batch. A scroll fetches batches of the
+            same size until it ends, so in `scroll` mode it is tuned once, from a
+            sample batch fetched before the scroll starts. Defaults to true.
+        - min_batch_size (int): Optional. The smallest adaptive batch. Defaults to 100.
+        - max_batch_size (int): Optional. The largest adaptive batch, it cannot be more
+            than the max result window of the index. Defaults to 10000.
+        - keep_alive (str): Optional. How long the server keeps the scroll or point
+            in time open between requests. Defaults to `5m`.
+        - buffer_size (int): Optional. The size in bytes of serialized documents to
+            hold in memory before writing them to the file. Defaults to 16 MiB.
+        - output_format (str): Optional. The format of the output, either `jsonl` for
+            JSON lines, or `parquet` for columnar Parquet with a column per field.
+            Parquet output needs pyarrow, and cannot be resumed. Defaults to `jsonl`.
+        - parquet_schema (dict[str, str]): Optional. The type of some or all of the
+            columns in `parquet` format, like `string` or `int64`. The types of the
+            rest are inferred from the first row group, so fields that can be missing
+            from all of its documents should be set here.
+        - row_group_size (int): Optional. The number of documents to hold in memory
+            before writing them as a row group in `parquet` format. Defaults to 100000.
+        - compression (str): Optional. Compress the output while it is written, with
+            `gzip` or `zstd`. The destination should have a matching extension. In
+            `parquet` format, the columns are compressed instead of the whole file.
+        - compression_level (int): Optional. The compression level, defaults to the
+            default of the format.
+        - compression_threads (int): Optional. The number of threads to compress with,
+            only used by zstd, -1 for one per core. Defaults to 0, no extra threads.
+        - verify_sha256 (bool): Optional. In validation, read the destination again to
+            count its lines and check the sha256 hash recorded while it was written,
+            instead of trusting the count recorded. Only for `jsonl` output. Defaults
+            to false.
     """
 
     url: str
     destination: Path
     index: str
     fields: list[str]
+    slices: int = 1
+    engine: Literal['scroll', 'pit'] = 'scroll'
+    sort_key: str | None = None
+    batch_size: int | None = None
+    adaptive_batch_size: bool = True
+    min_batch_size: int = 100
+    max_batch_size: int = 10000
+    keep_alive: str = '5m'
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+    output_format: Literal['jsonl', 'parquet'] = 'jsonl'
+    parquet_schema: dict[str, str] | None = None
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE
+    compression: COMPRESSION | None = None
+    compression_level: int | None = None
+    compression_threads: int = 0
+    verify_sha256: bool = False
+
+
+class ElasticsearchManifest(TaskManifest):
+    """Manifest fields for the elasticsearch task.
+
+    This task reports the following custom fields:
+        - doc_count (int): The number of documents in the index when it was scanned.
+        - doc_written (int): The number of documents written to the destination.
+        - sha256 (str): The sha256 hash of the destination file, as written.
+    """
+
+    doc_count: int = 0
+    doc_written: int = 0
+    sha256: str | None = None
 
 
 class Elasticsearch(Task):
@@ -49,6 +243,13 @@ class Elasticsearch(Task):
 
     This task will scan an ElasticSearch index and write the selected fields from each document
     to a file.
+
+    Big indexes can be split into slices that are scrolled at the same time, each in its
+    own thread, see the `slices` field of :class:`ElasticsearchDefinition`.
+
+    In `pit` mode, the position of the export is saved to a checkpoint file next to
+    the destination every time the buffer is flushed. If the task fails or is aborted,
+    the next run resumes from the checkpoint instead of starting over.
     """
 
     def __init__(self, definition: TaskDefinition):
@@ -57,86 +258,401 @@ class Elasticsearch(Task):
         self.es: Es
         self.doc_count: int = 0
         self.doc_written: int = 0
+        self.sha256: str | None = None
+        self._manifest: ElasticsearchManifest
+        self._lock = Lock()
 
-    def _close_es(self):
-        """Close the Elasticsearch connection."""
-        if hasattr(self, 'es'):
-            self.es.close()
-            del self.es
+    def __getstate__(self) -> dict[str, Any]:
+        """Leave the lock out, so the task can be sent to worker processes."""
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]):
+        """Restore the task with a new lock."""
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def _written(self, count: int, destination: Path):
+        """Account for documents written to the destination file."""
+        if not count:
+            return
+        with self._lock:
+            self.doc_written += count
+        logger.debug(f'wrote {count} ({self.doc_written}/{self.doc_count}) documents to {destination}')
+
+    def estimate_cost(self) -> float | None:
+        """Estimate the size of the output from the number of documents in the index."""
+        es = connect(self.definition.url)
+        try:
+            return es.count(index=self.definition.index)['count'] * ESTIMATED_DOC_SIZE
+        finally:
+            es.close()
+
+    def _writer(self, path: Path) -> JsonlWriter | ParquetWriter:
+        if self.definition.output_format == 'parquet':
+            return ParquetWriter(
+                path,
+                self.definition.row_group_size,
+                self.definition.compression,
+                self.definition.compression_level,
+                self.definition.parquet_schema,
+            )
+        return JsonlWriter(
+            path,
+            self.definition.buffer_size,
+            self.definition.compression,
+            self.definition.compression_level,
+            self.definition.compression_threads,
+        )
+
+    def _scroll_size(self) -> int:
+        """Size the batches of a scroll from the time and bytes of a sample batch.
 
-    def _write_docs(self, docs: list[dict[str, Any]], destination: Path):
-        """Write documents to the destination file."""
+        A scroll cannot change the size of its batches, so the size is tuned once,
+        before the scroll starts, instead of after every batch like in `pit` mode.
+        """
+        d = self.definition
+        if not d.adaptive_batch_size:
+            return d.batch_size or SCROLL_SIZE
+        sizer = BatchSizer(d.batch_size or SCROLL_SIZE, d.min_batch_size, d.max_batch_size)
+        body = {'query': {'match_all': {}}, '_source': d.fields, 'size': sizer.size}
         try:
-            with open(destination, 'a+') as f:
-                for d in docs:
-                    json.dump(d, f)
-                    f.write('\n')
-            self.doc_written += len(docs)
+            start = perf_counter()
+            page = self.es.search(index=d.index, body=body)
+            elapsed = perf_counter() - start
+        except ElasticsearchException as e:
+            logger.debug(f'could not fetch a sample batch of index {d.index}: {e}')
+            return sizer.size
+        hits = page['hits']['hits']
+        size = sizer.update(len(hits), _batch_bytes(hits), elapsed)
+        logger.debug(f'scrolling index {d.index} in batches of {size} documents')
+        return size
+
+    def _scroll_hits(self, query: dict[str, Any], size: int) -> Iterator[dict[str, Any]]:
+        """Yield the hits of a scroll, timing each batch as it is fetched."""
+        hits = elasticsearch.helpers.scan(
+            client=self.es,
+            index=self.definition.index,
+            query=query,
+            size=size,
+            scroll=self.definition.keep_alive,
+        )
+        while True:
+            # the scroll fetches a batch when the first of its hits is asked for
+            start = perf_counter()
+            batch = list(islice(hits, size))
+            if not batch:
+                return
+            _log_batch(len(batch), _batch_bytes(batch), perf_counter() - start)
+            yield from batch
+
+    def _scan(
+        self,
+        destination: Path,
+        abort: Event | AnyEvent,
+        slice_id: int | None = None,
+        size: int | None = None,
+    ):
+        """Scroll through the index, or a slice of it, writing the documents to a file."""
+        index = self.definition.index
+        size = size or self._scroll_size()
+        query: dict[str, Any] = {'query': {'match_all': {}}, '_source': self.definition.fields}
+        if slice_id is not None:
+            query['slice'] = {'id': slice_id, 'max': self.definition.slices}
+            logger.debug(f'scanning slice {slice_id} of index {index}')
+
+        try:
+            with self._writer(destination) as writer:
+                for hit in self._scroll_hits(query, size):
+                    if written := writer.write(hit['_source']):
+                        self._written(written, destination)
 
+                        # we can use this moment to check for abort signals and bail out
+                        if abort and abort.is_set():
+                            raise TaskAbortedError
+                self._written(writer.flush(), destination)
+            if slice_id is None:
+                self.sha256 = writer.sha256
+        except ScanError as e:
+            logger.warning(f'error scanning index {index}: {e}')
+            raise ElasticsearchError(f'error scanning index {index}: {e}')
         except OSError as e:
-            self._close_es()
             raise ElasticsearchError(f'error writing to {destination}: {e}')
 
-        logger.debug(f'wrote {len(docs)} ({self.doc_written}/{self.doc_count}) documents to {destination}')
-        logger.debug(f'the dict was taking up {sys.getsizeof(docs)} bytes of memory')
-        docs.clear()
+    def _scan_slices(self, destination: Path, abort: Event):
+        """Scroll through all the slices of the index at the same time, then join them."""
+        slices = self.definition.slices
+        parts = [destination.with_name(f'{destination.name}.part{i}') for i in range(slices)]
+        for part in parts:
+            part.unlink(missing_ok=True)
 
-    @report
-    def run(self, *, abort: Event) -> Self:
-        url = self.definition.url
-        index = self.definition.index
-        fields = self.definition.fields
-        destination = absolute_path(self.definition.destination)
-        check_fs(destination)
+        # a failing slice stops the rest through their own abort event
+        stop = Event()
+        size = self._scroll_size()
+
+        def scan_slice(i: int):
+            try:
+                self._scan(parts[i], AnyEvent(abort, stop), i, size)
+            except Exception:
+                stop.set()
+                raise
 
-        logger.debug(f'connecting to elasticsearch at {url}')
+        logger.info(f'scanning index {self.definition.index} in {slices} slices')
         try:
-            self.es = Es(url)
-        except ElasticsearchException as e:
-            self._close_es()
-            raise ElasticsearchError(f'connection error: {e}')
+            with ThreadPoolExecutor(max_workers=slices) as executor:
+                # copy the context so slices log to the task
+                futures = [executor.submit(copy_context().run, scan_slice, i) for i in range(slices)]
+            errors = [e for f in futures if (e := f.exception())]
+            if errors:
+                # the slices stopped by another one failing are not the cause
+                raise next((e for e in errors if not isinstance(e, TaskAbortedError)), errors[0])
+
+            logger.debug(f'joining {slices} slices into {destination}')
+            parts = [p for p in parts if p.exists()]
+            if self.definition.output_format == 'parquet':
+                d = self.definition
+                self.sha256 = parquet.join(parts, destination, d.compression, d.compression_level)
+            else:
+                self.sha256 = jsonl.join(parts, destination)
+        finally:
+            for part in parts:
+                part.unlink(missing_ok=True)
+
+    def _supports_pit(self) -> bool:
+        version = self.es.info()['version']['number']
+        major_minor = tuple(int(n) for n in version.split('.')[:2])
+        if major_minor < PIT_MIN_VERSION:
+            logger.warning(f'elasticsearch {version} does not support point in time, falling back to scroll')
+            return False
+        if not self.definition.sort_key and major_minor < SHARD_DOC_MIN_VERSION:
+            raise ElasticsearchError(f'a sort_key is needed to page with a point in time in elasticsearch {version}')
+        return True
 
-        logger.debug(f'scanning index {index} with fields {list_str(fields)}')
+    def _check_sort_key(self):
+        """Fail before paging if the sort key is not a field that can be sorted by."""
+        key, index = self.definition.sort_key, self.definition.index
+        if not key or key.startswith('_'):
+            # metadata fields are left to the server
+            return
         try:
-            self.doc_count = self.es.count(index=index)['count']
+            mappings = self.es.indices.get_field_mapping(fields=key, index=index)
         except ElasticsearchException as e:
-            self._close_es()
-            raise ElasticsearchError(f'error getting index count on index {index}: {e}')
-        logger.info(f'index {index} has {self.doc_count} documents')
+            raise ElasticsearchError(f'error getting the mapping of {key} on index {index}: {e}')
+        for name, mapping in mappings.items():
+            field = mapping['mappings'].get(key)
+            if not field:
+                raise ElasticsearchError(f'sort_key {key} is not a field of index {name}')
+            kind = field['mapping'][key.split('.')[-1]].get('type')
+            if kind not in SORTABLE_TYPES:
+                raise ElasticsearchError(
+                    f'sort_key {key} is a {kind} field in index {name}, it must be a keyword, numeric or date field'
+                )
+
+    def _open_pit(self) -> str:
+        return self.es.open_point_in_time(index=self.definition.index, keep_alive=self.definition.keep_alive)['id']
+
+    def _resumable(self) -> bool:
+        # _shard_doc sort values cannot be used in another point in time
+        d = self.definition
+        return d.engine == 'pit' and d.output_format == 'jsonl' and d.sort_key is not None
+
+    def _resume(self, destination: Path, checkpoint: Path) -> list[Any] | None:
+        """Restore the state of a previous export from its checkpoint, if any."""
+        try:
+            state = json.loads(checkpoint.read_text())
+        except (OSError, ValueError):
+            state = None
+
+        if not state or state.get('index') != self.definition.index:
+            destination.unlink(missing_ok=True)
+            return None
+        if not destination.is_file() or destination.stat().st_size < state['size']:
+            logger.warning(f'checkpoint does not match {destination}, starting over')
+            destination.unlink(missing_ok=True)
+            return None
+
+        # documents written after the checkpoint will be fetched again
+        os.truncate(destination, state['size'])
+        self.doc_written = state['doc_written']
+        logger.info(f'resuming export from checkpoint, {self.doc_written} documents already written')
+        return state['search_after']
 
-        buffer: list[dict[str, Any]] = []
+    def _checkpoint(self, size: int, checkpoint: Path, search_after: list[Any]):
+        """Save the position of the export, after the documents up to it are written."""
+        state = {
+            'index': self.definition.index,
+            'search_after': search_after,
+            'doc_written': self.doc_written,
+            'size': size,
+        }
+        tmp = checkpoint.with_name(f'{checkpoint.name}.tmp')
+        tmp.write_text(json.dumps(state))
+        tmp.replace(checkpoint)
+        logger.trace(f'checkpoint saved at {search_after}')
+
+    def _pit_hits(self, query: dict[str, Any], search_after: list[Any] | None) -> Iterator[dict[str, Any]]:
+        """Yield the hits of the index in order, paging through a point in time."""
+        d = self.definition
+        sizer = BatchSizer(d.batch_size or PIT_PAGE_SIZE, d.min_batch_size, d.max_batch_size)
+        size = sizer.size if d.adaptive_batch_size else d.batch_size or PIT_PAGE_SIZE
+        failures = 0
+        pit = self._open_pit()
         try:
-            for hit in elasticsearch.helpers.scan(
-                client=self.es,
-                index=index,
-                query={'query': {'match_all': {}}, '_source': fields},
+            while True:
+                body = {**query, 'size': size, 'pit': {'id': pit, 'keep_alive': d.keep_alive}}
+                if search_after:
+                    body['search_after'] = search_after
+                try:
+                    start = perf_counter()
+                    page = self.es.search(body=body)
+                    elapsed = perf_counter() - start
+                except NotFoundError as e:
+                    # the point in time expired, the sort key lets us carry on in a new one
+                    if not d.sort_key:
+                        raise ElasticsearchError(f'point in time expired without a sort_key to carry on: {e}')
+                    failures += 1
+                    if failures > PIT_RETRIES:
+                        raise ElasticsearchError(f'error paging index {self.definition.index}: {e}')
+                    logger.warning(f'point in time expired, opening a new one: {e}')
+                    pit = self._open_pit()
+                    continue
+                failures = 0
+                pit = page.get('pit_id', pit)
+
+                hits = page['hits']['hits']
+                if not hits:
+                    return
+                nbytes = _batch_bytes(hits)
+                _log_batch(len(hits), nbytes, elapsed)
+                if d.adaptive_batch_size:
+                    size = sizer.update(len(hits), nbytes, elapsed)
+                search_after = hits[-1]['sort']
+                yield from hits
+        finally:
+            try:
+                self.es.close_point_in_time(body={'id': pit})
+            except ElasticsearchException as e:
+                logger.debug(f'could not close point in time: {e}')
+
+    def _scan_pit(self, destination: Path, abort: Event):
+        """Page through a point in time of the index, checkpointing every flush."""
+        index = self.definition.index
+        checkpoint = _checkpoint_path(destination)
+        if self._resumable():
+            search_after = self._resume(destination, checkpoint)
+        else:
+            checkpoint.unlink(missing_ok=True)
+            search_after = None
+        sort_key = self.definition.sort_key or '_shard_doc'
+        query = {
+            'query': {'match_all': {}},
+            '_source': self.definition.fields,
+            'sort': [{sort_key: 'asc'}],
+        }
+
+        logger.info(f'paging through index {index} with a point in time, sorted by {sort_key}')
+        try:
+            with (
+                self._writer(destination) as writer,
+                closing(self._pit_hits(query, search_after)) as hits,
             ):
-                buffer.append(hit['_source'])
-                if len(buffer) >= BUFFER_SIZE:
-                    logger.trace('flushing buffer')
-                    self._write_docs(buffer, destination)
-                    buffer.clear()
-
-                    # we can use this moment to check for abort signals and bail out
-                    if abort and abort.is_set():
-                        raise TaskAbortedError
-        except ScanError as e:
-            logger.warning(f'error scanning index {index}: {e}')
-            raise ElasticsearchError(f'error scanning index {index}: {e}')
+                for hit in hits:
+                    if written := writer.write(hit['_source']):
+                        self._written(written, destination)
+                        if writer.resumable:
+                            self._checkpoint(writer.tell(), checkpoint, hit['sort'])
+
+                        if abort and abort.is_set():
+                            raise TaskAbortedError
+                self._written(writer.flush(), destination)
+            self.sha256 = writer.sha256
+        except ElasticsearchException as e:
+            raise ElasticsearchError(f'error paging index {index}: {e}')
+        except OSError as e:
+            raise ElasticsearchError(f'error writing to {destination}: {e}')
+
+        checkpoint.unlink(missing_ok=True)
+
+    def export(self, es: Es, abort: Event | AnyEvent):
+        """Export the index to the destination, using an open client.
+
+        The client is not closed, so it can be shared with other exports.
+
+        :param es: The Elasticsearch client to scan the index with.
+        :type es: Es
+        :param abort: The event that will be set if the export must stop.
+        :type abort: Event | AnyEvent
+        :raises ElasticsearchError: If the index cannot be counted or scanned.
+        """
+        url = self.definition.url
+        index = self.definition.index
+        fields = self.definition.fields
+        destination = absolute_path(self.definition.destination)
+        if self._resumable() and _checkpoint_path(destination).is_file():
+            # keep the partial export around to resume it
+            check_dir(destination.parent)
+        else:
+            check_fs(destination)
+
+        self.es = es
+        try:
+            logger.debug(f'scanning index {index} with fields {list_str(fields)}')
+            try:
+                self.doc_count = self.es.count(index=index)['count']
+            except ElasticsearchException as e:
+                raise ElasticsearchError(f'error getting index count on index {index}: {e}')
+            logger.info(f'index {index} has {self.doc_count} documents')
+
+            if self.definition.engine == 'pit' and self._supports_pit():
+                if self.definition.slices > 1:
+                    logger.warning('slices are not used when paging with a point in time')
+                self._check_sort_key()
+                self._scan_pit(destination, abort)
+            elif self.definition.slices > 1:
+                self._scan_slices(destination, abort)
+            else:
+                self._scan(destination, abort)
+        finally:
+            del self.es
 
-        self._write_docs(buffer, destination)
         logger.debug(f'wrote {self.doc_written}/{self.doc_count} documents to {destination}')
         self.resource = Resource(source=f'{url}/{index}', destination=str(self.definition.destination))
-        self._close_es()
-        return self
 
-    @report
-    def validate(self, *, abort: Event) -> Self:
+    def check_counts(self):
+        """Validate the export against the counts recorded while it was written.
+
+        The destination is only read again if the export was not written in this run,
+        or if `verify_sha256` is set.
+
+        :raises ValidationError: If the number of documents or the hash do not match.
+        """
+        # the hash is known once the writer is closed, with all the documents counted
+        recorded = self.sha256 is not None
         v(
             counts,
             self.definition.url,
             self.definition.index,
             self.definition.destination,
+            remote_count=self.doc_count or None,
+            local_count=self.doc_written if recorded else None,
+            sha256=self.sha256 if self.definition.verify_sha256 else None,
         )
 
+    @report
+    def run(self, *, abort: Event) -> Self:
+        es = connect(self.definition.url, max(self.definition.slices, 10))
+        try:
+            self.export(es, abort)
+        finally:
+            es.close()
+
+        self._manifest.doc_count = self.doc_count
+        self._manifest.doc_written = self.doc_written
+        self._manifest.sha256 = self.sha256
+        return self
+
+    @report
+    def validate(self, *, abort: Event) -> Self:
+        self.check_counts()
         return self
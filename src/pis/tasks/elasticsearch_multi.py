@@ -0,0 +1,171 @@
+"""Download select fields from several ElasticSearch indexes over a single connection."""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Event
+from typing import Any, Self
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from pis.config import settings
+from pis.tasks import Resource, Task, TaskDefinition, TaskManifest, report
+from pis.tasks.elasticsearch import ESTIMATED_DOC_SIZE, AnyEvent, Elasticsearch, ElasticsearchDefinition, connect
+from pis.util.errors import TaskAbortedError
+from pis.util.fs import absolute_path
+
+
+class IndexExport(BaseModel, extra='allow'):
+    """An index to export in the elasticsearch_multi task.
+
+    Besides the index, fields and destination, it can hold any other field of the
+    elasticsearch task, which overrides the one shared by all the indexes.
+    """
+
+    index: str
+    fields: list[str]
+    destination: Path
+
+
+@dataclass
+class ElasticsearchMultiDefinition(TaskDefinition):
+    """Configuration fields for the elasticsearch_multi task.
+
+    This task has the following custom configuration fields:
+        - url (str): The URL of the ElasticSearch instance.
+        - destination (str): The directory to write the documents to.
+        - indexes (list[dict]): The indexes to export. Each one has an `index`, the
+            `fields` to include in the documents, and a `destination` path relative
+            to the directory of the task.
+        - concurrency (int): Optional. The number of indexes exported at the same
+            time. Defaults to 4.
+
+    Any other field of :class:`pis.tasks.elasticsearch.ElasticsearchDefinition`, like
+    `engine`, `slices` or `compression`, can be set in the task to apply to all the
+    indexes, or in an index to apply only to it.
+    """
+
+    url: str
+    destination: Path
+    indexes: list[IndexExport]
+    concurrency: int = 4
+
+
+class ElasticsearchMultiManifest(TaskManifest):
+    """Manifest fields for the elasticsearch_multi task.
+
+    This task reports the following custom fields:
+        - exports (dict[str, dict]): For each index, the `doc_count` in the index
+            when it was scanned, the `doc_written` to its destination, and the
+            `sha256` hash of the destination file.
+    """
+
+    exports: dict[str, dict[str, Any]] = {}
+
+
+class ElasticsearchMulti(Task):
+    """Download select fields from several ElasticSearch indexes over a single connection.
+
+    Each index is exported like in the elasticsearch task, but all of them share one
+    client and its connection pool, and up to `concurrency` of them are scanned at the
+    same time, each in its own thread. If an export fails, the others are stopped.
+
+    The task generates one resource for each index.
+    """
+
+    def __init__(self, definition: TaskDefinition):
+        super().__init__(definition)
+        self.definition: ElasticsearchMultiDefinition
+        self._manifest: ElasticsearchMultiManifest
+
+        shared = {'url': self.definition.url, **(self.definition.model_extra or {})}
+        try:
+            self.exports = [
+                Elasticsearch(
+                    ElasticsearchDefinition.model_validate({
+                        **shared,
+                        **export.model_dump(),
+                        'name': f'elasticsearch {export.index}',
+                        'destination': self.definition.destination / export.destination,
+                    })
+                )
+                for export in self.definition.indexes
+            ]
+        except ValidationError as e:
+            logger.critical(f'invalid index in task {self.name}: {e}')
+            sys.exit(1)
+
+    @property
+    def resources(self) -> list[Resource]:
+        """One resource for each exported index."""
+        return [export.resource for export in self.exports]
+
+    def estimate_cost(self) -> float | None:
+        """Estimate the size of the output from the number of documents in all the indexes."""
+        es = connect(self.definition.url)
+        try:
+            indexes = ','.join(export.definition.index for export in self.exports)
+            return es.count(index=indexes)['count'] * ESTIMATED_DOC_SIZE
+        finally:
+            es.close()
+
+    @report
+    def run(self, *, abort: Event) -> Self:
+        concurrency = min(self.definition.concurrency, len(self.exports))
+        slices = max(export.definition.slices for export in self.exports)
+        es = connect(self.definition.url, max(concurrency * slices, 10))
+
+        # a failing export stops the rest through their own abort event
+        stop = Event()
+
+        def run_export(export: Elasticsearch):
+            try:
+                export.export(es, AnyEvent(abort, stop))
+            except Exception:
+                stop.set()
+                raise
+
+        logger.info(f'exporting {len(self.exports)} indexes, {concurrency} at a time')
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # copy the context so exports log to the task
+                futures = [executor.submit(copy_context().run, run_export, e) for e in self.exports]
+        finally:
+            es.close()
+
+        errors = [e for f in futures if (e := f.exception())]
+        if errors:
+            # the exports stopped by another one failing are not the cause
+            raise next((e for e in errors if not isinstance(e, TaskAbortedError)), errors[0])
+
+        self._manifest.exports = {
+            export.definition.index: {
+                'doc_count': export.doc_count,
+                'doc_written': export.doc_written,
+                'sha256': export.sha256,
+            }
+            for export in self.exports
+        }
+        return self
+
+    @report
+    def validate(self, *, abort: Event) -> Self:
+        for export in self.exports:
+            export.check_counts()
+
+        return self
+
+    @report
+    def upload(self, *, abort: Event) -> Self:
+        remote_uri = settings().remote_uri
+        assert remote_uri is not None
+        for export in self.exports:
+            source = absolute_path(export.definition.destination)
+            self.sync(source, f'{remote_uri}/{export.definition.destination!s}')
+
+            if abort.is_set():
+                raise TaskAbortedError
+        return self
@@ -0,0 +1,212 @@
+"""Local download cache shared across runs.
+
+Most of the files PIS downloads do not change between runs. The cache keeps a copy
+of each downloaded file, keyed by its URL plus the ETag, Last-Modified and
+Content-Length the server reported for it. On the next run the download is made
+conditional on those validators, and if the server answers that the file has not
+been modified, the cached copy is copied into place instead of downloaded again.
+
+The cache lives in its own directory, separate from the work directory, so it can be
+shared by all the steps and runs on a machine. It has a size cap, and the least
+recently used files are evicted when it is exceeded.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from filelock import FileLock
+from loguru import logger
+
+from pis.config import settings
+
+# ioctl request to clone a file (reflink) on filesystems that support it (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+@dataclass
+class CacheEntry:
+    """An entry in the download cache.
+
+    :ivar url: The URL the file was downloaded from.
+    :vartype url: str
+    :ivar key: The key of the cached file.
+    :vartype key: str
+    :ivar etag: The ETag of the file, if the server provided one.
+    :vartype etag: str | None
+    :ivar last_modified: The Last-Modified date of the file, if the server provided one.
+    :vartype last_modified: str | None
+    :ivar content_length: The Content-Length of the file, if the server provided one.
+    :vartype content_length: str | None
+    """
+
+    url: str
+    key: str
+    etag: str | None = None
+    last_modified: str | None = None
+    content_length: str | None = None
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _copy(src: Path, dst: Path) -> None:
+    """Copy a file, without copying its data if possible.
+
+    It will try to reflink the file, and will fall back to a copy. The file is never
+    hardlinked, as rewriting the destination in place would change the cached file.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            shutil.copyfileobj(fsrc, fdst)
+
+
+class DownloadCache:
+    """Local download cache.
+
+    :param path: The directory where the cache is stored.
+    :type path: Path
+    :param max_size: The maximum size of the cache in bytes.
+    :type max_size: int
+    """
+
+    def __init__(self, path: Path, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._blobs = path / 'blobs'
+        self._index = path / 'index'
+        self._blobs.mkdir(parents=True, exist_ok=True)
+        self._index.mkdir(parents=True, exist_ok=True)
+        self._lock = FileLock(path / '.lock', timeout=60)
+
+    def _blob(self, entry: CacheEntry) -> Path:
+        return self._blobs / entry.key
+
+    def _index_file(self, url: str) -> Path:
+        return self._index / f'{_hash(url)}.json'
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """Get the cache entry for a URL.
+
+        :param url: The URL to look up.
+        :type url: str
+        :return: The cache entry, or `None` if the URL is not cached.
+        :rtype: CacheEntry | None
+        """
+        try:
+            entry = CacheEntry(**json.loads(self._index_file(url).read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+        if entry.url != url or not self._blob(entry).is_file():
+            return None
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: CacheEntry) -> dict[str, str]:
+        """Get the headers to make a request conditional on the cached validators.
+
+        :param entry: The cache entry.
+        :type entry: CacheEntry
+        :return: The conditional request headers.
+        :rtype: dict[str, str]
+        """
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    @staticmethod
+    def is_fresh(entry: CacheEntry, headers) -> bool:
+        """Check if a cache entry matches the validators in a set of response headers.
+
+        :param entry: The cache entry.
+        :type entry: CacheEntry
+        :param headers: The response headers.
+        :return: Whether the cached file is still the same as the remote one.
+        :rtype: bool
+        """
+        if not headers.get('ETag') and not headers.get('Last-Modified'):
+            return False
+        return (entry.etag, entry.last_modified, entry.content_length) == (
+            headers.get('ETag'),
+            headers.get('Last-Modified'),
+            headers.get('Content-Length'),
+        )
+
+    def link(self, entry: CacheEntry, dst: Path) -> None:
+        """Put the cached file in the destination path.
+
+        :param entry: The cache entry.
+        :type entry: CacheEntry
+        :param dst: The destination path.
+        :type dst: Path
+        """
+        blob = self._blob(entry)
+        # touch the blob to mark it as recently used
+        os.utime(blob)
+        _copy(blob, dst)
+        logger.debug(f'cache hit for {entry.url}')
+
+    def store(self, url: str, headers, src: Path) -> None:
+        """Store a downloaded file in the cache.
+
+        Files without an ETag or Last-Modified header are not stored, as there would
+        be no way to know if they changed.
+
+        :param url: The URL the file was downloaded from.
+        :type url: str
+        :param headers: The response headers of the download.
+        :param src: The path of the downloaded file.
+        :type src: Path
+        """
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        if not etag and not last_modified:
+            logger.debug(f'no validators for {url}, not caching it')
+            return
+
+        content_length = headers.get('Content-Length')
+        key = _hash(f'{url}\n{etag}\n{last_modified}\n{content_length}')
+        entry = CacheEntry(url, key, etag, last_modified, content_length)
+
+        with self._lock:
+            previous = self.lookup(url)
+            blob = self._blob(entry)
+            tmp = blob.with_suffix('.tmp')
+            tmp.unlink(missing_ok=True)
+            _copy(src, tmp)
+            tmp.replace(blob)
+            self._index_file(url).write_text(json.dumps(asdict(entry)))
+            if previous and previous.key != key:
+                self._blob(previous).unlink(missing_ok=True)
+            self._evict()
+        logger.debug(f'stored {url} in cache')
+
+    def _evict(self) -> None:
+        blobs = [(b.stat(), b) for b in self._blobs.iterdir() if b.is_file()]
+        size = sum(st.st_size for st, _ in blobs)
+        for st, blob in sorted(blobs, key=lambda b: b[0].st_mtime):
+            if size <= self.max_size:
+                break
+            logger.debug(f'evicting {blob.name} from cache')
+            blob.unlink(missing_ok=True)
+            size -= st.st_size
+
+
+def download_cache() -> DownloadCache | None:
+    """Return the download cache, if it is enabled.
+
+    :return: The download cache, or `None` if no cache directory is configured.
+    :rtype: DownloadCache | None
+    """
+    if settings().cache_dir is None:
+        return None
+    return DownloadCache(settings().cache_dir, settings().cache_size)
@@ -0,0 +1,99 @@
+from unittest.mock import patch
+
+import pytest
+
+from pis.config.models import Settings
+from pis.util.cache import DownloadCache, download_cache
+
+HEADERS = {'ETag': '"abc"', 'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT', 'Content-Length': '4'}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(tmp_path / 'cache', 1024)
+
+
+def test_store_and_link(cache, tmp_path):
+    src = tmp_path / 'file'
+    src.write_text('data')
+    cache.store('https://example.com/file', HEADERS, src)
+
+    entry = cache.lookup('https://example.com/file')
+    dst = tmp_path / 'copy'
+    cache.link(entry, dst)
+
+    assert entry.etag == '"abc"'
+    assert dst.read_text() == 'data'
+
+
+def test_link_does_not_share_the_cached_file(cache, tmp_path):
+    src = tmp_path / 'file'
+    src.write_text('data')
+    cache.store('https://example.com/file', HEADERS, src)
+    src.write_text('edit')
+
+    dst = tmp_path / 'copy'
+    cache.link(cache.lookup('https://example.com/file'), dst)
+    with open(dst, 'r+') as f:
+        f.write('edit')
+    cache.link(cache.lookup('https://example.com/file'), tmp_path / 'again')
+
+    assert (tmp_path / 'again').read_text() == 'data'
+
+
+def test_store_without_validators(cache, tmp_path):
+    src = tmp_path / 'file'
+    src.write_text('data')
+    cache.store('https://example.com/file', {'Content-Length': '4'}, src)
+
+    assert cache.lookup('https://example.com/file') is None
+
+
+def test_store_replaces_previous_version(cache, tmp_path):
+    src = tmp_path / 'file'
+    src.write_text('data')
+    cache.store('https://example.com/file', HEADERS, src)
+    old = cache.lookup('https://example.com/file')
+    cache.store('https://example.com/file', {**HEADERS, 'ETag': '"def"'}, src)
+
+    assert cache.lookup('https://example.com/file').etag == '"def"'
+    assert not (cache.path / 'blobs' / old.key).exists()
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', 10)
+    for name in ['a', 'b', 'c']:
+        src = tmp_path / name
+        src.write_text('data')
+        cache.store(f'https://example.com/{name}', HEADERS, src)
+
+    assert cache.lookup('https://example.com/a') is None
+    assert cache.lookup('https://example.com/c') is not None
+
+
+def test_is_fresh(cache, tmp_path):
+    src = tmp_path / 'file'
+    src.write_text('data')
+    cache.store('https://example.com/file', HEADERS, src)
+    entry = cache.lookup('https://example.com/file')
+
+    assert cache.is_fresh(entry, HEADERS)
+    assert not cache.is_fresh(entry, {**HEADERS, 'Content-Length': '5'})
+    assert not cache.is_fresh(entry, {'Content-Length': '4'})
+
+
+def test_conditional_headers(cache, tmp_path):
+    src = tmp_path / 'file'
+    src.write_text('data')
+    cache.store('https://example.com/file', HEADERS, src)
+    entry = cache.lookup('https://example.com/file')
+
+    assert DownloadCache.conditional_headers(entry) == {
+        'If-None-Match': '"abc"',
+        'If-Modified-Since': 'Wed, 01 Jan 2025 00:00:00 GMT',
+    }
+
+
+def test_download_cache_disabled():
+    with patch('pis.util.cache.settings', return_value=Settings()):
+        assert download_cache() is None
@@ -0,0 +1,166 @@
+"""CRC32C checksums of local files, computed once and in pieces.
+
+Google Cloud Storage keeps a CRC32C checksum of every object, composite ones
+included, while their MD5 hash is only known for objects uploaded in one piece. A
+CRC32C can also be computed for separate byte ranges of a file and combined after,
+so a file downloaded in concurrent segments can be checked without reading it again.
+
+The checksums of whole files are kept for as long as the process lives, keyed on the
+identity and modification time of the file, so a file is read at most once to get
+its checksum, and not at all if it was checksummed as it was downloaded.
+
+The checksums are computed with `google-crc32c <https://github.com/googleapis/python-crc32c>`_,
+which is already a dependency of the Google Cloud Storage client.
+"""
+
+import base64
+import os
+from pathlib import Path
+from threading import Lock
+
+import google_crc32c
+
+from pis.util.jsonl import READ_CHUNK_SIZE
+
+# the reversed CRC32C (Castagnoli) polynomial
+POLYNOMIAL = 0x82F63B78
+
+# the checksums of whole files, by their device, inode, size and modification time
+_file_checksums: dict[tuple[int, int, int, int], int] = {}
+_lock = Lock()
+
+
+def crc32c(data: bytes, crc: int = 0) -> int:
+    """Compute the CRC32C checksum of some data, or extend a previous one with it.
+
+    :param data: The data to checksum.
+    :type data: bytes
+    :param crc: Optional. The checksum of the data that comes before.
+    :type crc: int
+    :return: The checksum.
+    :rtype: int
+    """
+    return google_crc32c.extend(crc, data)
+
+
+def crc32c_file(path: Path, start: int = 0, end: int | None = None) -> int:
+    """Compute the CRC32C checksum of a file, or of a byte range of it.
+
+    :param path: The path of the file.
+    :type path: Path
+    :param start: Optional. The first byte of the range.
+    :type start: int
+    :param end: Optional. The byte after the last one of the range, defaults to the
+        end of the file.
+    :type end: int | None
+    :return: The checksum.
+    :rtype: int
+    """
+    crc = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start if end is not None else None
+        while chunk := f.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)):
+            crc = crc32c(chunk, crc)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return crc
+
+
+def _file_key(path: Path) -> tuple[int, int, int, int]:
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def file_crc32c(path: Path) -> int:
+    """Return the CRC32C checksum of a whole file, computing it only if it is not known.
+
+    :param path: The path of the file.
+    :type path: Path
+    :return: The checksum.
+    :rtype: int
+    """
+    key = _file_key(path)
+    with _lock:
+        crc = _file_checksums.get(key)
+    if crc is None:
+        crc = crc32c_file(path)
+        with _lock:
+            _file_checksums[key] = crc
+    return crc
+
+
+def record_crc32c(path: Path, crc: int) -> None:
+    """Record the CRC32C checksum of a whole file computed elsewhere.
+
+    This is meant for checksums computed while the file was downloaded, so
+    :func:`file_crc32c` does not read it again. The checksum is forgotten as soon as
+    the file is modified.
+
+    :param path: The path of the file.
+    :type path: Path
+    :param crc: The checksum of the file.
+    :type crc: int
+    """
+    key = _file_key(path)
+    with _lock:
+        _file_checksums[key] = crc
+
+
+def _gf2_times(matrix: list[int], vector: int) -> int:
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def _gf2_square(matrix: list[int]) -> list[int]:
+    return [_gf2_times(matrix, row) for row in matrix]
+
+
+def crc32c_combine(crc1: int, crc2: int, length2: int) -> int:
+    """Combine the CRC32C checksums of two consecutive pieces of data.
+
+    This is the method of zlib's `crc32_combine`: the first checksum is shifted over
+    as many zero bits as the second piece has, in logarithmic time, with an operator
+    matrix that is squared for each bit of the length.
+
+    :param crc1: The checksum of the first piece.
+    :type crc1: int
+    :param crc2: The checksum of the second piece.
+    :type crc2: int
+    :param length2: The length in bytes of the second piece.
+    :type length2: int
+    :return: The checksum of both pieces together.
+    :rtype: int
+    """
+    if length2 <= 0:
+        return crc1
+
+    # the operator for one zero bit, then squared into the one for a zero byte
+    operator = [POLYNOMIAL] + [1 << n for n in range(31)]
+    for _ in range(3):
+        operator = _gf2_square(operator)
+
+    while length2:
+        if length2 & 1:
+            crc1 = _gf2_times(operator, crc1)
+        length2 >>= 1
+        if length2:
+            operator = _gf2_square(operator)
+    return crc1 ^ crc2
+
+
+def decode_crc32c(value: str | None) -> int | None:
+    """Decode a CRC32C checksum from the base64 form Google Cloud Storage reports.
+
+    :param value: The base64 encoded, big-endian checksum.
+    :type value: str | None
+    :return: The checksum, or `None` if there is none.
+    :rtype: int | None
+    """
+    return int.from_bytes(base64.b64decode(value), 'big') if value else None
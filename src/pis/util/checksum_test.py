@@ -0,0 +1,59 @@
+import base64
+from unittest.mock import patch
+
+import pytest
+
+from pis.util import checksum
+from pis.util.checksum import crc32c, crc32c_combine, crc32c_file, decode_crc32c, file_crc32c, record_crc32c
+
+DATA = b'The quick brown fox jumps over the lazy dog' * 100
+
+
+def test_crc32c_check_value():
+    assert crc32c(b'123456789') == 0xE3069283
+
+
+@pytest.mark.parametrize('split', [0, 1, 7, 8, 9, 1000, len(DATA)])
+def test_crc32c_combine(split):
+    first, second = DATA[:split], DATA[split:]
+
+    assert crc32c_combine(crc32c(first), crc32c(second), len(second)) == crc32c(DATA)
+
+
+def test_crc32c_file(tmp_path):
+    path = tmp_path / 'file.txt'
+    path.write_bytes(DATA)
+
+    assert crc32c_file(path) == crc32c(DATA)
+    assert crc32c_file(path, 10, 500) == crc32c(DATA[10:500])
+    assert crc32c_file(path, 10, 10) == 0
+
+
+def test_file_crc32c_is_computed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(checksum, '_file_checksums', {})
+    path = tmp_path / 'file.txt'
+    path.write_bytes(DATA)
+
+    assert file_crc32c(path) == crc32c(DATA)
+    with patch('pis.util.checksum.crc32c_file') as mock_crc32c_file:
+        assert file_crc32c(path) == crc32c(DATA)
+    mock_crc32c_file.assert_not_called()
+
+
+def test_record_crc32c(tmp_path, monkeypatch):
+    monkeypatch.setattr(checksum, '_file_checksums', {})
+    path = tmp_path / 'file.txt'
+    path.write_bytes(DATA)
+
+    record_crc32c(path, 123)
+
+    assert file_crc32c(path) == 123
+    path.write_bytes(DATA[:10])
+    assert file_crc32c(path) == crc32c(DATA[:10])
+
+
+def test_decode_crc32c():
+    encoded = base64.b64encode((0xE3069283).to_bytes(4, 'big')).decode()
+
+    assert decode_crc32c(encoded) == 0xE3069283
+    assert decode_crc32c(None) is None
@@ -1,22 +1,203 @@
 """Helper that downloads files from various sources."""
 
 import functools
+import json
+import os
 import shutil
+from collections.abc import Callable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from threading import Event
+from threading import Event, Lock
+from typing import Any
 
 import requests
 from loguru import logger
-from requests.adapters import HTTPAdapter
-from urllib3 import Retry
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
+from pis.config import settings
 from pis.storage.google import GoogleStorage
-from pis.util.errors import HelperError, TaskAbortedError
+from pis.storage.local import LocalStorage
+from pis.storage.remote_storage import RemoteEntry
+from pis.util.cache import DownloadCache, download_cache
+from pis.util.checksum import crc32c, crc32c_combine, crc32c_file, record_crc32c
+from pis.util.errors import DownloadError, HelperError, TaskAbortedError
 from pis.util.fs import absolute_path, check_fs
+from pis.util.session import http_session
 
 # we are going to download big files, better to use a big chunk size
 CHUNK_SIZE = 1024 * 1024 * 10
 REQUEST_TIMEOUT = 10
+# number of times a download is resumed after a connection error before giving up
+RESUME_ATTEMPTS = 3
+# the errors of a broken connection, reading the raw stream raises the urllib3 ones
+CONNECTION_ERRORS = (
+    requests.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    ProtocolError,
+    ReadTimeoutError,
+)
+
+
+@dataclass
+class DownloadStats:
+    """Byte counts of a download.
+
+    :ivar bytes_fetched: The number of bytes transferred from the source.
+    :vartype bytes_fetched: int
+    :ivar bytes_resumed: The number of bytes reused from a previous partial download.
+    :vartype bytes_resumed: int
+    :ivar cache_hits: The number of files taken from the download cache.
+    :vartype cache_hits: int
+    :ivar cache_misses: The number of files that had to be downloaded into the cache.
+    :vartype cache_misses: int
+    """
+
+    bytes_fetched: int = 0
+    bytes_resumed: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+class PartialDownload:
+    """Checkpoint of a download in progress.
+
+    Downloads are written into a `.part` file next to the destination. A small JSON
+    sidecar records the source, the validator of the remote object (ETag, Last-Modified
+    or generation), its size and the bytes received so far for each byte range being
+    downloaded. When a download is retried, the checkpoint is loaded and, if the remote
+    object has not changed, the download continues from where it stopped. Once the
+    download completes, the `.part` file is moved into place and the sidecar removed.
+
+    Without a validator there is no way to know if the remote object changed, so no
+    sidecar is written and those downloads always start from scratch.
+
+    :param src: The source URL.
+    :type src: str
+    :param dst: The destination path.
+    :type dst: Path
+    """
+
+    def __init__(self, src: str, dst: Path):
+        self.src = src
+        self.path = dst.with_name(f'{dst.name}.part')
+        self.dst = dst
+        self.sidecar = dst.with_name(f'{dst.name}.part.json')
+        self.validator: str | None = None
+        self.size: int | None = None
+        self.received: dict[int, int] = {}
+        self._lock = Lock()
+
+    def load(self) -> None:
+        """Load the checkpoint from the sidecar, if there is a valid one."""
+        try:
+            checkpoint = json.loads(self.sidecar.read_text())
+            if checkpoint['source'] == self.src and self.path.is_file():
+                self.validator = checkpoint['validator']
+                self.size = checkpoint['size']
+                self.received = {int(k): v for k, v in checkpoint['received'].items()}
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def matches(self, validator: str | None, size: int | None = None) -> bool:
+        """Return whether the checkpoint belongs to the current version of the source."""
+        return validator is not None and validator == self.validator and (size is None or size == self.size)
+
+    def reset(self, validator: str | None, size: int | None = None) -> None:
+        """Discard any previous progress and start a new checkpoint."""
+        self.path.unlink(missing_ok=True)
+        self.sidecar.unlink(missing_ok=True)
+        self.validator = validator
+        self.size = size
+        self.received = {}
+
+    def checkpoint(self, start: int, offset: int) -> None:
+        """Record that the byte range starting at `start` has been received up to `offset`."""
+        with self._lock:
+            self.received[start] = offset
+            if self.validator is None:
+                return
+            checkpoint = {'source': self.src, 'validator': self.validator, 'size': self.size, 'received': self.received}
+            self.sidecar.write_text(json.dumps(checkpoint))
+
+    @property
+    def bytes_received(self) -> int:
+        """The total number of bytes received."""
+        return sum(offset - start for start, offset in self.received.items())
+
+    def complete(self) -> None:
+        """Move the downloaded file into place and remove the checkpoint."""
+        self.path.replace(self.dst)
+        self.sidecar.unlink(missing_ok=True)
+
+
+class CheckpointWriter:
+    """A wrapper around a file that checkpoints a partial download as it is written."""
+
+    def __init__(self, f, partial: PartialDownload, offset: int):
+        self.f = f
+        self.partial = partial
+        self.offset = offset
+        self._checkpointed = offset
+
+    def write(self, data: bytes) -> int:
+        """Write to the file and update the checkpoint every `CHUNK_SIZE` bytes.
+
+        :return: The number of bytes written.
+        :rtype: int
+        """
+        written = self.f.write(data)
+        self.offset += written
+        if self.offset - self._checkpointed >= CHUNK_SIZE:
+            self.partial.checkpoint(0, self.offset)
+            self._checkpointed = self.offset
+        return written
+
+
+class RangeWriter:
+    """A file-like object that writes a byte range of a download in place.
+
+    The bytes are written at their offset in the partial file, checkpointing the
+    progress every `CHUNK_SIZE` bytes, and their CRC32C checksum is computed as they
+    are written, so the range does not have to be read again to check it.
+    """
+
+    def __init__(self, fd: int, partial: PartialDownload, start: int, offset: int, *stop: Event | None):
+        self.fd = fd
+        self.partial = partial
+        self.start = start
+        self.offset = offset
+        self.stop = [e for e in stop if e]
+        # the bytes received before are checksummed from the partial file
+        self.crc = crc32c_file(partial.path, start, offset) if offset > start else 0
+        self._checkpointed = offset
+
+    def write(self, data: bytes) -> int:
+        """Write at the current offset and extend the checksum.
+
+        :return: The number of bytes written.
+        :rtype: int
+        :raises TaskAbortedError: If any of the stop events is set.
+        """
+        if any(e.is_set() for e in self.stop):
+            raise TaskAbortedError
+        written = os.pwrite(self.fd, data, self.offset)
+        self.crc = crc32c(data[:written], self.crc)
+        self.offset += written
+        if self.offset - self._checkpointed >= CHUNK_SIZE:
+            self.partial.checkpoint(self.start, self.offset)
+            self._checkpointed = self.offset
+        return written
+
+
+def _validator(headers) -> str | None:
+    """Get the validator of a remote object from the response headers.
+
+    Content-encoded responses have no stable byte offsets, so they have no validator.
+    """
+    if headers.get('Content-Encoding', 'identity').lower() != 'identity':
+        return None
+    return headers.get('ETag') or headers.get('Last-Modified')
 
 
 class AbortableStreamWrapper:
@@ -44,9 +225,16 @@ class AbortableStreamWrapper:
 
 
 class Downloader:
-    """Base class for downloaders."""
+    """Base class for downloaders.
+
+    :ivar stats: The byte counts of the last download.
+    :vartype stats: DownloadStats
+    """
 
-    def download(self, src: str, dst: Path, *, abort: Event | None = None) -> Path:
+    def __init__(self):
+        self.stats = DownloadStats()
+
+    def download(self, src: str, dst: Path, *, abort: Event | None = None, segments: int | None = None) -> Path:
         """Download a file from a source to a destination.
 
         This method is a no-op and should be overridden by subclasses.
@@ -57,100 +245,527 @@ class Downloader:
         :type dst: Path
         :param abort: An event that can be set to abort the download, defaults to `None`
         :type abort: Event | None, optional
+        :param segments: The number of segments to split the download into, defaults
+            to `None`, which means using the `download_segments` setting. Downloaders
+            that do not support segmented downloads ignore it.
+        :type segments: int | None, optional
         :return: The destination path.
         :rtype: Path
         """
         return dst
 
+    def fingerprint(self, src: str) -> dict[str, Any] | None:
+        """Get a fingerprint of a source file without downloading it.
+
+        The fingerprint is made of the metadata the source reports for the file, and
+        changes whenever the file changes. This method returns `None`, meaning the
+        file cannot be fingerprinted, and should be overridden by subclasses.
+
+        :param src: The source URL.
+        :type src: str
+        :return: The fingerprint of the file, or `None` if it cannot be computed.
+        :rtype: dict[str, Any] | None
+        """
+        return None
+
+    def size(self, src: str) -> int | None:
+        """Get the size of a source file without downloading it.
+
+        This method returns `None`, meaning the size is unknown, and should be
+        overridden by subclasses.
+
+        :param src: The source URL.
+        :type src: str
+        :return: The size of the file in bytes, or `None` if it is unknown.
+        :rtype: int | None
+        """
+        return None
+
     @staticmethod
-    def _download(src: str, dst: Path, s: requests.Session, abort: Event | None = None):
-        r = s.get(src, stream=True, timeout=(REQUEST_TIMEOUT, None))
+    def _download(
+        src: str,
+        dst: Path,
+        s: requests.Session,
+        abort: Event | None = None,
+        cache: DownloadCache | None = None,
+    ) -> DownloadStats:
+        partial = PartialDownload(src, dst)
+        partial.load()
+        # only single stream checkpoints can be resumed as a single stream
+        offset = partial.received.get(0, 0) if list(partial.received) == [0] else 0
+        entry = cache.lookup(src) if cache and not offset else None
+
+        headers = {}
+        if offset and partial.validator:
+            logger.debug(f'found partial download of {offset} bytes, trying to resume')
+            headers = {'Range': f'bytes={offset}-', 'If-Range': partial.validator, 'Accept-Encoding': 'identity'}
+        elif cache and entry:
+            headers = cache.conditional_headers(entry)
+
+        r = s.get(src, headers=headers, stream=True, timeout=(REQUEST_TIMEOUT, None))
         r.raise_for_status()
 
+        if cache and entry and r.status_code == 304:
+            r.close()
+            cache.link(entry, dst)
+            return DownloadStats(cache_hits=1)
+
+        if offset and r.status_code == 206:
+            logger.info(f'resuming download from byte {offset}')
+        else:
+            offset = 0
+            partial.reset(_validator(r.headers))
+
+        stream = r.raw
         if abort:
             # Wrap r.raw with an AbortableStreamWrapper
-            abortable_stream = AbortableStreamWrapper(r.raw, abort=abort)
+            stream = AbortableStreamWrapper(r.raw, abort=abort)
             # Ensure we decode the content
-            abortable_stream.stream.read = functools.partial(
-                abortable_stream.stream.read,
+            stream.stream.read = functools.partial(
+                stream.stream.read,
                 decode_content=True,
             )
-
-            # Write the content to the destination file
-            with open(dst, 'wb') as f:
-                shutil.copyfileobj(abortable_stream, f)
         else:
-            with open(dst, 'wb') as f:
-                r.raw.decode_content = True
-                shutil.copyfileobj(r.raw, f)
+            r.raw.decode_content = True
+
+        # Write the content to the partial file, checkpointing the progress as we go
+        with open(partial.path, 'r+b' if offset else 'wb') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            writer = CheckpointWriter(f, partial, offset)
+            try:
+                shutil.copyfileobj(stream, writer)
+            finally:
+                f.flush()
+                partial.checkpoint(0, writer.offset)
+
+        partial.complete()
+        if cache:
+            cache.store(src, r.headers, dst)
+        return DownloadStats(
+            bytes_fetched=writer.offset - offset,
+            bytes_resumed=offset,
+            cache_misses=1 if cache else 0,
+        )
+
+    @staticmethod
+    def _resuming(func: Callable[[], DownloadStats]) -> DownloadStats:
+        """Run a download, resuming it from its checkpoint if the connection breaks."""
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except CONNECTION_ERRORS as e:
+                if attempt == RESUME_ATTEMPTS:
+                    raise
+                attempt += 1
+                logger.warning(f'download interrupted ({e}), resuming (attempt {attempt}/{RESUME_ATTEMPTS})')
 
 
 class HttpDownloader(Downloader):
-    """Downloader for HTTP and HTTPS URLs."""
+    """Downloader for HTTP and HTTPS URLs.
+
+    If more than one segment is requested and the server advertises support for
+    range requests, the file is split into byte ranges that are fetched concurrently
+    and written in place into a preallocated destination file. Otherwise, the file is
+    downloaded in a single stream.
 
-    def download(self, src: str, dst: Path, *, abort: Event | None = None) -> Path:
+    If the download cache is enabled, files that have not changed since they were
+    cached are linked into place instead of downloaded.
+    """
+
+    def download(self, src: str, dst: Path, *, abort: Event | None = None, segments: int | None = None) -> Path:
         """Download a file from an HTTP or HTTPS URL."""
+        segments = segments or settings().download_segments
+        session = http_session()
+        cache = download_cache()
+
+        if segments > 1:
+            url, size, headers = self._probe_ranges(src, session)
+            if cache and (entry := cache.lookup(src)) and cache.is_fresh(entry, headers):
+                cache.link(entry, dst)
+                self.stats = DownloadStats(cache_hits=1)
+                return dst
+            if size is not None and size >= settings().download_segments_min_size:
+                logger.debug(f'starting segmented http(s) download in {segments} segments')
+                validator = _validator(headers)
+                self.stats = self._resuming(
+                    lambda: self._download_segmented(url, dst, size, segments, session, abort, validator)
+                )
+                if cache:
+                    cache.store(src, headers, dst)
+                    self.stats.cache_misses = 1
+                return dst
+            logger.debug('range requests not available, falling back to single stream')
+
         logger.debug('starting http(s) download')
-        session = self._create_session_with_retries()
-        self._download(src, dst, session, abort=abort)
+        self.stats = self._resuming(lambda: self._download(src, dst, session, abort=abort, cache=cache))
         return dst
 
-    def _create_session_with_retries(self) -> requests.Session:
-        session = requests.Session()
-        retries = Retry(
-            total=5,
-            backoff_factor=0.1,  # type: ignore[arg-type]
-            status_forcelist=[500, 502, 503, 504],
-            allowed_methods={'GET'},
-        )
-        session.mount('http://', HTTPAdapter(max_retries=retries))
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-        return session
+    def fingerprint(self, src: str) -> dict[str, Any] | None:
+        """Get the validators of a file from a HEAD request."""
+        r = http_session().head(src, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        if not r.headers.get('ETag') and not r.headers.get('Last-Modified'):
+            return None
+        return {h: r.headers.get(h) for h in ['ETag', 'Last-Modified', 'Content-Length']}
+
+    def size(self, src: str) -> int | None:
+        """Get the Content-Length of a file from a HEAD request."""
+        r = http_session().head(src, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        content_length = r.headers.get('Content-Length')
+        return int(content_length) if content_length and content_length.isdigit() else None
+
+    @staticmethod
+    def _probe_ranges(src: str, s: requests.Session) -> tuple[str, int | None, Mapping[str, str]]:
+        """Check if a URL can be downloaded in byte ranges.
+
+        :return: The final URL after redirects, the size of the file, or `None` if
+            range requests are not supported, and the response headers.
+        """
+        try:
+            r = s.head(src, headers={'Accept-Encoding': 'identity'}, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            logger.debug(f'head request failed: {e}')
+            return src, None, {}
+
+        accepts_ranges = r.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        size = r.headers.get('Content-Length')
+        if not accepts_ranges or 'Content-Encoding' in r.headers or size is None or not size.isdigit():
+            return src, None, r.headers
+        return r.url, int(size), r.headers
+
+    @staticmethod
+    def _download_segmented(
+        src: str,
+        dst: Path,
+        size: int,
+        segments: int,
+        s: requests.Session,
+        abort: Event | None = None,
+        validator: str | None = None,
+    ) -> DownloadStats:
+        segment_size = -(-size // segments)
+        ranges = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+        partial = PartialDownload(src, dst)
+        partial.load()
+        if partial.matches(validator, size) and set(partial.received) == {start for start, _ in ranges}:
+            logger.info(f'resuming segmented download with {partial.bytes_received} bytes already received')
+        else:
+            partial.reset(validator, size)
+            for start, _ in ranges:
+                partial.checkpoint(start, start)
+        resumed = partial.bytes_received
+
+        # a local event to stop the rest of the segments when one of them fails
+        stop = Event()
+
+        def fetch(byte_range: tuple[int, int]) -> None:
+            start, end = byte_range
+            offset = partial.received[start]
+            if offset > end:
+                return
+            r = s.get(
+                src,
+                headers={'Range': f'bytes={offset}-{end}', 'Accept-Encoding': 'identity'},
+                stream=True,
+                timeout=(REQUEST_TIMEOUT, None),
+            )
+            with r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise DownloadError(src, Exception(f'expected partial content, got status {r.status_code}'))
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if abort and abort.is_set():
+                        raise TaskAbortedError
+                    if stop.is_set():
+                        return
+                    offset += os.pwrite(fd, chunk, offset)
+                    partial.checkpoint(start, offset)
+            if offset != end + 1:
+                raise DownloadError(src, Exception(f'segment {start}-{end} ended at byte {offset}'))
+
+        fd = os.open(partial.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.truncate(fd, size)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(fetch, r) for r in ranges]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    stop.set()
+                    raise
+        finally:
+            os.close(fd)
+
+        partial.complete()
+        return DownloadStats(bytes_fetched=size - resumed, bytes_resumed=resumed)
 
 
 class GoogleSheetsDownloader(Downloader):
     """Downloader for Google Sheets URLs."""
 
-    def download(self, src: str, dst: Path, *, abort: Event | None = None) -> Path:
+    def download(self, src: str, dst: Path, *, abort: Event | None = None, segments: int | None = None) -> Path:
         """Download a Google Sheet."""
         logger.debug('starting Google Sheets download')
         google_storage = GoogleStorage()
         session = google_storage.get_session()
-        self._download(src, dst, session, abort=abort)
+        self.stats = self._resuming(lambda: self._download(src, dst, session, abort=abort))
         return dst
 
 
 class GoogleStorageDownloader(Downloader):
-    """Downloader for Google Storage URLs."""
+    """Downloader for Google Storage URLs.
+
+    If more than one segment is requested and the file is large enough, it is split
+    into byte ranges that are fetched concurrently and written in place, like in
+    :class:`HttpDownloader`. The CRC32C checksum of each range is computed as it is
+    written, and they are combined and checked against the one of the file once all
+    the ranges are in. Otherwise, the file is downloaded in a single stream, which
+    the client checks against the MD5 hash of the file.
 
-    def download(self, src: str, dst: Path, *, abort: Event | None = None) -> Path:
+    The file is stat'ed to get its generation, size and checksum, unless they are
+    given in a :class:`pis.storage.remote_storage.RemoteEntry` from a listing.
+    """
+
+    def _storage(self) -> GoogleStorage | LocalStorage:
+        return GoogleStorage()
+
+    def fingerprint(self, src: str) -> dict[str, Any] | None:
+        """Get the generation, size and modification time of a file."""
+        metadata = self._storage().stat(src)
+        return {k: metadata[k] for k in ['mtime', 'size', 'generation']}
+
+    def size(self, src: str) -> int | None:
+        """Get the size of a file from its metadata."""
+        return self._storage().stat(src)['size']
+
+    def download(
+        self,
+        src: str,
+        dst: Path,
+        *,
+        abort: Event | None = None,
+        segments: int | None = None,
+        entry: RemoteEntry | None = None,
+    ) -> Path:
         """Download a file from Google Storage."""
+        segments = segments or settings().download_segments
+        storage = self._storage()
+        if entry and entry.generation is not None and entry.size is not None:
+            # the download is pinned to the listed generation, so it cannot be stale
+            generation, size, expected_crc = entry.generation, entry.size, entry.crc32c
+        else:
+            metadata = storage.stat(src)
+            generation, size, expected_crc = metadata['generation'], metadata['size'], metadata.get('crc32c')
+
+        if segments > 1 and size >= settings().download_segments_min_size:
+            logger.debug(f'starting segmented google storage download in {segments} segments')
+            self.stats = self._download_segmented(storage, src, dst, size, segments, generation, expected_crc, abort)
+            return dst
+
         logger.debug('starting google storage download')
-        google_storage = GoogleStorage()
-        google_storage.download_to_file(src, dst)
+
+        partial = PartialDownload(src, dst)
+        partial.load()
+        # only single stream checkpoints can be resumed as a single stream, the partial
+        # file of a segmented download is as large as the whole file from the start
+        resumable = partial.matches(str(generation), size) and list(partial.received) == [0]
+        offset = partial.received[0] if resumable else 0
+        if offset:
+            logger.info(f'resuming download from byte {offset}')
+            # the client appends to the partial file, which must end at the checkpoint
+            os.truncate(partial.path, offset)
+        else:
+            partial.reset(str(generation), size)
+            partial.checkpoint(0, 0)
+
+        if not offset or offset < size:
+            try:
+                storage.download_to_file(src, partial.path, start=offset, revision=generation)
+            finally:
+                # the client writes sequentially, so the size of the partial file is the number of bytes received
+                partial.checkpoint(0, partial.path.stat().st_size if partial.path.is_file() else 0)
+
+        if offset and expected_crc is not None:
+            # the client only validates whole downloads, so a resumed one is checked here
+            crc = crc32c_file(partial.path)
+            if crc != expected_crc:
+                partial.reset(None)
+                raise DownloadError(src, Exception(f'crc32c mismatch, expected {expected_crc:08x}, got {crc:08x}'))
+            logger.debug(f'crc32c checksum {crc:08x} matches')
+            partial.complete()
+            record_crc32c(dst, crc)
+        else:
+            partial.complete()
+        self.stats = DownloadStats(bytes_fetched=size - offset, bytes_resumed=offset)
         return dst
 
+    @staticmethod
+    def _download_segmented(
+        storage: GoogleStorage | LocalStorage,
+        src: str,
+        dst: Path,
+        size: int,
+        segments: int,
+        generation: int,
+        expected_crc: int | None = None,
+        abort: Event | None = None,
+    ) -> DownloadStats:
+        segment_size = -(-size // segments)
+        ranges = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+        partial = PartialDownload(src, dst)
+        partial.load()
+        if partial.matches(str(generation), size) and set(partial.received) == {start for start, _ in ranges}:
+            logger.info(f'resuming segmented download with {partial.bytes_received} bytes already received')
+        else:
+            partial.reset(str(generation), size)
+            for start, _ in ranges:
+                partial.checkpoint(start, start)
+        resumed = partial.bytes_received
+
+        # a local event to stop the rest of the segments when one of them fails
+        stop = Event()
+
+        def fetch(writer: RangeWriter, end: int) -> None:
+            try:
+                if writer.offset <= end:
+                    storage.download_to_stream(src, writer, start=writer.offset, end=end, revision=generation)
+                if writer.offset != end + 1:
+                    raise DownloadError(src, Exception(f'segment {writer.start}-{end} ended at byte {writer.offset}'))
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                partial.checkpoint(writer.start, writer.offset)
+
+        fd = os.open(partial.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.truncate(fd, size)
+            writers = {
+                start: RangeWriter(fd, partial, start, partial.received[start], stop, abort) for start, _ in ranges
+            }
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(fetch, writers[start], end) for start, end in ranges]
+        finally:
+            os.close(fd)
+
+        errors = [e for f in futures if (e := f.exception())]
+        if errors:
+            # the segments stopped by another one failing are not the cause
+            raise next((e for e in errors if not isinstance(e, TaskAbortedError)), errors[0])
+
+        crc = 0
+        for start, end in ranges:
+            crc = crc32c_combine(crc, writers[start].crc, end - start + 1)
+        if expected_crc is not None:
+            if crc != expected_crc:
+                partial.reset(None)
+                raise DownloadError(src, Exception(f'crc32c mismatch, expected {expected_crc:08x}, got {crc:08x}'))
+            logger.debug(f'crc32c checksum {crc:08x} matches')
+
+        partial.complete()
+        # the checksum is kept, so the file is not read again to upload it
+        record_crc32c(dst, crc)
+        return DownloadStats(bytes_fetched=size - resumed, bytes_resumed=resumed)
+
+
+class LocalStorageDownloader(GoogleStorageDownloader):
+    """Downloader for local `file://` URIs.
+
+    It works like :class:`GoogleStorageDownloader`, on top of
+    :class:`pis.storage.local.LocalStorage`, which has the same semantics.
+    """
+
+    def _storage(self) -> LocalStorage:
+        return LocalStorage()
+
 
 class DownloadHelper:
-    """Helper that downloads files from various sources."""
+    """Helper that downloads files from various sources.
+
+    :ivar stats: The byte counts of the last download.
+    :vartype stats: DownloadStats
+    """
 
     def __init__(self):
+        self.stats = DownloadStats()
         self.strategies = {
             'google_sheets': GoogleSheetsDownloader(),
             'http': HttpDownloader(),
             'https': HttpDownloader(),
             'gs': GoogleStorageDownloader(),
+            'file': LocalStorageDownloader(),
         }
 
-    def download(self, src: str, dst: Path | str, abort: Event | None = None) -> Path:
-        """Download a file."""
+    def download(
+        self,
+        src: str,
+        dst: Path | str,
+        abort: Event | None = None,
+        segments: int | None = None,
+        entry: RemoteEntry | None = None,
+    ) -> Path:
+        """Download a file.
+
+        :param src: The source URL.
+        :type src: str
+        :param dst: The destination path.
+        :type dst: Path | str
+        :param abort: Optional. An event to stop the download.
+        :type abort: Event | None
+        :param segments: Optional. The number of segments to split the download into.
+        :type segments: int | None
+        :param entry: Optional. The metadata of the source from a listing of a remote
+            storage, so the source is not stat'ed again before downloading it.
+        :type entry: RemoteEntry | None
+        :return: The destination path.
+        :rtype: Path
+        """
         dst = self._prepare_destination(dst)
         protocol = self._get_protocol(src)
 
         if protocol not in self.strategies:
             raise HelperError(f'unknown protocol {protocol}')
 
-        return self.strategies[protocol].download(src, dst, abort=abort)
+        strategy = self.strategies[protocol]
+        if entry and isinstance(strategy, GoogleStorageDownloader):
+            path = strategy.download(src, dst, abort=abort, segments=segments, entry=entry)
+        else:
+            path = strategy.download(src, dst, abort=abort, segments=segments)
+        self.stats = strategy.stats
+        return path
+
+    def fingerprint(self, src: str) -> dict[str, Any] | None:
+        """Get a fingerprint of a file without downloading it.
+
+        :param src: The source URL.
+        :type src: str
+        :return: The fingerprint of the file, or `None` if it cannot be computed.
+        :rtype: dict[str, Any] | None
+        """
+        protocol = self._get_protocol(src)
+        if protocol not in self.strategies:
+            raise HelperError(f'unknown protocol {protocol}')
+        return self.strategies[protocol].fingerprint(src)
+
+    def size(self, src: str) -> int | None:
+        """Get the size of a file without downloading it.
+
+        :param src: The source URL.
+        :type src: str
+        :return: The size of the file in bytes, or `None` if it is unknown.
+        :rtype: int | None
+        """
+        protocol = self._get_protocol(src)
+        if protocol not in self.strategies:
+            raise HelperError(f'unknown protocol {protocol}')
+        return self.strategies[protocol].size(src)
 
     def _prepare_destination(self, dst: Path | str) -> Path:
         logger.debug(f'preparing to download to {dst!r}')
@@ -166,6 +781,6 @@ class DownloadHelper:
         return src.split(':')[0]
 
 
-def download(src: str, dst: Path | str, *, abort: Event | None = None) -> Path:
+def download(src: str, dst: Path | str, *, abort: Event | None = None, segments: int | None = None) -> Path:
     """Instantiate a DownloadHelper and download a file."""
-    return DownloadHelper().download(src, dst, abort=abort)
+    return DownloadHelper().download(src, dst, abort=abort, segments=segments)
@@ -1,18 +1,35 @@
+from io import BytesIO
 from pathlib import Path
 from threading import Event
 from unittest.mock import Mock, patch
 
 import pytest
+from urllib3.exceptions import ProtocolError
 
+from pis.config.models import Settings
+from pis.storage.remote_storage import RemoteEntry
+from pis.util.cache import DownloadCache
+from pis.util.checksum import crc32c
 from pis.util.download import (
+    DownloadError,
     DownloadHelper,
+    DownloadStats,
     GoogleSheetsDownloader,
     GoogleStorageDownloader,
     HelperError,
     HttpDownloader,
+    LocalStorageDownloader,
+    PartialDownload,
     TaskAbortedError,
     download,
 )
+from pis.util.errors import StorageError
+
+
+@pytest.fixture(autouse=True)
+def mock_settings():
+    with patch('pis.util.download.settings', return_value=Settings()) as mock_settings:
+        yield mock_settings
 
 
 @pytest.fixture
@@ -46,6 +63,7 @@ def test_prepare_destination(mock_check_fs, mock_absolute_path, download_helper)
         ('https', HttpDownloader),
         ('google_sheets', GoogleSheetsDownloader),
         ('gs', GoogleStorageDownloader),
+        ('file', LocalStorageDownloader),
     ],
 )
 def test_download_strategy_selection(download_helper, protocol, downloader_class):
@@ -73,26 +91,26 @@ def test_download_function(mock_download):
     result = download('https://example.com', '/dst')
 
     assert result == Path('/downloaded/file')
-    mock_download.assert_called_once_with('https://example.com', '/dst', abort=None)
+    mock_download.assert_called_once_with('https://example.com', '/dst', abort=None, segments=None)
 
 
-@patch('pis.util.download.requests.Session')
+@patch('pis.util.download.http_session')
 def test_http_downloader(mock_session, tmp_path):
     downloader = HttpDownloader()
     downloader._download = Mock()
-    mock_session_instance = Mock()
-    mock_session.return_value = mock_session_instance
     dst = tmp_path / 'file.txt'
 
     result = downloader.download('https://example.com', dst)
 
     assert result == dst
-    mock_session_instance.mount.assert_called()
+    downloader._download.assert_called_once_with(
+        'https://example.com', dst, mock_session.return_value, abort=None, cache=None
+    )
 
 
 @patch('pis.util.download.open')
 @patch('pis.util.download.shutil.copyfileobj')
-@patch('pis.util.download.requests.Session')
+@patch('pis.util.download.http_session')
 def test_download_with_abort(mock_session, mock_copyfileobj, mock_open):
     downloader = HttpDownloader()
     mock_response = Mock()
@@ -110,3 +128,425 @@ def test_download_with_abort(mock_session, mock_copyfileobj, mock_open):
     mock_session.return_value.get.assert_called_once()
     mock_open.assert_called_once()
     mock_copyfileobj.assert_called_once()  # The copy should not complete due to the abort
+
+
+def _mock_range_response(content: bytes, status_code: int = 206):
+    response = Mock()
+    response.status_code = status_code
+    response.iter_content.return_value = [content]
+    response.__enter__ = Mock(return_value=response)
+    response.__exit__ = Mock(return_value=None)
+    return response
+
+
+def test_probe_ranges_supported():
+    session = Mock()
+    session.head.return_value.headers = {'Accept-Ranges': 'bytes', 'Content-Length': '100', 'ETag': '"abc"'}
+    session.head.return_value.url = 'https://example.com/redirected'
+
+    url, size, headers = HttpDownloader._probe_ranges('https://example.com', session)
+
+    assert (url, size, headers['ETag']) == ('https://example.com/redirected', 100, '"abc"')
+
+
+@pytest.mark.parametrize(
+    'headers',
+    [
+        {'Content-Length': '100'},
+        {'Accept-Ranges': 'none', 'Content-Length': '100'},
+        {'Accept-Ranges': 'bytes'},
+        {'Accept-Ranges': 'bytes', 'Content-Length': '100', 'Content-Encoding': 'gzip'},
+    ],
+)
+def test_probe_ranges_unsupported(headers):
+    session = Mock()
+    session.head.return_value.headers = headers
+
+    assert HttpDownloader._probe_ranges('https://example.com', session)[1] is None
+
+
+def test_download_segmented(tmp_path):
+    content = b'0123456789abcdefghij'
+    session = Mock()
+
+    def get(src, headers, **kwargs):
+        start, end = map(int, headers['Range'].removeprefix('bytes=').split('-'))
+        return _mock_range_response(content[start : end + 1])
+
+    session.get.side_effect = get
+    dst = tmp_path / 'file.txt'
+
+    HttpDownloader._download_segmented('https://example.com', dst, len(content), 3, session)
+
+    assert dst.read_bytes() == content
+    assert session.get.call_count == 3
+
+
+def test_download_segmented_no_partial_content(tmp_path):
+    session = Mock()
+    session.get.return_value = _mock_range_response(b'0123456789', status_code=200)
+
+    with pytest.raises(DownloadError):
+        HttpDownloader._download_segmented('https://example.com', tmp_path / 'file.txt', 10, 2, session)
+
+
+def test_download_segmented_with_abort(tmp_path):
+    session = Mock()
+    session.get.return_value = _mock_range_response(b'01234')
+    abort_event = Event()
+    abort_event.set()
+
+    with pytest.raises(TaskAbortedError):
+        HttpDownloader._download_segmented('https://example.com', tmp_path / 'file.txt', 10, 2, session, abort_event)
+
+
+@patch.object(HttpDownloader, '_download_segmented')
+@patch.object(HttpDownloader, '_download')
+@patch.object(HttpDownloader, '_probe_ranges')
+def test_http_downloader_segment_selection(mock_probe, mock_download, mock_download_segmented, tmp_path):
+    downloader = HttpDownloader()
+    dst = tmp_path / 'file.txt'
+
+    mock_probe.return_value = ('https://example.com', Settings().download_segments_min_size, {})
+    downloader.download('https://example.com', dst, segments=4)
+    mock_download_segmented.assert_called_once()
+    mock_download.assert_not_called()
+
+    mock_probe.return_value = ('https://example.com', None, {})
+    downloader.download('https://example.com', dst, segments=4)
+    mock_download.assert_called_once()
+
+
+def _mock_stream_response(content: bytes, status_code: int = 200, headers: dict | None = None):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.raw = BytesIO(content)
+    response.raw.decode_content = False
+    return response
+
+
+def test_download_resumes_partial_file(tmp_path):
+    dst = tmp_path / 'file.txt'
+    partial = PartialDownload('https://example.com', dst)
+    partial.path.write_bytes(b'01234')
+    partial.reset('"abc"')
+    partial.path.write_bytes(b'01234')
+    partial.checkpoint(0, 5)
+    session = Mock()
+    session.get.return_value = _mock_stream_response(b'56789', status_code=206)
+
+    stats = HttpDownloader._download('https://example.com', dst, session)
+
+    assert dst.read_bytes() == b'0123456789'
+    assert stats == DownloadStats(bytes_fetched=5, bytes_resumed=5)
+    assert session.get.call_args.kwargs['headers']['Range'] == 'bytes=5-'
+    assert session.get.call_args.kwargs['headers']['If-Range'] == '"abc"'
+    assert not partial.path.exists()
+    assert not partial.sidecar.exists()
+
+
+def test_download_restarts_when_source_changed(tmp_path):
+    dst = tmp_path / 'file.txt'
+    partial = PartialDownload('https://example.com', dst)
+    partial.reset('"abc"')
+    partial.path.write_bytes(b'xxxxx')
+    partial.checkpoint(0, 5)
+    session = Mock()
+    session.get.return_value = _mock_stream_response(b'0123456789', headers={'ETag': '"def"'})
+
+    stats = HttpDownloader._download('https://example.com', dst, session)
+
+    assert dst.read_bytes() == b'0123456789'
+    assert stats == DownloadStats(bytes_fetched=10, bytes_resumed=0)
+
+
+def test_download_keeps_checkpoint_on_failure(tmp_path):
+    dst = tmp_path / 'file.txt'
+    session = Mock()
+    response = _mock_stream_response(b'', headers={'ETag': '"abc"'})
+    response.raw = Mock()
+    response.raw.read.side_effect = [b'01234', ProtocolError('Connection broken')]
+    session.get.return_value = response
+
+    with pytest.raises(ProtocolError):
+        HttpDownloader._download('https://example.com', dst, session)
+
+    partial = PartialDownload('https://example.com', dst)
+    partial.load()
+    assert partial.matches('"abc"')
+    assert partial.received == {0: 5}
+    assert partial.path.read_bytes() == b'01234'
+
+
+def test_download_resumes_after_broken_stream(tmp_path):
+    dst = tmp_path / 'file.txt'
+    broken = _mock_stream_response(b'', headers={'ETag': '"abc"'})
+    broken.raw = Mock()
+    broken.raw.read.side_effect = [b'01234', ProtocolError('Connection broken')]
+    session = Mock()
+    session.get.side_effect = [broken, _mock_stream_response(b'56789', status_code=206)]
+
+    stats = HttpDownloader._resuming(lambda: HttpDownloader._download('https://example.com', dst, session))
+
+    assert dst.read_bytes() == b'0123456789'
+    assert stats == DownloadStats(bytes_fetched=5, bytes_resumed=5)
+    assert session.get.call_args.kwargs['headers']['Range'] == 'bytes=5-'
+
+
+def test_download_uses_cache_when_not_modified(tmp_path):
+    cache = DownloadCache(tmp_path / 'cache', 1024)
+    headers = {'ETag': '"abc"', 'Content-Length': '10'}
+    session = Mock()
+    session.get.return_value = _mock_stream_response(b'0123456789', headers=headers)
+
+    miss = HttpDownloader._download('https://example.com', tmp_path / 'first.txt', session, cache=cache)
+    session.get.return_value = _mock_stream_response(b'', status_code=304)
+    hit = HttpDownloader._download('https://example.com', tmp_path / 'second.txt', session, cache=cache)
+
+    assert miss == DownloadStats(bytes_fetched=10, cache_misses=1)
+    assert hit == DownloadStats(cache_hits=1)
+    assert session.get.call_args.kwargs['headers'] == {'If-None-Match': '"abc"'}
+    assert (tmp_path / 'second.txt').read_bytes() == b'0123456789'
+
+
+def test_download_segmented_resumes(tmp_path):
+    content = b'0123456789abcdefghij'
+    dst = tmp_path / 'file.txt'
+    partial = PartialDownload('https://example.com', dst)
+    partial.reset('"abc"', len(content))
+    partial.path.write_bytes(content[:4] + bytes(16))
+    for start, offset in [(0, 4), (7, 7), (14, 14)]:
+        partial.checkpoint(start, offset)
+    session = Mock()
+
+    def get(src, headers, **kwargs):
+        start, end = map(int, headers['Range'].removeprefix('bytes=').split('-'))
+        return _mock_range_response(content[start : end + 1])
+
+    session.get.side_effect = get
+
+    stats = HttpDownloader._download_segmented('https://example.com', dst, len(content), 3, session, None, '"abc"')
+
+    assert dst.read_bytes() == content
+    assert stats == DownloadStats(bytes_fetched=16, bytes_resumed=4)
+    assert session.get.call_args_list[0].kwargs['headers']['Range'] == 'bytes=4-6'
+
+
+@patch('pis.util.download.GoogleStorage')
+def test_google_storage_download_resumes(mock_google_storage, tmp_path):
+    dst = tmp_path / 'file.txt'
+    partial = PartialDownload('gs://bucket/file.txt', dst)
+    partial.reset('123', 10)
+    partial.path.write_bytes(b'0123')
+    partial.checkpoint(0, 4)
+    storage = mock_google_storage.return_value
+    storage.stat.return_value = {'mtime': 0, 'size': 10, 'generation': 123, 'crc32c': crc32c(b'0123456789')}
+    storage.download_to_file.side_effect = lambda uri, path, start, revision: path.write_bytes(b'0123456789')
+    downloader = GoogleStorageDownloader()
+
+    downloader.download('gs://bucket/file.txt', dst)
+
+    storage.download_to_file.assert_called_once_with('gs://bucket/file.txt', partial.path, start=4, revision=123)
+    assert downloader.stats == DownloadStats(bytes_fetched=6, bytes_resumed=4)
+    assert dst.read_bytes() == b'0123456789'
+
+
+@patch('pis.util.download.http_session')
+def test_http_fingerprint(mock_session):
+    mock_session.return_value.head.return_value.headers = {'ETag': '"abc"', 'Content-Length': '10'}
+
+    assert HttpDownloader().fingerprint('https://example.com') == {
+        'ETag': '"abc"',
+        'Last-Modified': None,
+        'Content-Length': '10',
+    }
+
+
+@patch('pis.util.download.http_session')
+def test_http_fingerprint_without_validators(mock_session):
+    mock_session.return_value.head.return_value.headers = {'Content-Length': '10'}
+
+    assert HttpDownloader().fingerprint('https://example.com') is None
+
+
+@patch('pis.util.download.http_session')
+def test_http_size(mock_session):
+    mock_session.return_value.head.return_value.headers = {'Content-Length': '10'}
+
+    assert HttpDownloader().size('https://example.com') == 10
+
+
+@patch('pis.util.download.http_session')
+def test_http_size_unknown(mock_session):
+    mock_session.return_value.head.return_value.headers = {}
+
+    assert HttpDownloader().size('https://example.com') is None
+
+
+def _mock_google_storage(content: bytes, crc: int | None = None) -> Mock:
+    storage = Mock()
+    storage.stat.return_value = {'mtime': 0, 'size': len(content), 'generation': 123, 'crc32c': crc}
+
+    def download_to_stream(uri, stream, start, end, revision):
+        for i in range(start, end + 1, 3):
+            stream.write(content[i : min(i + 3, end + 1)])
+        return revision
+
+    storage.download_to_stream.side_effect = download_to_stream
+    return storage
+
+
+@patch('pis.util.download.GoogleStorage')
+def test_google_storage_download_segmented(mock_google_storage, mock_settings, tmp_path):
+    content = b'0123456789abcdefghij'
+    mock_settings.return_value = Settings(download_segments_min_size=10)
+    storage = mock_google_storage.return_value = _mock_google_storage(content, crc32c(content))
+    dst = tmp_path / 'file.txt'
+    downloader = GoogleStorageDownloader()
+
+    downloader.download('gs://bucket/file.txt', dst, segments=3)
+
+    assert dst.read_bytes() == content
+    assert downloader.stats == DownloadStats(bytes_fetched=20)
+    assert sorted(c.kwargs['start'] for c in storage.download_to_stream.call_args_list) == [0, 7, 14]
+    storage.download_to_file.assert_not_called()
+
+
+@patch('pis.util.download.GoogleStorage')
+def test_google_storage_download_listed_entry_is_not_stated(mock_google_storage, mock_settings, tmp_path):
+    content = b'0123456789abcdefghij'
+    mock_settings.return_value = Settings(download_segments_min_size=10)
+    storage = mock_google_storage.return_value = _mock_google_storage(content)
+    entry = RemoteEntry('gs://bucket/file.txt', size=len(content), generation=123, crc32c=crc32c(content))
+    dst = tmp_path / 'file.txt'
+
+    GoogleStorageDownloader().download('gs://bucket/file.txt', dst, segments=3, entry=entry)
+
+    assert dst.read_bytes() == content
+    storage.stat.assert_not_called()
+    assert {c.kwargs['revision'] for c in storage.download_to_stream.call_args_list} == {123}
+
+
+@patch('pis.util.download.GoogleStorage')
+def test_google_storage_download_segmented_below_min_size(mock_google_storage, mock_settings, tmp_path):
+    mock_settings.return_value = Settings(download_segments_min_size=100)
+    storage = mock_google_storage.return_value = _mock_google_storage(b'0123456789')
+    storage.download_to_file.side_effect = lambda uri, path, start, revision: path.write_bytes(b'0123456789')
+
+    GoogleStorageDownloader().download('gs://bucket/file.txt', tmp_path / 'file.txt', segments=3)
+
+    storage.download_to_stream.assert_not_called()
+
+
+@pytest.mark.parametrize('segments', [1, 3])
+def test_local_storage_download(mock_settings, tmp_path, segments):
+    content = b'0123456789abcdefghij'
+    mock_settings.return_value = Settings(download_segments_min_size=10)
+    (tmp_path / 'bucket').mkdir()
+    (tmp_path / 'bucket' / 'file.txt').write_bytes(content)
+    dst = tmp_path / 'file.txt'
+    downloader = LocalStorageDownloader()
+
+    downloader.download(f'file://{tmp_path}/bucket/file.txt', dst, segments=segments)
+
+    assert dst.read_bytes() == content
+    assert downloader.stats == DownloadStats(bytes_fetched=20)
+
+
+def test_local_storage_download_after_segmented_failure(mock_settings, tmp_path):
+    content = b'0123456789abcdefghij'
+    mock_settings.return_value = Settings(download_segments_min_size=10)
+    (tmp_path / 'bucket').mkdir()
+    (tmp_path / 'bucket' / 'file.txt').write_bytes(content)
+    src = f'file://{tmp_path}/bucket/file.txt'
+    dst = tmp_path / 'file.txt'
+    downloader = LocalStorageDownloader()
+
+    with patch('pis.util.download.RangeWriter.write', side_effect=StorageError('test')):
+        with pytest.raises(StorageError):
+            downloader.download(src, dst, segments=3)
+    downloader.download(src, dst, segments=1)
+
+    assert dst.read_bytes() == content
+    assert downloader.stats == DownloadStats(bytes_fetched=20)
+
+
+@patch('pis.util.download.GoogleStorage')
+def test_google_storage_download_resumed_bad_checksum(mock_google_storage, tmp_path):
+    dst = tmp_path / 'file.txt'
+    partial = PartialDownload('gs://bucket/file.txt', dst)
+    partial.reset('123', 10)
+    partial.path.write_bytes(b'xxxx')
+    partial.checkpoint(0, 4)
+    storage = mock_google_storage.return_value
+    storage.stat.return_value = {'mtime': 0, 'size': 10, 'generation': 123, 'crc32c': crc32c(b'0123456789')}
+    storage.download_to_file.side_effect = lambda uri, path, start, revision: path.open('ab').write(b'456789')
+
+    with pytest.raises(DownloadError, match='crc32c mismatch'):
+        GoogleStorageDownloader().download('gs://bucket/file.txt', dst)
+
+    assert not partial.path.exists()
+    assert not dst.exists()
+
+
+def test_google_storage_download_segmented_resumes(tmp_path):
+    content = b'0123456789abcdefghij'
+    dst = tmp_path / 'file.txt'
+    partial = PartialDownload('gs://bucket/file.txt', dst)
+    partial.reset('123', len(content))
+    partial.path.write_bytes(content[:4] + bytes(16))
+    for start, offset in [(0, 4), (7, 7), (14, 14)]:
+        partial.checkpoint(start, offset)
+    storage = _mock_google_storage(content)
+
+    stats = GoogleStorageDownloader._download_segmented(
+        storage, 'gs://bucket/file.txt', dst, len(content), 3, 123, crc32c(content)
+    )
+
+    assert dst.read_bytes() == content
+    assert stats == DownloadStats(bytes_fetched=16, bytes_resumed=4)
+    assert storage.download_to_stream.call_args_list[0].kwargs['start'] == 4
+
+
+def test_google_storage_download_segmented_bad_checksum(tmp_path):
+    content = b'0123456789abcdefghij'
+    dst = tmp_path / 'file.txt'
+    storage = _mock_google_storage(content)
+
+    with pytest.raises(DownloadError):
+        GoogleStorageDownloader._download_segmented(storage, 'gs://bucket/file.txt', dst, len(content), 3, 123, 0)
+
+    partial = PartialDownload('gs://bucket/file.txt', dst)
+    assert not partial.path.exists()
+    assert not partial.sidecar.exists()
+    assert not dst.exists()
+
+
+def test_google_storage_download_segmented_failure_stops_the_rest(tmp_path):
+    content = b'0123456789abcdefghij'
+    storage = _mock_google_storage(content)
+    download_to_stream = storage.download_to_stream.side_effect
+
+    def fail_first(uri, stream, start, end, revision):
+        if start == 0:
+            raise StorageError('test')
+        download_to_stream(uri, stream, start, end, revision)
+
+    storage.download_to_stream.side_effect = fail_first
+
+    with pytest.raises(StorageError):
+        GoogleStorageDownloader._download_segmented(
+            storage, 'gs://bucket/file.txt', tmp_path / 'file.txt', len(content), 3, 123
+        )
+
+
+def test_google_storage_download_segmented_with_abort(tmp_path):
+    content = b'0123456789abcdefghij'
+    abort_event = Event()
+    abort_event.set()
+
+    with pytest.raises(TaskAbortedError):
+        GoogleStorageDownloader._download_segmented(
+            _mock_google_storage(content), 'gs://bucket/file.txt', tmp_path / 'file.txt', 20, 2, 123, None, abort_event
+        )
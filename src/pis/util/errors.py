@@ -65,6 +65,13 @@ class ScratchpadError(PISError):
         super().__init__(msg)
 
 
+class TaskExitError(PISError):
+    """Raise when a task raises an exception that is not an error, like SystemExit."""
+
+    def __init__(self, msg: str):
+        super().__init__(msg)
+
+
 class StepFailedError(PISError):
     """Raise when a step fails."""
 
@@ -0,0 +1,322 @@
+"""Fast, buffered writing of JSON lines files.
+
+Documents are serialized as they arrive into an in-memory buffer of bytes, and the
+buffer is written to the file in a single call once it grows past a given size. The
+file stays open for as long as the writer does.
+
+If `orjson <https://github.com/ijl/orjson>`_ is installed (``pip install pis[orjson]``),
+it is used to serialize the documents, which is several times faster than the standard
+library. Both encoders produce the same compact, UTF-8 output.
+
+Files can be compressed with gzip or, if `zstandard
+<https://github.com/indygreg/python-zstandard>`_ is installed (``pip install pis[zstd]``),
+with zstd. Every write of the buffer is compressed into a complete gzip member or zstd
+frame, so the file is valid after each write, and can be appended to or cut at any of
+them. Decompressors read concatenated members and frames as a single stream.
+"""
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+from collections.abc import Callable
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, Literal, Self
+
+from pis.util.errors import HelperError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_BUFFER_SIZE = 16 * 1024**2
+READ_CHUNK_SIZE = 1024**2
+
+COMPRESSION = Literal['gzip', 'zstd']
+MAGIC_NUMBERS: dict[bytes, COMPRESSION] = {b'\x1f\x8b': 'gzip', b'\x28\xb5\x2f\xfd': 'zstd'}
+DEFAULT_LEVELS: dict[COMPRESSION, int] = {'gzip': 6, 'zstd': 3}
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(doc: Any) -> bytes:
+    """Serialize a document to a JSON line.
+
+    :param doc: The document to serialize.
+    :type doc: Any
+    :return: The serialized document, ending in a newline.
+    :rtype: bytes
+    """
+    if orjson:
+        return orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE)
+    return _encoder.encode(doc).encode() + b'\n'
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise HelperError('zstd compression needs the zstandard package, install pis[zstd]')
+    return zstandard
+
+
+def compressor(compression: COMPRESSION, level: int | None = None, threads: int = 0) -> Callable[[bytes], bytes]:
+    """Return a function that compresses data into a complete gzip member or zstd frame.
+
+    :param compression: The compression format.
+    :type compression: COMPRESSION
+    :param level: Optional. The compression level, defaults to the one of the format.
+    :type level: int | None
+    :param threads: Optional. The number of threads zstd compresses with, -1 for
+        one per core. Ignored for gzip. Defaults to 0, compressing in the caller.
+    :type threads: int
+    :raises HelperError: If the compression format is not available.
+    :return: The compression function.
+    :rtype: Callable[[bytes], bytes]
+    """
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=level)
+    return _zstandard().ZstdCompressor(level=level, threads=threads).compress
+
+
+def detect_compression(path: Path) -> COMPRESSION | None:
+    """Detect the compression format of a file from its first bytes.
+
+    :param path: The path of the file.
+    :type path: Path
+    :return: The compression format, or `None` if the file is not compressed.
+    :rtype: COMPRESSION | None
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    return next((c for magic, c in MAGIC_NUMBERS.items() if head.startswith(magic)), None)
+
+
+class _HashingReader:
+    """Binary file wrapper that hashes the bytes as they are read from the file."""
+
+    def __init__(self, f: IO[bytes], digest: 'hashlib._Hash'):
+        self._f = f
+        self._digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._digest.update(data)
+        return data
+
+    def drain(self):
+        """Hash the rest of the file, which the decompressor may not have read."""
+        while self.read(READ_CHUNK_SIZE):
+            pass
+
+
+def open_reader(path: Path) -> IO[bytes]:
+    """Open a file for reading, decompressing it on the fly if it is compressed.
+
+    :param path: The path of the file.
+    :type path: Path
+    :raises HelperError: If the file is compressed in a format that is not available.
+    :return: A binary file object with the decompressed contents.
+    :rtype: IO[bytes]
+    """
+    compression = detect_compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        return _zstandard().ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+    return open(path, 'rb')
+
+
+def count_lines(path: Path, digest: 'hashlib._Hash | None' = None) -> int:
+    """Count the lines of a file, decompressing it on the fly if it is compressed.
+
+    Uncompressed files are memory mapped and scanned in place. Compressed files are
+    decompressed in chunks. Either way, the file is never fully loaded in memory.
+
+    :param path: The path of the file.
+    :type path: Path
+    :param digest: Optional. A hash object to update with the contents of the file,
+        as stored on disk, so it is hashed in the same pass.
+    :type digest: hashlib._Hash | None
+    :return: The number of lines.
+    :rtype: int
+    """
+    lines = 0
+    compression = detect_compression(path)
+    if compression is None:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for start in range(0, size, READ_CHUNK_SIZE):
+                    chunk = m[start : start + READ_CHUNK_SIZE]
+                    lines += chunk.count(b'\n')
+                    if digest:
+                        digest.update(chunk)
+        return lines
+
+    if not digest:
+        with open_reader(path) as f:
+            while chunk := f.read(READ_CHUNK_SIZE):
+                lines += chunk.count(b'\n')
+        return lines
+
+    with open(path, 'rb') as f:
+        raw = _HashingReader(f, digest)
+        if compression == 'gzip':
+            reader: IO[bytes] = gzip.GzipFile(fileobj=raw, mode='rb')  # type: ignore[arg-type]
+        else:
+            reader = _zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=False)
+        with reader:
+            while chunk := reader.read(READ_CHUNK_SIZE):
+                lines += chunk.count(b'\n')
+        raw.drain()
+    return lines
+
+
+def sha256(path: Path) -> 'hashlib._Hash':
+    """Hash the contents of a file, as stored on disk.
+
+    :param path: The path of the file.
+    :type path: Path
+    :return: The hash object, which can be updated with more data.
+    :rtype: hashlib._Hash
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256')
+
+
+def join(parts: list[Path], destination: Path) -> str:
+    """Concatenate files into a destination file, hashing it on the way.
+
+    Compressed files can be joined as well, as long as they use the same format.
+
+    :param parts: The files to join, in order.
+    :type parts: list[Path]
+    :param destination: The path of the joined file, overwritten if it exists.
+    :type destination: Path
+    :return: The sha256 hash of the joined file.
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(destination, 'wb') as f:
+        for part in parts:
+            with open(part, 'rb') as p:
+                while chunk := p.read(READ_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JsonlWriter:
+    """Buffered writer of documents to a JSON lines file.
+
+    The writer appends to the file, so a partial file can be carried on. It keeps a
+    sha256 hash of the whole file as it is written, including what was in the file
+    before it was opened.
+
+    :param path: The path of the file to write to.
+    :type path: Path
+    :param buffer_size: The size in bytes the buffer can reach before it is written.
+    :type buffer_size: int
+    :param compression: Optional. The format to compress the file with.
+    :type compression: COMPRESSION | None
+    :param level: Optional. The compression level, see :func:`compressor`.
+    :type level: int | None
+    :param threads: Optional. The number of compression threads, see :func:`compressor`.
+    :type threads: int
+    :ivar lines: The number of documents written to the file so far.
+    :vartype lines: int
+    :ivar bytes_written: The number of bytes written to the file so far.
+    :vartype bytes_written: int
+    """
+
+    resumable = True
+
+    def __init__(
+        self,
+        path: Path,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        compression: COMPRESSION | None = None,
+        level: int | None = None,
+        threads: int = 0,
+    ):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.lines = 0
+        self.bytes_written = 0
+        self._hash = sha256(path) if path.is_file() else hashlib.sha256()
+        self._compress = compressor(compression, level, threads) if compression else None
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._f = open(path, 'ab')  # noqa: SIM115
+
+    def __enter__(self) -> Self:
+        """Enter the context."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ):
+        """Write what is left in the buffer, and close the file."""
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self._f.close()
+
+    def write(self, doc: Any) -> int:
+        """Add a document to the buffer, and write the buffer if it is full.
+
+        :param doc: The document to write.
+        :type doc: Any
+        :return: The number of documents written to the file, zero if the buffer
+            was not written.
+        :rtype: int
+        """
+        line = dumps(doc)
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.buffer_size:
+            return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        """Write the buffer to the file.
+
+        :return: The number of documents written.
+        :rtype: int
+        """
+        written = len(self._buffer)
+        data = b''.join(self._buffer)
+        if self._compress and data:
+            data = self._compress(data)
+        self._f.write(data)
+        self._hash.update(data)
+        self.bytes_written += len(data)
+        self._f.flush()
+        self._buffer.clear()
+        self._buffered = 0
+        self.lines += written
+        return written
+
+    @property
+    def sha256(self) -> str:
+        """The sha256 hash of the file, not counting the buffer."""
+        return self._hash.hexdigest()
+
+    def tell(self) -> int:
+        """Return the size of the file, not counting the buffer.
+
+        :return: The position in the file.
+        :rtype: int
+        """
+        return self._f.tell()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+from unittest.mock import patch
+
+import pytest
+
+from pis.util.errors import HelperError
+from pis.util.jsonl import JsonlWriter, count_lines, detect_compression, dumps, join, open_reader
+
+DOC = {'id': 'CHEMBL25', 'name': 'ácido', 'phases': [1, 2.5, None], 'nested': {'ok': True}}
+
+
+def test_dumps():
+    line = dumps(DOC)
+
+    assert line.endswith(b'\n')
+    assert b'\n' not in line[:-1]
+    assert json.loads(line) == DOC
+
+
+def test_dumps_without_orjson():
+    with patch('pis.util.jsonl.orjson', None):
+        line = dumps(DOC)
+
+    assert line == b'{"id":"CHEMBL25","name":"\xc3\xa1cido","phases":[1,2.5,null],"nested":{"ok":true}}\n'
+
+
+def test_writer_flushes_by_size(tmp_path):
+    path = tmp_path / 'docs.jsonl'
+    line_size = len(dumps(DOC))
+
+    with JsonlWriter(path, buffer_size=line_size * 2) as writer:
+        assert writer.write(DOC) == 0
+        assert writer.write(DOC) == 2
+        assert writer.tell() == line_size * 2
+        writer.write(DOC)
+
+    assert writer.lines == 3
+    assert [json.loads(line) for line in path.read_text().splitlines()] == [DOC] * 3
+
+
+def test_writer_appends(tmp_path):
+    path = tmp_path / 'docs.jsonl'
+    path.write_bytes(dumps(DOC))
+
+    with JsonlWriter(path) as writer:
+        writer.write(DOC)
+
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_writer_discards_buffer_on_error(tmp_path):
+    path = tmp_path / 'docs.jsonl'
+
+    try:
+        with JsonlWriter(path) as writer:
+            writer.write(DOC)
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert path.read_bytes() == b''
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_writer_compresses(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    path = tmp_path / 'docs.jsonl.z'
+
+    with JsonlWriter(path, buffer_size=1, compression=compression) as writer:
+        writer.write(DOC)
+        size = writer.tell()
+        writer.write(DOC)
+
+    assert detect_compression(path) == compression
+    assert count_lines(path) == 2
+    # each write is a complete member or frame, so the file can be cut after it
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+    with open_reader(path) as f:
+        assert [json.loads(line) for line in f.read().splitlines()] == [DOC]
+
+
+def test_count_lines_uncompressed(tmp_path):
+    path = tmp_path / 'docs.jsonl'
+    path.write_bytes(dumps(DOC) * 3)
+
+    assert detect_compression(path) is None
+    assert count_lines(path) == 3
+
+
+def test_zstd_without_zstandard(tmp_path):
+    with patch.dict('sys.modules', {'zstandard': None}), pytest.raises(HelperError):
+        JsonlWriter(tmp_path / 'docs.jsonl.zst', compression='zstd')
+
+
+def test_count_lines_empty(tmp_path):
+    path = tmp_path / 'docs.jsonl'
+    path.touch()
+
+    assert count_lines(path) == 0
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_count_lines_hashes_file(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    path = tmp_path / 'docs.jsonl'
+    with JsonlWriter(path, buffer_size=1, compression=compression) as writer:
+        for _ in range(3):
+            writer.write(DOC)
+
+    digest = hashlib.sha256()
+    assert count_lines(path, digest) == 3
+    assert digest.hexdigest() == writer.sha256 == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_writer_hashes_whole_file(tmp_path):
+    path = tmp_path / 'docs.jsonl'
+    path.write_bytes(dumps(DOC))
+
+    with JsonlWriter(path, compression='gzip') as writer:
+        writer.write(DOC)
+
+    assert writer.bytes_written == path.stat().st_size - len(dumps(DOC))
+    assert writer.sha256 == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_join(tmp_path):
+    parts = [tmp_path / f'part{i}' for i in range(3)]
+    for i, part in enumerate(parts):
+        part.write_bytes(dumps({'part': i}))
+    destination = tmp_path / 'docs.jsonl'
+
+    digest = join(parts, destination)
+
+    assert [json.loads(line)['part'] for line in destination.read_text().splitlines()] == [0, 1, 2]
+    assert digest == hashlib.sha256(destination.read_bytes()).hexdigest()
@@ -91,14 +91,18 @@ def task_logging(task: 'Task'):
     """
     with logger.contextualize(task=task.name):
         sink_task = lambda message: task._manifest.log.append(message)
-        logger.add(
+        handler_id = logger.add(
             sink=sink_task,
             filter=lambda record: record['extra'].get('task') == task.name,
             format=get_format_log(include_task=False),
             level=settings().log_level,
         )
 
-        yield
+        try:
+            yield
+        finally:
+            # workers are reused across tasks, so the sink must not outlive the task
+            logger.remove(handler_id)
 
 
 def init_logger(log_level: str) -> None:
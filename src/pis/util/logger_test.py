@@ -115,6 +115,10 @@ def test_task_logging_context_manager(config):
         logger.info('Test message')
         assert len(task._manifest.log) == 1
 
+    with logger.contextualize(task=task.name):
+        logger.info('Message after the task')
+    assert len(task._manifest.log) == 1
+
 
 def test_init_logger(monkeypatch, capsys, tmp_path):
     test_file_path = tmp_path / 'pis_test_output.log'
@@ -0,0 +1,275 @@
+"""Columnar writing of documents to Apache Parquet files.
+
+Documents are buffered as rows, and every time the buffer is written it becomes a
+row group of the file, so at most a row group of documents is held in memory. The
+schema of the file is taken from the first row group, and the types of some or all of
+the columns can be given instead of inferred. That is needed for the columns that are
+null in all the documents of the first row group, as their type cannot be inferred.
+
+Parquet output needs `pyarrow <https://arrow.apache.org/docs/python/>`_, which is
+installed with ``pip install pis[parquet]``.
+
+Unlike JSON lines files, Parquet files have a footer with their metadata, so they can
+neither be appended to nor cut short. Writes cannot be resumed, and a file is only
+valid once its writer is closed.
+"""
+
+from contextlib import suppress
+from pathlib import Path
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Self
+
+from pis.util.errors import HelperError
+from pis.util.jsonl import COMPRESSION, sha256
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+DEFAULT_ROW_GROUP_SIZE = 100_000
+MAGIC_NUMBER = b'PAR1'
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet
+    except ImportError:
+        raise HelperError('parquet output needs the pyarrow package, install pis[parquet]')
+    return pa
+
+
+def is_parquet(path: Path) -> bool:
+    """Check if a file is a Parquet file from its first bytes.
+
+    :param path: The path of the file.
+    :type path: Path
+    :return: Whether the file is a Parquet file.
+    :rtype: bool
+    """
+    with open(path, 'rb') as f:
+        return f.read(4) == MAGIC_NUMBER
+
+
+def count_rows(path: Path) -> int:
+    """Count the rows of a Parquet file, reading only its metadata.
+
+    :param path: The path of the file.
+    :type path: Path
+    :raises HelperError: If pyarrow is not installed.
+    :return: The number of rows.
+    :rtype: int
+    """
+    return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+
+
+def parse_schema(columns: dict[str, str]) -> 'pa.Schema':
+    """Build a schema from the type names of its columns.
+
+    :param columns: The name of the type of each column, like `int64` or `string`.
+    :type columns: dict[str, str]
+    :raises HelperError: If a type name is not valid, or pyarrow is not installed.
+    :return: The schema.
+    :rtype: pa.Schema
+    """
+    pa = _pyarrow()
+    try:
+        return pa.schema([pa.field(name, pa.type_for_alias(t)) for name, t in columns.items()])
+    except ValueError as e:
+        raise HelperError(f'invalid parquet schema: {e}')
+
+
+def _conform(table: 'pa.Table', schema: 'pa.Schema') -> 'pa.Table':
+    """Give a table the columns of a schema, adding missing ones as nulls."""
+    pa = _pyarrow()
+    columns = [
+        table[f.name].cast(f.type) if f.name in table.column_names else pa.nulls(len(table), f.type) for f in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def join(
+    parts: list[Path],
+    destination: Path,
+    compression: COMPRESSION | None = None,
+    level: int | None = None,
+) -> str:
+    """Merge Parquet files into a destination file, hashing it on the way.
+
+    The row groups of the files are copied one at a time, with their schemas unified,
+    so columns that are null or missing in some of the files are kept.
+
+    :param parts: The files to join, in order.
+    :type parts: list[Path]
+    :param destination: The path of the joined file, overwritten if it exists.
+    :type destination: Path
+    :param compression: Optional. The format to compress the columns with.
+    :type compression: COMPRESSION | None
+    :param level: Optional. The compression level.
+    :type level: int | None
+    :raises HelperError: If the schemas of the files cannot be unified.
+    :return: The sha256 hash of the joined file.
+    :rtype: str
+    """
+    pa = _pyarrow()
+    files = [pa.parquet.ParquetFile(part) for part in parts]
+    try:
+        schema = pa.unify_schemas([f.schema_arrow for f in files], promote_options='permissive')
+    except pa.ArrowException as e:
+        raise HelperError(f'cannot join parquet files with different schemas: {e}')
+
+    with pa.parquet.ParquetWriter(destination, schema, compression=compression or 'none', compression_level=level) as w:
+        for f in files:
+            for i in range(f.num_row_groups):
+                w.write_table(_conform(f.read_row_group(i), schema))
+    return sha256(destination).hexdigest()
+
+
+class ParquetWriter:
+    """Buffered writer of documents to a Parquet file.
+
+    It has the same interface as :class:`pis.util.jsonl.JsonlWriter`, but the file is
+    overwritten instead of appended to, and it is deleted if the writer exits with an
+    error, as it would be missing its footer.
+
+    :param path: The path of the file to write to.
+    :type path: Path
+    :param row_group_size: The number of documents the buffer can hold before it is
+        written as a row group.
+    :type row_group_size: int
+    :param compression: Optional. The format to compress the columns with.
+    :type compression: COMPRESSION | None
+    :param level: Optional. The compression level.
+    :type level: int | None
+    :param schema: Optional. The type name of some or all of the columns. The types of
+        the rest are inferred from the first row group.
+    :type schema: dict[str, str] | None
+    :raises HelperError: If pyarrow is not installed, or the schema is not valid.
+    :ivar lines: The number of documents written to the file so far.
+    :vartype lines: int
+    :ivar bytes_written: The number of bytes written to the file so far.
+    :vartype bytes_written: int
+    """
+
+    resumable = False
+
+    def __init__(
+        self,
+        path: Path,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        compression: COMPRESSION | None = None,
+        level: int | None = None,
+        schema: dict[str, str] | None = None,
+    ):
+        self._pa = _pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.level = level
+        self.lines = 0
+        self.bytes_written = 0
+        self._columns = parse_schema(schema or {})
+        self._schema: pa.Schema | None = None
+        self._rows: list[Any] = []
+        self._sha256: str | None = None
+        self._f = open(path, 'wb')  # noqa: SIM115
+        self._writer: pa.parquet.ParquetWriter | None = None
+
+    def __enter__(self) -> Self:
+        """Enter the context."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ):
+        """Write what is left in the buffer and the footer, and close the file."""
+        complete = False
+        try:
+            if exc_type is None:
+                self.flush()
+                if self._writer is None:
+                    # no documents, but the file must still have the known columns
+                    self._open(self._columns)
+                assert self._writer is not None
+                self._writer.close()
+                complete = True
+        finally:
+            if not complete:
+                # the writer must be closed before the file under it, but the file is
+                # useless without all its documents, so it is deleted right after
+                if self._writer is not None:
+                    with suppress(Exception):
+                        self._writer.close()
+                self.path.unlink(missing_ok=True)
+            self._f.close()
+
+    def _open(self, schema: 'pa.Schema'):
+        self._schema = schema
+        self._writer = self._pa.parquet.ParquetWriter(
+            self._f,
+            schema,
+            compression=self.compression or 'none',
+            compression_level=self.level,
+        )
+
+    def _table(self, rows: list[Any]) -> 'pa.Table':
+        pa = self._pa
+        try:
+            if self._schema is None:
+                inferred = pa.Table.from_pylist(rows).schema
+                for field in self._columns:
+                    i = inferred.get_field_index(field.name)
+                    inferred = inferred.set(i, field) if i >= 0 else inferred.append(field)
+                self._open(inferred)
+            return pa.Table.from_pylist(rows, schema=self._schema)
+        except pa.ArrowException as e:
+            columns = ', '.join(f'{f.name}: {f.type}' for f in self._schema or [])
+            raise HelperError(f'documents do not match the parquet schema ({columns}), set their types: {e}')
+
+    def write(self, doc: Any) -> int:
+        """Add a document to the buffer, and write the buffer if it is full.
+
+        :param doc: The document to write.
+        :type doc: Any
+        :return: The number of documents written to the file, zero if the buffer
+            was not written.
+        :rtype: int
+        """
+        self._rows.append(doc)
+        if len(self._rows) >= self.row_group_size:
+            return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        """Write the buffer to the file as a row group.
+
+        :return: The number of documents written.
+        :rtype: int
+        """
+        written = len(self._rows)
+        if not written:
+            return 0
+        table = self._table(self._rows)
+        assert self._writer is not None
+        self._writer.write_table(table, row_group_size=written)
+        self.bytes_written = self._f.tell()
+        self._rows.clear()
+        self.lines += written
+        return written
+
+    @property
+    def sha256(self) -> str | None:
+        """The sha256 hash of the file, known once the writer is closed."""
+        if self._sha256 is None and self._f.closed and self.path.is_file():
+            self._sha256 = sha256(self.path).hexdigest()
+        return self._sha256
+
+    def tell(self) -> int:
+        """Return the size of the file, not counting the buffer.
+
+        :return: The position in the file.
+        :rtype: int
+        """
+        return self._f.tell()
@@ -0,0 +1,105 @@
+import hashlib
+from unittest.mock import patch
+
+import pytest
+
+from pis.util.errors import HelperError
+from pis.util.parquet import ParquetWriter, count_rows, is_parquet, join
+
+DOC = {'id': 'CHEMBL25', 'phase': 4, 'synonyms': ['aspirin'], 'nested': {'ok': True}}
+
+
+def write_all(path, docs):
+    with ParquetWriter(path, row_group_size=1) as writer:
+        for doc in docs:
+            writer.write(doc)
+
+
+@pytest.fixture
+def pq():
+    return pytest.importorskip('pyarrow.parquet')
+
+
+def test_writer_writes_a_row_group_per_flush(tmp_path, pq):
+    path = tmp_path / 'docs.parquet'
+
+    with ParquetWriter(path, row_group_size=2) as writer:
+        assert writer.write(DOC) == 0
+        assert writer.write(DOC) == 2
+        writer.write(DOC)
+
+    f = pq.ParquetFile(path)
+    assert is_parquet(path)
+    assert count_rows(path) == writer.lines == 3
+    assert f.num_row_groups == 2
+    assert f.read().to_pylist() == [DOC] * 3
+    assert writer.sha256 == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_writer_with_schema(tmp_path, pq):
+    path = tmp_path / 'docs.parquet'
+
+    with ParquetWriter(path, schema={'phase': 'float64', 'missing': 'string'}, compression='zstd') as writer:
+        writer.write({'id': 'CHEMBL25', 'phase': None})
+        writer.write({'id': 'CHEMBL1', 'phase': 2})
+
+    table = pq.read_table(path)
+    assert str(table.schema.field('phase').type) == 'double'
+    assert table.to_pylist() == [
+        {'id': 'CHEMBL25', 'phase': None, 'missing': None},
+        {'id': 'CHEMBL1', 'phase': 2.0, 'missing': None},
+    ]
+
+
+def test_writer_without_documents(tmp_path, pq):
+    path = tmp_path / 'docs.parquet'
+
+    with ParquetWriter(path, schema={'id': 'string'}):
+        pass
+
+    assert count_rows(path) == 0
+    assert pq.read_schema(path).names == ['id']
+
+
+def test_writer_deletes_file_on_error(tmp_path, pq):
+    path = tmp_path / 'docs.parquet'
+
+    try:
+        with ParquetWriter(path, row_group_size=1) as writer:
+            writer.write(DOC)
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert not path.exists()
+
+
+def test_writer_documents_not_matching_schema(tmp_path, pq):
+    path = tmp_path / 'docs.parquet'
+
+    with pytest.raises(HelperError):
+        write_all(path, [{'phase': 4}, {'phase': 'four'}])
+
+    assert not path.exists()
+
+
+def test_join_unifies_schemas(tmp_path, pq):
+    parts = [tmp_path / 'docs.parquet.part0', tmp_path / 'docs.parquet.part1']
+    with ParquetWriter(parts[0]) as writer:
+        writer.write({'id': 'CHEMBL25', 'phase': None})
+    with ParquetWriter(parts[1]) as writer:
+        writer.write({'id': 'CHEMBL1', 'phase': 2, 'name': 'aspirin'})
+    destination = tmp_path / 'docs.parquet'
+
+    digest = join(parts, destination, compression='gzip')
+
+    assert digest == hashlib.sha256(destination.read_bytes()).hexdigest()
+    assert pq.read_table(destination).to_pylist() == [
+        {'id': 'CHEMBL25', 'phase': None, 'name': None},
+        {'id': 'CHEMBL1', 'phase': 2, 'name': 'aspirin'},
+    ]
+
+
+def test_writer_without_pyarrow(tmp_path):
+    with patch.dict('sys.modules', {'pyarrow': None}), pytest.raises(HelperError):
+        ParquetWriter(tmp_path / 'docs.parquet')
@@ -0,0 +1,59 @@
+"""Shared HTTP session registry.
+
+Opening a new session for every request means paying a new TCP and TLS handshake
+every time, even when many files come from the same host. This module keeps one
+pooled session per process, so all downloaders and validators running in a worker
+reuse the same keep-alive connections across tasks.
+"""
+
+import os
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+from pis.config import settings
+
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_lock = Lock()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    retries = Retry(
+        total=5,
+        backoff_factor=0.1,  # type: ignore[arg-type]
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods={'GET', 'HEAD'},
+    )
+    # there is one connection pool per host, each one can keep enough connections
+    # for all the concurrent requests that could be made to the same host
+    workers = max([settings().pool, *settings().pools.values()])
+    adapter = HTTPAdapter(
+        max_retries=retries,
+        pool_connections=max(workers, 10),
+        pool_maxsize=max(workers, settings().download_segments, 10),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def http_session() -> requests.Session:
+    """Return the HTTP session of the current process.
+
+    The session is created on first use and reused afterwards. Sessions are never
+    shared between processes: a forked worker will create its own session instead of
+    inheriting the connections of its parent.
+
+    :return: The pooled HTTP session.
+    :rtype: requests.Session
+    """
+    global _session, _session_pid  # noqa: PLW0603
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _create_session()
+            _session_pid = os.getpid()
+        return _session
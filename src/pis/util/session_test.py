@@ -0,0 +1,34 @@
+from unittest.mock import patch
+
+import pytest
+
+from pis.config.models import Settings
+from pis.util import session
+from pis.util.session import http_session
+
+
+@pytest.fixture(autouse=True)
+def reset_session(monkeypatch):
+    monkeypatch.setattr(session, '_session', None)
+    monkeypatch.setattr(session, '_session_pid', None)
+    with patch('pis.util.session.settings', return_value=Settings(pool=16, download_segments=32)):
+        yield
+
+
+def test_http_session_is_reused():
+    assert http_session() is http_session()
+
+
+def test_http_session_is_not_shared_after_fork(monkeypatch):
+    s1 = http_session()
+    monkeypatch.setattr(session.os, 'getpid', lambda: -1)
+
+    assert http_session() is not s1
+
+
+def test_http_session_pool_size():
+    adapter = http_session().get_adapter('https://example.com')
+
+    assert adapter._pool_connections == 16
+    assert adapter._pool_maxsize == 32
+    assert 'HEAD' in adapter.max_retries.allowed_methods
@@ -1,42 +1,74 @@
 """Validators for Elasticsearch."""
 
-import subprocess
+import hashlib
 from pathlib import Path
 
 from elasticsearch import Elasticsearch as Es
 from loguru import logger
 
+from pis.util import jsonl
 from pis.util.fs import absolute_path
+from pis.util.parquet import count_rows, is_parquet
 
 
-# fastest way to count lines is calling wc -l
-def _wccount(filename):
-    out = subprocess.Popen(
-        ['/usr/bin/wc', '-l', filename],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    ).communicate()[0]
-    return int(out.partition(b' ')[0])
+def counts(
+    url: str,
+    index: str,
+    local_path: Path,
+    *,
+    remote_count: int | None = None,
+    local_count: int | None = None,
+    sha256: str | None = None,
+) -> bool:
+    """Check if the document counts at the remote and local locations match.
 
+    The counts recorded by the task while it ran are used if given. Otherwise, the
+    remote count is fetched from the index, and the local count is taken by counting
+    the lines of the file, or from the metadata of a Parquet file.
 
-def counts(url: str, index: str, local_path: Path) -> bool:
-    """Check if the document counts at the remote and local locations match.
+    If the sha256 hash recorded while a JSON lines file was written is given, the
+    file is read again to count its lines and hash it in the same pass, and the hash
+    must match as well. Parquet files are never hashed.
 
     :param url: The URL of the ElasticSearch instance.
     :type url: str
     :param index: The index to scan.
     :type index: str
-    :param local_path: The path where the documents are stored locally.
+    :param local_path: The path where the documents are stored locally. It can be
+        compressed with gzip or zstd, or be a Parquet file.
     :type local_path: Path
+    :param remote_count: Optional. The number of documents in the index.
+    :type remote_count: int | None
+    :param local_count: Optional. The number of documents written to the file.
+    :type local_count: int | None
+    :param sha256: Optional. The sha256 hash of the file, as it was written, to check
+        it against the file.
+    :type sha256: str | None
 
-    :return: True if the document counts match, False otherwise.
+    :return: True if the document counts and the hash match, False otherwise.
     :rtype: bool
     """
     logger.debug(f'checking if document counts at {url}/{index} and {local_path} match')
 
-    es = Es(url)
-    remote_doc_count = es.count(index=index)['count']
-    local_doc_count = _wccount(absolute_path(local_path))
+    if remote_count is None:
+        es = Es(url)
+        try:
+            remote_count = es.count(index=index)['count']
+        finally:
+            es.close()
+
+    path = absolute_path(local_path)
+    if is_parquet(path):
+        if local_count is None:
+            local_count = count_rows(path)
+    elif sha256:
+        digest = hashlib.sha256()
+        local_count = jsonl.count_lines(path, digest)
+        if digest.hexdigest() != sha256:
+            logger.warning(f'{local_path} changed since it was written, sha256 {digest.hexdigest()} != {sha256}')
+            return False
+    elif local_count is None:
+        local_count = jsonl.count_lines(path)
 
-    logger.debug(f'checking if {remote_doc_count} == {local_doc_count}')
-    return remote_doc_count == local_doc_count
+    logger.debug(f'checking if {remote_count} == {local_count}')
+    return remote_count == local_count
@@ -2,10 +2,11 @@
 
 from pathlib import Path
 
-import requests
 from loguru import logger
 
+from pis.storage.remote_storage import get_remote_storage
 from pis.util.fs import absolute_path
+from pis.util.session import http_session
 
 REQUEST_TIMEOUT = 10
 
@@ -40,7 +41,7 @@ def file_size(source: str, destination: Path) -> bool:
     headers = {'accept-encoding': 'identity'}
 
     try:
-        resp = requests.head(
+        resp = http_session().head(
             source,
             headers=headers,
             allow_redirects=True,
@@ -64,3 +65,31 @@ def file_size(source: str, destination: Path) -> bool:
 
     logger.debug(f'checking if {remote_size} == {local_size}')
     return remote_size == local_size
+
+
+def remote_copy_matches(source: str, destination: str) -> bool:
+    """Check if a file copied between remote storages is the same as its source.
+
+    The sizes of both files are compared, and their CRC32C checksums when the storage
+    reports them.
+
+    :param source: The URI of the source file.
+    :type source: str
+    :param destination: The URI of the copied file.
+    :type destination: str
+
+    :return: True if both files are the same, False otherwise.
+    :rtype: bool
+    """
+    logger.debug(f'checking if {source} and {destination} are the same')
+
+    source_metadata = get_remote_storage(source).stat(source)
+    destination_metadata = get_remote_storage(destination).stat(destination)
+
+    if source_metadata['size'] != destination_metadata['size']:
+        return False
+    source_crc, destination_crc = source_metadata.get('crc32c'), destination_metadata.get('crc32c')
+    if source_crc is None or destination_crc is None:
+        logger.warning('no crc32c checksum in the remote storage, cannot validate the contents')
+        return True
+    return source_crc == destination_crc